@@ -0,0 +1,307 @@
+import logging
+import threading
+import wave
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, List, Optional
+from constants import SAMPLE_RATE, CHUNK_SIZE, CAPTURE_BUFFER_CHUNKS
+
+
+class RingBuffer:
+    """Кольцевой буфер фиксированной ёмкости для одного писателя и одного читателя.
+
+    Писатель меняет только `_head`, читатель — только `_tail`, поэтому
+    блокировки не нужны. При переполнении новый блок отбрасывается и
+    увеличивается счётчик `overflows`.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("Ёмкость буфера должна быть положительной")
+        self.capacity = capacity
+        self._slots: List[Any] = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        self.overflows = 0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return self._head - self._tail
+
+    def put(self, item) -> bool:
+        """Добавляет элемент в буфер. Возвращает False, если буфер заполнен."""
+        depth = self._head - self._tail
+        if depth >= self.capacity:
+            self.overflows += 1
+            return False
+        self._slots[self._head % self.capacity] = item
+        self._head += 1
+        if depth + 1 > self.max_depth:
+            self.max_depth = depth + 1
+        return True
+
+    def get(self):
+        """Извлекает самый старый элемент или возвращает None, если буфер пуст."""
+        if self._tail == self._head:
+            return None
+        idx = self._tail % self.capacity
+        item = self._slots[idx]
+        self._slots[idx] = None
+        self._tail += 1
+        return item
+
+
+class AudioSource(ABC):
+    """Источник звука для VoiceTableCreator.
+
+    Подкласс обязан определить `read`: он возвращает следующий блок
+    16-битного моно звука, None, если данных пока нет, или пустые байты,
+    когда источник закончился. Источники с `provides_text` отдают уже
+    распознанные фразы через `read_text`, и модель распознавания для них не
+    загружается.
+    """
+
+    provides_text = False
+
+    def start(self):
+        """Начинает выдачу данных."""
+
+    @abstractmethod
+    def read(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Следующий блок звука, None, если данных пока нет, или b"" в конце."""
+
+    def read_text(self) -> Optional[str]:
+        """Следующая распознанная фраза или None в конце (только для `provides_text`)."""
+        return None
+
+    def stats(self) -> dict:
+        return {}
+
+    def close(self):
+        """Освобождает ресурсы источника."""
+
+
+class AudioCapture(AudioSource):
+    """Захват звука с микрофона в отдельном потоке PyAudio (режим callback).
+
+    Блоки складываются в кольцевой буфер, а распознаватель забирает их
+    методом `read` в своём темпе, поэтому долгая отрисовка таблицы или
+    сохранение файла не приводят к потере речи.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        buffer_chunks: int = CAPTURE_BUFFER_CHUNKS,
+        rate: int = SAMPLE_RATE,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.chunk_size = chunk_size
+        self.rate = rate
+        self.buffer = RingBuffer(buffer_chunks)
+        self.chunks_captured = 0
+        self.input_overflows = 0
+        self._data_ready = threading.Event()
+        self._pa = None
+        self._stream = None
+        self._overflow_flag = 0
+        self._continue = None
+
+    def start(self):
+        """Открывает поток микрофона и начинает захват."""
+        import pyaudio
+
+        self._overflow_flag = pyaudio.paInputOverflow
+        self._continue = pyaudio.paContinue
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._pa.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            input=True,
+            frames_per_buffer=self.chunk_size,
+            stream_callback=self._callback,
+        )
+        self._stream.start_stream()
+        self.logger.info("Захват звука запущен: блок %s фреймов, буфер %s блоков", self.chunk_size, self.buffer.capacity)
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self._overflow_flag:
+            self.input_overflows += 1
+        self.chunks_captured += 1
+        self.buffer.put(in_data)
+        self._data_ready.set()
+        return (None, self._continue)
+
+    def read(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Возвращает следующий блок звука, ожидая его появления.
+
+        Если за `timeout` секунд данных не появилось, возвращает None.
+        """
+        while True:
+            data = self.buffer.get()
+            if data is not None:
+                return data
+            self._data_ready.clear()
+            # Повторная проверка: блок мог прийти между get() и clear()
+            data = self.buffer.get()
+            if data is not None:
+                return data
+            if not self._data_ready.wait(timeout):
+                return None
+
+    def stats(self) -> dict:
+        """Возвращает счётчики захвата."""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunks_captured": self.chunks_captured,
+            "queue_depth": len(self.buffer),
+            "max_queue_depth": self.buffer.max_depth,
+            "buffer_overflows": self.buffer.overflows,
+            "input_overflows": self.input_overflows,
+        }
+
+    def close(self):
+        """Останавливает захват и освобождает ресурсы PyAudio."""
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+        self.logger.info("Захват звука остановлен: %s", self.stats())
+
+
+class PushAudioSource(AudioSource):
+    """Источник звука, в который блоки передаёт внешний код (например, сетевой сервер).
+
+    `read` не ждёт данных: возвращает None, если новых блоков нет, и пустые
+    байты после вызова `end`.
+    """
+
+    def __init__(self, buffer_chunks: int = CAPTURE_BUFFER_CHUNKS):
+        self.buffer = RingBuffer(buffer_chunks)
+        self.chunks_pushed = 0
+        self.ended = False
+
+    def start(self):
+        """Ничего не делает: блоки поступают через `push`."""
+
+    def push(self, data: bytes) -> bool:
+        """Добавляет блок звука. Возвращает False, если буфер переполнен."""
+        self.chunks_pushed += 1
+        return self.buffer.put(data)
+
+    def end(self):
+        """Отмечает конец потока."""
+        self.ended = True
+
+    def read(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Возвращает следующий блок, None при отсутствии данных или b"" в конце потока."""
+        data = self.buffer.get()
+        if data is None and self.ended:
+            return b""
+        return data
+
+    def stats(self) -> dict:
+        """Возвращает счётчики буфера."""
+        return {
+            "chunks_pushed": self.chunks_pushed,
+            "queue_depth": len(self.buffer),
+            "max_queue_depth": self.buffer.max_depth,
+            "buffer_overflows": self.buffer.overflows,
+        }
+
+    def close(self):
+        """Ничего не делает: внешних ресурсов нет."""
+
+
+class WavFileSource(AudioSource):
+    """Источник звука из WAV-файла с тем же интерфейсом, что у AudioCapture.
+
+    Файл должен быть в формате 16 бит, моно, с частотой SAMPLE_RATE.
+    В конце файла `read` возвращает пустые байты.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, rate: int = SAMPLE_RATE):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.chunk_size = chunk_size
+        self._wav = wave.open(path, "rb")
+        params = (self._wav.getnchannels(), self._wav.getsampwidth(), self._wav.getframerate())
+        if params != (1, 2, rate):
+            self._wav.close()
+            raise ValueError(f"Файл {path}: ожидается моно, 16 бит, {rate} Гц, получено {params}")
+        self.duration = self._wav.getnframes() / rate
+        self.chunks_read = 0
+
+    def start(self):
+        """Ничего не делает: файл открыт в конструкторе."""
+
+    def read(self, timeout: Optional[float] = None) -> bytes:
+        """Возвращает следующий блок звука или пустые байты в конце файла."""
+        data = self._wav.readframes(self.chunk_size)
+        if data:
+            self.chunks_read += 1
+        return data
+
+    def stats(self) -> dict:
+        """Возвращает счётчики чтения."""
+        return {"chunk_size": self.chunk_size, "chunks_read": self.chunks_read, "duration": self.duration}
+
+    def close(self):
+        """Закрывает файл."""
+        self._wav.close()
+        self.logger.info("Чтение файла %s завершено: %s", self.path, self.stats())
+
+
+class PcmIteratorSource(AudioSource):
+    """Источник звука из последовательности блоков PCM (например, синтезированных в тестах).
+
+    Блоки должны быть в формате 16 бит, моно, SAMPLE_RATE. В конце
+    последовательности `read` возвращает пустые байты.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self.chunks_read = 0
+
+    def read(self, timeout: Optional[float] = None) -> bytes:
+        """Возвращает следующий блок или пустые байты в конце последовательности."""
+        data = next(self._chunks, b"")
+        if data:
+            self.chunks_read += 1
+        return data
+
+    def stats(self) -> dict:
+        """Возвращает счётчики чтения."""
+        return {"chunks_read": self.chunks_read}
+
+
+class TextCommandSource(AudioSource):
+    """Источник уже распознанных фраз: команды выполняются без Vosk и без микрофона.
+
+    Нужен для воспроизведения сценариев (benchmarks/bench_session.py) и
+    проверки обработки команд на машине без звука.
+    """
+
+    provides_text = True
+
+    def __init__(self, commands: Iterable[str]):
+        self._commands = iter(commands)
+        self.commands_read = 0
+
+    def read(self, timeout: Optional[float] = None) -> bytes:
+        """Звука у источника нет."""
+        return b""
+
+    def read_text(self) -> Optional[str]:
+        """Возвращает следующую фразу или None, если фразы закончились."""
+        text = next(self._commands, None)
+        if text is not None:
+            self.commands_read += 1
+        return text
+
+    def stats(self) -> dict:
+        """Возвращает число выданных фраз."""
+        return {"commands_read": self.commands_read}
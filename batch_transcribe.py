@@ -0,0 +1,117 @@
+"""Пакетное построение таблиц из записей сессий операторов.
+
+Каждый WAV-файл (16 кГц, моно, 16 бит) прогоняется через тот же цикл команд,
+что и при работе с микрофоном. Файлы распределяются по процессам, модель
+Vosk загружается один раз на процесс.
+
+Пример запуска:
+    python batch_transcribe.py записи --output результаты --workers 4
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+from constants import MODEL_PATH
+
+# Модель, загруженная в текущем рабочем процессе
+_model = None
+
+
+def _init_worker(model_path: str):
+    """Загружает модель Vosk один раз при старте рабочего процесса."""
+    global _model
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    _model = Model(model_path)
+
+
+def transcribe_file(wav_path: str, output_dir: str) -> dict:
+    """Прогоняет одну запись через цикл команд и сохраняет таблицы в отдельную папку."""
+    from audio_capture import WavFileSource
+    from voice_creator import VoiceTableCreator
+
+    started = time.perf_counter()
+    session_name = os.path.splitext(os.path.basename(wav_path))[0]
+    session_dir = os.path.join(output_dir, session_name)
+    os.makedirs(session_dir, exist_ok=True)
+    result = {"file": wav_path, "output_dir": session_dir, "error": None}
+
+    try:
+        source = WavFileSource(wav_path)
+        result["audio_seconds"] = source.duration
+        console_path = os.path.join(session_dir, "console.txt")
+        with open(console_path, "w", encoding="utf-8") as console, contextlib.redirect_stdout(console):
+            creator = VoiceTableCreator(
+                model=_model,
+                audio_source=source,
+                output_dir=session_dir,
+                journal_dir=None,
+                metrics_dir=session_dir,
+                workspace_dir=None,
+                sync_url=None,
+            )
+            creator.run()
+        result["commands"] = creator.transcript
+        if creator.table:
+            # Несохранённая таблица тоже нужна для сверки
+            creator.table.save_to_csv(os.path.join(session_dir, f"{creator.table.name}.unsaved.csv"))
+        creator.capture.close()
+    except Exception as e:
+        logging.getLogger(__name__).exception("Ошибка обработки файла %s", wav_path)
+        result["error"] = str(e)
+
+    result["tables"] = sorted(name for name in os.listdir(session_dir) if name.endswith(".csv"))
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def find_wav_files(input_dir: str) -> List[str]:
+    """Возвращает отсортированный список WAV-файлов в папке."""
+    return sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir) if name.lower().endswith(".wav")
+    )
+
+
+def run_batch(input_dir: str, output_dir: str, workers: Optional[int] = None, model_path: str = MODEL_PATH) -> List[dict]:
+    """Обрабатывает все записи из папки на пуле процессов и пишет сводку results.json."""
+    files = find_wav_files(input_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = {pool.submit(transcribe_file, path, output_dir): path for path in files}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "ошибка: " + result["error"] if result["error"] else f"таблиц: {len(result['tables'])}"
+            print(f"{result['file']}: {result['seconds']:.1f} с, {status}")
+
+    results.sort(key=lambda r: r["file"])
+    summary = {
+        "input_dir": input_dir,
+        "files": len(files),
+        "failed": sum(1 for r in results if r["error"]),
+        "wall_seconds": time.perf_counter() - started,
+        "audio_seconds": sum(r.get("audio_seconds", 0.0) for r in results),
+        "results": results,
+    }
+    with open(os.path.join(output_dir, "results.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"Обработано файлов: {len(files)} за {summary['wall_seconds']:.1f} с")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Построение таблиц из записей сессий (WAV, 16 кГц, моно)")
+    parser.add_argument("input_dir", help="папка с WAV-файлами")
+    parser.add_argument("--output", default="batch_output", help="папка для таблиц и сводки")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — число ядер)")
+    parser.add_argument("--model", default=MODEL_PATH, help="путь к модели Vosk")
+    args = parser.parse_args()
+    run_batch(args.input_dir, args.output, args.workers, args.model)
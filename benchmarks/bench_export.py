@@ -0,0 +1,61 @@
+"""Выгрузка большой таблицы в файлы разных форматов и со сжатием.
+
+Для каждого сочетания формата и сжатия выводится время снимка таблицы
+(столько ждёт голосовой цикл), время записи файла в фоновом потоке и его
+размер. Записанный файл читается обратно и сверяется с таблицей.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_export --rows 100000
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+from benchmarks.bench_storage import make_rows
+from constants import TEMPLATES
+from export import COMPRESSIONS, EXPORT_FORMATS, TableSnapshot, export_path, read_export, write_export
+from table import Table
+
+
+def bench(storage: str, rows: int, directory: str) -> list:
+    template = TEMPLATES["шаблон 3"]
+    table = Table(template["name"], template["headers"], storage=storage, rows=make_rows(rows))
+    expected = [table.headers] + list(table.display_rows(table.saved_row_count()))
+    results = []
+    for format in EXPORT_FORMATS:
+        for compression in (None, *COMPRESSIONS):
+            started = time.perf_counter()
+            snapshot = TableSnapshot(table)
+            snapshot_ms = (time.perf_counter() - started) * 1e3
+            path = export_path(directory, f"{storage}", format, compression)
+            started = time.perf_counter()
+            write_export(path, snapshot.headers, snapshot.rows(), format, compression)
+            write_ms = (time.perf_counter() - started) * 1e3
+            if list(read_export(path)) != expected:
+                raise AssertionError(f"Файл {path} не совпадает с таблицей")
+            results.append((format, compression or "-", snapshot_ms, write_ms, os.path.getsize(path) / 2**20))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    directory = tempfile.mkdtemp(prefix="bench_export_")
+    try:
+        for storage in ("list", "columnar"):
+            print(f"\n{storage}, {args.rows} строк:")
+            print(f"  {'формат':>10} {'сжатие':>7} {'снимок, мс':>11} {'запись, мс':>11} {'размер, МБ':>11}")
+            for format, compression, snapshot_ms, write_ms, size in bench(storage, args.rows, directory):
+                print(f"  {format:>10} {compression:>7} {snapshot_ms:11.2f} {write_ms:11.1f} {size:11.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
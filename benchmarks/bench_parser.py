@@ -0,0 +1,99 @@
+"""Стоимость разбора фраз по командам и преобразования чисел.
+
+Корпус — фразы операторов в том виде, в каком их выдаёт распознаватель.
+Для каждой команды выводится среднее время разбора CommandParser.parse,
+для значений — время преобразования чисел без кэша и с кэшем.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_parser --repeat 2000
+"""
+
+import argparse
+import time
+from collections import defaultdict
+from command_parser import CommandParser, format_spoken_value, spoken_number, tokenize
+
+CORPUS = [
+    "создай таблицу шаблон один",
+    "создай таблицу шаблон три",
+    "создай таблицу турнир столбцы фамилия имя команда балл",
+    "создать таблицу склад столбцы товар количество цена",
+    "следующая строка",
+    "пропусти",
+    "пропуск",
+    "отмена",
+    "повтори",
+    "контрольная точка",
+    "откати",
+    "вставить строка пять",
+    "вставь строка двадцать три",
+    "удалить строка сто двенадцать",
+    "редактировать строка два столбец имя",
+    "редактировать строка сорок пять столбец цена",
+    "вернуться",
+    "назад",
+    "сохрани",
+    "покажи всю таблицу",
+    "статистика",
+    "пауза",
+    "помощь",
+    "формула сумма столбца зарплата",
+    "сумма зарплата",
+    "среднее средний балл",
+    "сортируй по цена по убыванию",
+    "покажи где категория молоко",
+    "иванов",
+    "петрова анна",
+    "молоко",
+    "инженер-конструктор",
+    "десятый б",
+    "пять",
+    "двадцать пять",
+    "сто сорок семь",
+    "тысяча двести",
+    "три целых пять",
+    "минус восемь",
+    "пять яблок",
+]
+
+
+def time_per_call(function, items, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            function(item)
+    return (time.perf_counter() - started) / (repeat * len(items))
+
+
+def main():
+    parser_args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser_args.add_argument("--repeat", type=int, default=2000)
+    args = parser_args.parse_args()
+
+    parser = CommandParser()
+    by_command = defaultdict(list)
+    for text in CORPUS:
+        by_command[parser.parse(text).label].append(text)
+
+    # Разбор с прогретым кэшем слов, как при повторяющихся командах
+    print("Разбор команд, мкс на фразу:")
+    for label, texts in sorted(by_command.items()):
+        print(f"  {label:>24}: {time_per_call(parser.parse, texts, args.repeat) * 1e6:8.2f}  ({len(texts)} фраз)")
+
+    values = by_command["значение"]
+    spoken_number("пять")  # загрузка text2num не входит в замер
+    started = time.perf_counter()
+    for text in values:
+        spoken_number.cache_clear()
+        tokenize.cache_clear()
+        format_spoken_value(text)
+    cold = (time.perf_counter() - started) / len(values)
+    warm = time_per_call(format_spoken_value, values, args.repeat)
+    print("\nПреобразование значений, мкс на фразу:")
+    print(f"  {'без кэша':>24}: {cold * 1e6:8.2f}")
+    print(f"  {'с кэшем':>24}: {warm * 1e6:8.2f}")
+    print(f"  {'попаданий в кэш':>24}: {spoken_number.cache_info().hits}")
+
+
+if __name__ == "__main__":
+    main()
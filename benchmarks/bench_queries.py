@@ -0,0 +1,80 @@
+"""Время запросов к большой таблице: итоги, сортировка, отбор и поиск строк.
+
+Таблица товаров (шаблон 3) загружается готовыми строками. Первый запрос
+к столбцу разбирает его числа или строит индекс значений, следующие
+пользуются готовыми данными, которые обновляются при изменении ячеек.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_queries --rows 100000
+"""
+
+import argparse
+import logging
+import random
+import time
+from benchmarks.bench_storage import make_rows
+from constants import TEMPLATES
+from table import Table
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1e3
+
+
+def bench(storage: str, rows: int, edits: int) -> dict:
+    template = TEMPLATES["шаблон 3"]
+    table = Table(template["name"], template["headers"], storage=storage, rows=make_rows(rows))
+    queries = table.queries
+    price = template["headers"].index("цена")
+    category = template["headers"].index("категория")
+    result = {}
+    _, result["первая сумма"] = timed(queries.aggregate, price, "сумма")
+    _, result["повторная сумма"] = timed(queries.aggregate, price, "сумма")
+    _, result["максимум"] = timed(queries.aggregate, price, "максимум")
+
+    rng = random.Random(2)
+    started = time.perf_counter()
+    for _ in range(edits):
+        table.set_cell(rng.randrange(rows), price, str(float(rng.randint(10, 5000))).replace(".", ","))
+        queries.aggregate(price, "среднее")
+    result["правка и среднее"] = (time.perf_counter() - started) * 1e3 / edits
+
+    _, result["сортировка по цене"] = timed(queries.sort, price, True)
+    _, result["сортировка по категории"] = timed(queries.sort, category, False)
+    _, result["отбор по категории"] = timed(queries.filter, category, "молоко")
+    _, result["отбор цена > 2500"] = timed(queries.filter, price, "2500,0", "больше")
+
+    indexes = table.indexes
+    name = template["headers"].index("название")
+    _, result["построение индексов"] = timed(lambda: [indexes.column(col) for col in range(len(table.headers))])
+    _, result["поиск точный"] = timed(indexes.find, ("товар", "250"))
+    _, result["поиск по началу"] = timed(indexes.find, ("товар", "49"), [name])
+    _, result["поиск нечёткий"] = timed(indexes.find, ("тавар", "251"), [name])
+    matches = indexes.find(("молоко",))
+    _, result["следующая строка"] = timed(indexes.locate, matches, rows // 2)
+    started = time.perf_counter()
+    for _ in range(edits):
+        table.insert_row(rows // 2)
+        table.delete_row(rows // 2)
+    result["вставка и удаление"] = (time.perf_counter() - started) * 1e3 / edits
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--edits", type=int, default=1000, help="сколько правок цены делать между запросами")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    import numpy  # noqa: F401 — загрузка numpy не входит в замер
+
+    for storage in ("list", "columnar"):
+        print(f"\n{storage}, {args.rows} строк, мс:")
+        for name, milliseconds in bench(storage, args.rows, args.edits).items():
+            print(f"  {name:>24}: {milliseconds:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Воспроизведение сценариев работы оператора и замер скорости по этапам.
+
+Команды подаются в VoiceTableCreator через TextCommandSource, поэтому
+микрофон и модель не нужны, и набор запускается на любой машине без звука.
+Для каждого сценария выводятся пропускная способность и перцентили времени
+этапов: изменение таблицы, вывод, преобразование чисел, сохранение. Время
+распознавания замеряется отдельно, если указаны модель и WAV-файл.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_session --cells 10000 100000
+    python -m benchmarks.bench_session --model vosk-model-small-ru-0.22 --wav запись.wav
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List
+from audio_capture import TextCommandSource, WavFileSource
+from constants import TEMPLATES
+from metrics import STAGES, RollingHistogram
+from voice_creator import VoiceTableCreator
+
+NUMBER_WORDS = ["пять", "двенадцать", "двадцать пять", "сто сорок", "триста", "тысяча двести"]
+TEXT_WORDS = ["иванов", "петрова", "молоко", "хлеб", "инженер", "десятый б"]
+
+
+def spoken_values(count: int, seed: int = 1):
+    """Значения ячеек в том виде, в каком их выдаёт распознаватель: числа словами и текст."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng.choice(NUMBER_WORDS) if rng.random() < 0.5 else rng.choice(TEXT_WORDS)
+
+
+def templates_session(cells: int) -> List[str]:
+    commands = []
+    for number, template in enumerate(TEMPLATES, start=1):
+        commands.append(f"создай таблицу шаблон {number}")
+        commands.extend(spoken_values(len(TEMPLATES[template]["headers"]) * 3, seed=number))
+        commands.append("сохрани")
+    return commands
+
+
+def fill_session(cells: int) -> List[str]:
+    return ["создай таблицу шаблон 3", *spoken_values(cells), "сохрани"]
+
+
+def undo_session(cells: int) -> List[str]:
+    undo_count = min(cells // 2, 1000)
+    return [
+        "создай таблицу шаблон 1",
+        *spoken_values(cells),
+        *["отмена"] * undo_count,
+        *["повтори"] * (undo_count // 2),
+        "сохрани",
+    ]
+
+
+def middle_rows_session(cells: int) -> List[str]:
+    rows = cells // 4
+    commands = ["создай таблицу шаблон 2", *spoken_values(cells)]
+    for _ in range(100):
+        commands += [f"вставить строка {rows // 2}", f"удалить строка {rows // 2}"]
+    commands.append("сохрани")
+    return commands
+
+
+def formulas_session(cells: int) -> List[str]:
+    """Итог по столбцу и построчные формулы, затем правки ячеек, от которых они зависят."""
+    rows = max(cells // 4, 2)
+    commands = ["создай таблицу шаблон 1"]
+    for row in range(rows - 1):
+        commands += ["иванов", "иван", "формула столбец зарплата умножить на два", "сто"]
+    commands += ["итого", "пропусти", "пропусти", "формула сумма столбца зарплата"]
+    for row in range(1, min(rows, 100)):
+        commands += [f"редактировать строка {row} столбец зарплата", "двести"]
+    commands.append("сохрани")
+    return commands
+
+
+SESSIONS: Dict[str, Callable[[int], List[str]]] = {
+    "шаблоны": templates_session,
+    "заполнение": fill_session,
+    "отмены": undo_session,
+    "вставка и удаление": middle_rows_session,
+    "формулы": formulas_session,
+}
+
+
+def stage_histograms(creator: VoiceTableCreator) -> Dict[str, RollingHistogram]:
+    """Объединяет статистику этапов по всем типам команд."""
+    merged: Dict[str, RollingHistogram] = {}
+    for (kind, stage), histogram in creator.metrics.histograms.items():
+        target = merged.setdefault(stage, RollingHistogram(window=None))
+        target.values.extend(histogram.values)
+        target.count += histogram.count
+        target.total += histogram.total
+    return merged
+
+
+def run_session(name: str, commands: List[str], output_dir: str, audio_source=None, model=None) -> dict:
+    source = audio_source or TextCommandSource(commands)
+    creator = VoiceTableCreator(
+        model=model,
+        audio_source=source,
+        output_dir=output_dir,
+        output=io.StringIO(),
+        journal_dir=None,
+        metrics_dir=None,
+        workspace_dir=None,
+        sync_url=None,
+    )
+    creator.metrics.window = None
+    started = time.perf_counter()
+    creator.run()
+    seconds = time.perf_counter() - started
+    result = {"session": name, "commands": len(creator.transcript), "seconds": seconds}
+    result["commands_per_sec"] = result["commands"] / seconds if seconds else 0.0
+    for stage, histogram in stage_histograms(creator).items():
+        p50, p95, p99 = histogram.percentiles()
+        result[stage] = {"count": histogram.count, "p50_ms": p50 * 1e3, "p95_ms": p95 * 1e3, "p99_ms": p99 * 1e3}
+    creator.capture.close()
+    return result
+
+
+def print_result(result: dict):
+    print(
+        f"\n{result['session']}: {result['commands']} команд за {result['seconds']:.2f} с "
+        f"({result['commands_per_sec']:.0f} команд/с)"
+    )
+    for stage in STAGES:
+        if stage in result:
+            data = result[stage]
+            print(
+                f"  {stage:>12}: p50 {data['p50_ms']:8.3f}  p95 {data['p95_ms']:8.3f}  "
+                f"p99 {data['p99_ms']:8.3f} мс  (n={data['count']})"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=[10000, 100000], help="сколько ячеек заполнять")
+    parser.add_argument("--sessions", nargs="+", choices=list(SESSIONS), default=list(SESSIONS))
+    parser.add_argument("--model", help="модель Vosk для замера распознавания")
+    parser.add_argument("--wav", nargs="*", default=[], help="записи команд для замера распознавания")
+    parser.add_argument("--json", help="записать результаты в JSON-файл для сравнения версий")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.sessions:
+            for cells in args.cells if name != "шаблоны" else args.cells[:1]:
+                label = name if name == "шаблоны" else f"{name}, {cells} ячеек"
+                results.append(run_session(label, SESSIONS[name](cells), tmp))
+                print_result(results[-1])
+
+        if args.model and args.wav:
+            from vosk import Model
+
+            model = Model(args.model)
+            for path in args.wav:
+                source = WavFileSource(path)
+                result = run_session(f"распознавание {os.path.basename(path)}", [], tmp, source, model)
+                result["real_time_factor"] = result["seconds"] / source.duration
+                results.append(result)
+                print_result(result)
+                print(f"  отношение ко времени записи: {result['real_time_factor']:.3f}")
+        else:
+            print("\nРаспознавание не замерялось: укажите --model и --wav")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Сравнение хранения таблицы списком списков и по столбцам.
+
+Заполняет таблицу товаров (шаблон 3) через обычный API Table и замеряет
+память и время основных операций.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_storage --rows 50000
+"""
+
+import argparse
+import io
+import logging
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from constants import TEMPLATES
+from table import Table
+
+PRODUCTS = [f"товар {i}" for i in range(500)]
+CATEGORIES = ["молоко", "хлеб", "овощи", "фрукты", "мясо", "рыба", "напитки", "крупы"]
+
+
+def make_rows(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        # Значения в том виде, в каком их записывает words_to_number
+        yield [
+            rng.choice(PRODUCTS),
+            rng.choice(CATEGORIES),
+            str(float(rng.randint(10, 5000))).replace(".", ","),
+            str(float(rng.randint(1, 300))).replace(".", ","),
+        ]
+
+
+def bench(storage: str, rows: int) -> dict:
+    template = TEMPLATES["шаблон 3"]
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    # Значения создаются по ходу заполнения, как строки от распознавателя
+    started = time.perf_counter()
+    table = Table(template["name"], template["headers"], storage=storage)
+    for row in make_rows(rows):
+        for value in row:
+            table.set_current_value(value)
+    fill_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for row in range(0, len(table.data), 7):
+        table.data.get(row, 2)
+    read_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(100):
+        table.insert_row(rows // 2)
+        table.delete_row(rows // 2)
+    insert_delete_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table.display(file=io.StringIO())
+    display_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        table.save_to_csv(os.path.join(tmp, "bench.csv"))
+        save_seconds = time.perf_counter() - started
+
+    return {
+        "storage": storage,
+        "memory_mb": memory / 2**20,
+        "cells_per_sec": rows * len(template["headers"]) / fill_seconds,
+        "read_us": read_seconds / len(range(0, len(table.data), 7)) * 1e6,
+        "insert_delete_ms": insert_delete_seconds / 100 * 1e3,
+        "display_ms": display_seconds * 1e3,
+        "save_ms": save_seconds * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = [bench(storage, args.rows) for storage in ("list", "columnar")]
+    columns = ["storage", "memory_mb", "cells_per_sec", "read_us", "insert_delete_ms", "display_ms", "save_ms"]
+    print(f"Строк: {args.rows}")
+    print("  ".join(f"{name:>16}" for name in columns))
+    for result in results:
+        print("  ".join(f"{result[name]:>16.2f}" if name != "storage" else f"{result[name]:>16}" for name in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Отправка изменений таблиц на сервер-заглушку во время работы оператора.
+
+Сценарий заполнения таблицы воспроизводится без отправки и с отправкой на
+сервер-заглушку (StandInBackend из sync.py), и сравнивается время команд:
+отправка идёт в фоновом потоке и не должна его увеличивать. Затем
+таблицы на сервере сверяются с таблицами станции. Отдельно проверяется
+работа без связи: изменения копятся в outbox, а после появления сервера
+доставляются, в том числе при потерянных ответах (повтор пачки сервер
+пропускает по номерам seq).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sync --cells 10000
+"""
+
+import argparse
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from audio_capture import TextCommandSource
+from benchmarks.bench_session import fill_session, middle_rows_session, stage_histograms
+from sync import StandInBackend, TableSync
+from table import Table
+from voice_creator import VoiceTableCreator
+
+
+def run_session(commands, directory: str, sync_url=None) -> tuple:
+    creator = VoiceTableCreator(
+        audio_source=TextCommandSource(commands),
+        output_dir=directory,
+        output=io.StringIO(),
+        journal_dir=None,
+        metrics_dir=None,
+        workspace_dir=os.path.join(directory, "workspace"),
+        sync_url=sync_url,
+        sync_dir=os.path.join(directory, "outbox"),
+    )
+    creator.metrics.window = None
+    started = time.perf_counter()
+    creator.run()
+    seconds = time.perf_counter() - started
+    creator.capture.close()
+    return creator, seconds
+
+
+def compare_tables(creator: VoiceTableCreator, backend: StandInBackend) -> bool:
+    for entry in creator.workspace.entries.values():
+        local = [list(row) for row in creator.workspace.open(entry.name).table.data.rows()]
+        remote = backend.tables.get(entry.name)
+        if remote is None or remote["rows"] != local:
+            return False
+    return True
+
+
+def bench_session(name: str, commands, backend: StandInBackend):
+    print(f"\n{name}, {len(commands)} команд:")
+    for label, url in (("без отправки", None), ("с отправкой", backend.url)):
+        directory = tempfile.mkdtemp(prefix="bench_sync_")
+        try:
+            creator, seconds = run_session(commands, directory, url)
+            p50, p95, p99 = stage_histograms(creator)["total"].percentiles()
+            line = f"  {label:>13}: {seconds:6.2f} с, команда p50 {p50 * 1e3:.3f}  p99 {p99 * 1e3:.3f} мс"
+            if url:
+                line += f"; {creator.sync.status()}, совпадает с сервером: {compare_tables(creator, backend)}"
+            print(line)
+        finally:
+            shutil.rmtree(directory)
+
+
+def bench_offline(backend: StandInBackend, changes: int):
+    directory = tempfile.mkdtemp(prefix="bench_sync_")
+    try:
+        backend.offline = True
+        sync = TableSync(backend.url, directory, batch_interval=0.05, backoff_initial=0.05, backoff_max=0.2)
+        table = Table("Без связи", ["номер", "значение"])
+        table.add_listener(lambda change: sync.table_changed(table.name, change))
+        sync.table_added(table)
+        started = time.perf_counter()
+        for number in range(changes):
+            table.insert_row(len(table.data), [str(number), "_"])
+            table.set_cell(len(table.data) - 1, 1, str(number * 2))
+        record_us = (time.perf_counter() - started) * 1e6 / (2 * changes)
+        time.sleep(0.3)
+        print(f"\nБез связи: {2 * changes} изменений, {record_us:.1f} мкс на изменение в основном потоке")
+        print(f"  {sync.status()}")
+        sync.close(timeout=0.1)
+
+        backend.offline = False
+        backend.fail_every = 4
+        started = time.perf_counter()
+        sync = TableSync(backend.url, directory, batch_interval=0.05, backoff_initial=0.05)
+        sync.close(timeout=60)
+        seconds = time.perf_counter() - started
+        delivered = backend.tables["Без связи"]["rows"] == [list(row) for row in table.data.rows()]
+        print(f"После появления связи: доставлено за {seconds:.2f} с, совпадает с сервером: {delivered}")
+        print(f"  {sync.status()}; повторно присланных и пропущенных изменений: {backend.duplicates}")
+    finally:
+        backend.fail_every = 0
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=10000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    backend = StandInBackend(("127.0.0.1", 0))
+    threading.Thread(target=backend.serve_forever, name="stand-in", daemon=True).start()
+    try:
+        bench_session("заполнение", fill_session(args.cells), backend)
+        bench_session("вставка и удаление", middle_rows_session(args.cells), backend)
+        bench_offline(backend, args.cells)
+    finally:
+        backend.shutdown()
+        backend.server_close()
+
+
+if __name__ == "__main__":
+    main()
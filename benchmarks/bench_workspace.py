@@ -0,0 +1,70 @@
+"""Переключение между таблицами рабочего пространства и их выгрузка из памяти.
+
+Создаётся рабочее пространство из нескольких таблиц товаров (шаблон 3),
+которые не помещаются в бюджет памяти все сразу. Затем таблицы открываются
+по кругу: каждое открытие либо находит таблицу в памяти, либо читает её
+из хранилища, а самая давняя таблица записывается на диск и выгружается.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_workspace --tables 8 --rows 50000 --budget-mb 48
+"""
+
+import argparse
+import logging
+import shutil
+import tempfile
+import time
+from benchmarks.bench_storage import make_rows
+from constants import TEMPLATES
+from history import History
+from table import Table
+from workspace import Workspace
+
+
+def bench(storage: str, tables: int, rows: int, budget: int, rounds: int) -> dict:
+    template = TEMPLATES["шаблон 3"]
+    directory = tempfile.mkdtemp(prefix="bench_workspace_")
+    workspace = Workspace(directory, memory_budget=budget)
+    result = {}
+    try:
+        started = time.perf_counter()
+        for number in range(tables):
+            table = Table(f"Товары {number}", template["headers"], storage=storage, rows=make_rows(rows))
+            workspace.activate(workspace.add(table, History(table)))
+        result["создание, мс на таблицу"] = (time.perf_counter() - started) * 1e3 / tables
+        resident = sum(entry.loaded for entry in workspace.entries.values())
+
+        loads = workspace.evictions
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for number in range(tables):
+                entry = workspace.open(f"товары {number}")
+                workspace.activate(entry)
+                entry.table.set_cell(0, 2, "10,0")
+        result["открытие с правкой, мс"] = (time.perf_counter() - started) * 1e3 / (rounds * tables)
+        result["выгрузок за круг"] = (workspace.evictions - loads) / rounds
+        result["таблиц в памяти"] = resident
+        result["оценка памяти, МБ"] = workspace.memory_usage() / 2**20
+    finally:
+        shutil.rmtree(directory)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tables", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--budget-mb", type=float, default=48)
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    for storage in ("list", "columnar"):
+        print(f"\n{storage}, {args.tables} таблиц по {args.rows} строк, бюджет {args.budget_mb} МБ:")
+        result = bench(storage, args.tables, args.rows, int(args.budget_mb * 2**20), args.rounds)
+        for name, value in result.items():
+            print(f"  {name:>24}: {value:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
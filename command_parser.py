@@ -0,0 +1,271 @@
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from constants import PARSER_CACHE_SIZE, NUMBER_WORDS, NUMBER_EXTRA_WORDS
+
+# Итоги по столбцу: в запросах ("сумма цена") и в формулах ("формула сумма столбца цена")
+AGGREGATE_WORDS = ("сумма", "среднее", "максимум", "минимум")
+
+# Названия форматов выгрузки, как их произносят
+EXPORT_FORMAT_WORDS = {"csv": "csv", "json": "jsonl", "джейсон": "jsonl", "двоичном": "columnar", "двоичный": "columnar"}
+
+# Команды в порядке приоритета: если во фразе есть несколько команд,
+# выполняется первая из списка. Первая фраза команды служит её названием.
+COMMANDS = (
+    ("pause", ("пауза",)),
+    ("exit", ("выход",)),
+    ("help", ("помощь",)),
+    ("statistics", ("статистика",)),
+    ("show_all", ("покажи всю таблицу",)),
+    ("create_template", ("создай таблицу шаблон", "создать таблицу шаблон")),
+    ("create_table", ("создай таблицу", "создать таблицу")),
+    ("next_row", ("следующая строка",)),
+    ("skip", ("пропусти", "пропуск", "пропустить")),
+    ("undo", ("отмена",)),
+    ("redo", ("повтори", "повторить")),
+    ("checkpoint", ("контрольная точка",)),
+    ("rollback", ("откати",)),
+    ("insert_row", ("вставь строка", "вставить строка")),
+    ("save", ("сохрани", "сохранить")),
+    ("edit", ("редактировать",)),
+    ("back", ("вернуться", "назад", "вернись")),
+    ("delete_row", ("удалить строка",)),
+    ("formula", ("формула",)),
+    ("aggregate", AGGREGATE_WORDS),
+    ("sort", ("сортируй по", "сортировать по", "отсортируй по")),
+    ("filter", ("покажи где",)),
+    ("find", ("найди", "найти", "перейди к", "перейти к")),
+    ("open_table", ("открой таблицу", "открыть таблицу")),
+    ("list_tables", ("список таблиц",)),
+    ("export", ("экспортируй", "экспортировать")),
+)
+VALUE = "value"
+VALUE_LABEL = "значение"
+
+# Слова аргументов команд (см. CommandParser.parse_args), кроме чисел и названий
+ARGUMENT_WORDS = (
+    "шаблон",
+    "столбцы",
+    "строка",
+    "строки",
+    "столбец",
+    "столбца",
+    "по убыванию",
+    "по возрастанию",
+    "где",
+    "к",
+    "все",
+    "сжатием",
+)
+
+
+class ParsedCommand(NamedTuple):
+    """Результат разбора фразы.
+
+    name — команда из COMMANDS или "value" для значения ячейки, label — её
+    название для вывода и статистики. В args — аргументы команды: номер
+    шаблона ("template"), название и столбцы таблицы ("name", "headers"),
+    номер строки ("row", с единицы) и столбец ("column"), для запросов —
+    функция итога ("function"), направление сортировки ("descending") и
+    слова после команды ("words"), где названия столбцов сверяются уже
+    с таблицей, для выгрузки — все ли таблицы ("all"), формат ("format")
+    и сжатие ("compression").
+    """
+
+    name: str
+    label: str
+    tokens: Tuple[str, ...]
+    args: Dict
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def tokenize(text: str) -> Tuple[str, ...]:
+    """Приводит фразу к нижнему регистру и разбивает на слова."""
+    return tuple(text.lower().split())
+
+
+@lru_cache(maxsize=1)
+def number_vocabulary() -> frozenset:
+    """Слова, из которых text2num собирает числа по-русски.
+
+    Словарь свой (NUMBER_WORDS и NUMBER_EXTRA_WORDS), а не внутренние
+    таблицы text2num, которые меняются от версии к версии.
+    """
+    return frozenset(NUMBER_WORDS.split()) | frozenset(NUMBER_EXTRA_WORDS.split())
+
+
+def command_grammar(commands=COMMANDS) -> List[str]:
+    """Фразы команд и слова их аргументов для распознавателя с грамматикой."""
+    phrases = [phrase for _, command_phrases in commands for phrase in command_phrases]
+    return phrases + list(ARGUMENT_WORDS) + list(EXPORT_FORMAT_WORDS)
+
+
+def is_number_word(token: str) -> bool:
+    """Может ли слово быть частью числа: цифры или слово из словаря text2num."""
+    return token in number_vocabulary() or any(char.isdigit() for char in token)
+
+
+@lru_cache(maxsize=PARSER_CACHE_SIZE)
+def spoken_number(text: str) -> Optional[float]:
+    """Число, произнесённое словами ("двадцать пять" → 25.0), или None.
+
+    Фразы со словами не из словаря чисел отсеиваются без вызова text2num,
+    а результаты запоминаются, поэтому повторяющиеся значения ячеек
+    разбираются один раз.
+    """
+    text = text.strip().lower()
+    if not text or not all(is_number_word(token) for token in text.split()):
+        return None
+    from text_to_num import alpha2digit
+
+    try:
+        return float(alpha2digit(text, "ru"))
+    except ValueError:
+        return None
+
+
+def format_spoken_value(text: str) -> str:
+    """Значение ячейки: число в виде "25,0" или исходный текст."""
+    number = spoken_number(text)
+    if number is None:
+        return text
+    return str(number).replace(".", ",")
+
+
+class CommandParser:
+    """Разбор фраз по таблице команд за один проход.
+
+    Фразы команд собираются в префиксное дерево по словам. Разбор проходит
+    по словам фразы, на каждой позиции спускается по дереву и выбирает
+    найденную команду с наивысшим приоритетом, затем разбирает её аргументы.
+    """
+
+    def __init__(self, commands=COMMANDS):
+        self.trie: Dict = {}
+        self.labels: Dict[str, str] = {}
+        for priority, (name, phrases) in enumerate(commands):
+            self.labels[name] = phrases[0]
+            for phrase in phrases:
+                node = self.trie
+                for token in phrase.split():
+                    node = node.setdefault(token, {})
+                node[None] = (priority, name)
+
+    def parse(self, text: str) -> ParsedCommand:
+        tokens = tokenize(text)
+        best = None
+        for start in range(len(tokens)):
+            node = self.trie.get(tokens[start])
+            position = start + 1
+            while node is not None:
+                match = node.get(None)
+                if match and (best is None or match[0] < best[0]):
+                    best = match
+                node = node.get(tokens[position]) if position < len(tokens) else None
+                position += 1
+        if best is None:
+            return ParsedCommand(VALUE, VALUE_LABEL, tokens, {})
+        name = best[1]
+        return ParsedCommand(name, self.labels[name], tokens, self.parse_args(name, tokens))
+
+    def parse_args(self, name: str, tokens: Tuple[str, ...]) -> Dict:
+        if name == "create_template":
+            return {"template": number_after(tokens, "шаблон")}
+        if name == "create_table":
+            table_name, headers = table_info(tokens)
+            return {"name": table_name, "headers": headers}
+        if name in ("insert_row", "delete_row"):
+            return {"row": number_after(tokens, "строка")}
+        if name == "edit":
+            return edit_target(tokens)
+        if name == "aggregate":
+            function, words = words_after(tokens, AGGREGATE_WORDS)
+            return {"function": function, "words": words}
+        if name == "sort":
+            _, words = words_after(tokens, ("по",))
+            descending = words[-2:] == ("по", "убыванию")
+            if words[-2:] in (("по", "убыванию"), ("по", "возрастанию")):
+                words = words[:-2]
+            return {"words": words, "descending": descending}
+        if name == "filter":
+            return {"words": words_after(tokens, ("где",))[1]}
+        if name == "find":
+            _, words = words_after(tokens, ("найди", "найти", "перейди", "перейти"))
+            return {"words": words[1:] if words[:1] == ("к",) else words}
+        if name == "open_table":
+            return {"name": " ".join(words_after(tokens, ("таблицу",))[1])}
+        if name == "export":
+            format = next((EXPORT_FORMAT_WORDS[token] for token in tokens if token in EXPORT_FORMAT_WORDS), None)
+            compression = "gzip" if "сжатием" in tokens else None
+            return {"all": "все" in tokens, "format": format, "compression": compression}
+        return {}
+
+
+def number_after(tokens: Tuple[str, ...], word: Optional[str]) -> Optional[int]:
+    """Целое число из слов сразу после `word` (или с начала фразы, если word=None)."""
+    if word is None:
+        start = 0
+    elif word in tokens:
+        start = tokens.index(word) + 1
+    else:
+        return None
+    end = start
+    while end < len(tokens) and is_number_word(tokens[end]):
+        end += 1
+    # Если слова не складываются в одно число ("два три"), берётся самое длинное начало
+    while end > start:
+        number = spoken_number(" ".join(tokens[start:end]))
+        if number is not None:
+            return int(number)
+        end -= 1
+    return None
+
+
+def words_after(tokens: Tuple[str, ...], keywords: Sequence[str]) -> Tuple[Optional[str], Tuple[str, ...]]:
+    """Первое из слов `keywords` во фразе и слова после него."""
+    for index, token in enumerate(tokens):
+        if token in keywords:
+            return token, tokens[index + 1 :]
+    return None, ()
+
+
+def match_column(tokens: Sequence[str], start: int, column_index: Dict[str, int]) -> Tuple[Optional[int], int]:
+    """Столбец, название которого (возможно, из нескольких слов) начинается со слова `start`.
+
+    `column_index` — номера столбцов по названиям (Table.column_index). Берётся
+    самое длинное совпадение. Возвращает номер столбца (или None) и позицию
+    слова после названия.
+    """
+    for end in range(len(tokens), start, -1):
+        col = column_index.get(" ".join(tokens[start:end]))
+        if col is not None:
+            return col, end
+    return None, start
+
+
+def row_number(tokens: Tuple[str, ...]) -> Optional[int]:
+    """Номер строки из ответа на уточнение: после слова "строка" или просто число."""
+    return number_after(tokens, "строка" if "строка" in tokens else None)
+
+
+def table_info(tokens: Tuple[str, ...]) -> Tuple[str, List[str]]:
+    """Название таблицы и столбцы из "создай таблицу <название> столбцы <столбцы>"."""
+    if "таблицу" not in tokens or "столбцы" not in tokens:
+        return "", []
+    table_idx = tokens.index("таблицу") + 1
+    columns_idx = tokens.index("столбцы") + 1
+    if table_idx < columns_idx and table_idx < len(tokens):
+        return " ".join(tokens[table_idx : columns_idx - 1]), list(tokens[columns_idx:])
+    return "", []
+
+
+def edit_target(tokens: Tuple[str, ...]) -> Dict:
+    """Строка и столбец из "редактировать строка <номер> столбец <название>".
+
+    Название столбца — все слова после "столбец", их может быть несколько.
+    """
+    column = None
+    if "столбец" in tokens:
+        col_idx = tokens.index("столбец") + 1
+        if col_idx < len(tokens):
+            column = " ".join(tokens[col_idx:])
+    return {"row": number_after(tokens, "строка"), "column": column}
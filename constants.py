@@ -1,5 +1,115 @@
 TEMPLATES = {
     "шаблон 1": {"name": "Сотрудники", "headers": ["фамилия", "имя", "должность", "зарплата"]},
     "шаблон 2": {"name": "Ученики", "headers": ["фамилия", "имя", "класс", "средний балл"]},
-    "шаблон 3": {"name": "Товары", "headers": ["название", "категория", "цена", "количество"]},
+    # Таблицы товаров бывают на десятки тысяч строк, поэтому хранятся по столбцам
+    "шаблон 3": {"name": "Товары", "headers": ["название", "категория", "цена", "количество"], "storage": "columnar"},
 }
+
+# Хранение строк таблицы: "list" (список списков) или "columnar" (по столбцам)
+TABLE_STORAGE = "list"
+
+MODEL_PATH = "vosk-model-small-ru-0.22"
+
+# Параметры захвата звука
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 4000  # фреймов в одном блоке (0,25 с при 16 кГц)
+CAPTURE_BUFFER_CHUNKS = 64  # ёмкость кольцевого буфера в блоках
+STARTUP_AUDIO_SECONDS = 30  # сколько звука хранить, пока загружается модель
+
+# Ранний запуск команд по промежуточному результату распознавания
+EARLY_DISPATCH_COMMANDS = ("следующая строка", "пропусти", "отмена", "повтори", "сохрани")
+EARLY_DISPATCH_STABLE_CHUNKS = 2  # сколько блоков подряд гипотеза должна не меняться
+
+# Размер кэша разбора фраз и преобразования чисел
+PARSER_CACHE_SIZE = 4096
+
+# Словари для распознавания с грамматикой
+PAUSE_RESUME_WORDS = ("продолжить", "продолжай")
+# Грамматика режима команд строится из command_parser.COMMANDS (command_grammar)
+NUMBER_WORDS = (
+    "ноль один одна два две три четыре пять шесть семь восемь девять десять "
+    "одиннадцать двенадцать тринадцать четырнадцать пятнадцать шестнадцать семнадцать "
+    "восемнадцать девятнадцать двадцать тридцать сорок пятьдесят шестьдесят семьдесят "
+    "восемьдесят девяносто сто двести триста четыреста пятьсот шестьсот семьсот "
+    "восемьсот девятьсот тысяча тысячи тысяч"
+)
+# Слова, которые ещё могут входить в число при разборе значений (см. spoken_number)
+NUMBER_EXTRA_WORDS = (
+    "нуль сотня сотни сотен миллион миллиона миллионов миллиард миллиарда миллиардов "
+    "триллион триллиона триллионов минус плюс целая целых точка и"
+)
+
+# Детектор речи перед распознавателем
+VAD_FRAME_MS = 20  # длина кадра анализа внутри блока
+VAD_MIN_ENERGY = 300.0  # минимальный порог RMS для 16-битного звука
+VAD_NOISE_RATIO = 3.0  # во сколько раз речь громче фонового шума
+VAD_ZCR_THRESHOLD = 0.25  # доля переходов через ноль для глухих согласных
+VAD_MIN_SPEECH_FRAMES = 2  # сколько речевых кадров нужно, чтобы считать блок речью
+VAD_HANGOVER_CHUNKS = 4  # сколько блоков тишины пропускать после речи
+VAD_PREROLL_CHUNKS = 2  # сколько блоков до начала речи отдавать распознавателю
+
+# Сервер распознавания для нескольких рабочих мест
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8765
+SERVER_DECODE_WORKERS = 4  # потоков декодирования на все сессии
+SERVER_MAX_SESSIONS = 32
+SERVER_OUTPUT_DIR = "sessions"
+
+# Отрисовка таблицы
+TABLE_VIEWPORT_ROWS = 20  # сколько строк показывать вокруг текущей
+TABLE_VIEWPORT_AFTER = 2  # сколько из них показывать после текущей строки
+EMPTY_CELL = "_"
+
+# Журнал изменений несохранённой таблицы
+JOURNAL_DIR = "journal"
+JOURNAL_FSYNC_EVERY = 16  # записей между принудительными сбросами на диск
+JOURNAL_FSYNC_INTERVAL = 1.0  # секунд между принудительными сбросами на диск
+JOURNAL_COMPACT_EVERY = 5000  # записей, после которых журнал сжимается в снимок CSV
+
+# Выгрузка таблиц в файлы (команда "экспортируй")
+EXPORT_DIR = "export"  # папка внутри папки вывода
+EXPORT_FORMAT = "csv"  # "csv", "jsonl" или "columnar" (двоичный формат по столбцам)
+EXPORT_COMPRESSION = None  # None, "gzip", "bz2" или "lzma"
+EXPORT_CHUNK_ROWS = 4096  # строк в одной пачке записи
+
+# Рабочее пространство из нескольких таблиц
+WORKSPACE_DIR = "workspace"  # где хранятся таблицы, выгруженные из памяти
+WORKSPACE_MEMORY_BUDGET = 64 * 1024 * 1024  # примерный объём таблиц в памяти
+
+# Отправка изменений таблиц на центральный сервер (sync.py)
+SYNC_URL = None  # адрес приёма изменений, например "http://localhost:8780/deltas"; None — не отправлять
+SYNC_DIR = "outbox"  # неотправленные изменения на диске
+SYNC_BATCH_SIZE = 500  # изменений в одном запросе
+SYNC_BATCH_INTERVAL = 2.0  # секунд, через которые отправляется неполная пачка
+SYNC_TIMEOUT = 10.0  # секунд ожидания ответа сервера
+SYNC_BACKOFF_INITIAL = 1.0  # пауза перед первым повтором после ошибки, секунд
+SYNC_BACKOFF_MAX = 60.0  # наибольшая пауза между повторами, секунд
+SYNC_SEGMENT_RECORDS = 10000  # изменений в одном файле outbox
+SYNC_CLOSE_TIMEOUT = 5.0  # сколько при завершении ждать отправки остатка, секунд
+SYNC_PORT = 8780  # порт сервера-заглушки
+
+# История отмены и повтора действий
+HISTORY_MAX_STEPS = 1000  # сколько последних команд можно отменить
+HISTORY_MAX_BYTES = 4 * 1024 * 1024  # примерный объём значений в истории одной таблицы
+HISTORY_CHECKPOINT_EVERY = 50  # команд между автоматическими контрольными точками
+HISTORY_MAX_TABLES = 3  # сколько предыдущих таблиц хранить для отмены создания новой
+
+# Логирование
+LOG_DIR = "logs"
+LOG_FILE = "voice_table.log"
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "text"  # "text" или "json" (одна запись JSON на строку)
+LOG_ROTATION = "size"  # "size", "time" или None (без ротации)
+LOG_MAX_BYTES = 5 * 1024 * 1024  # размер файла для ротации по размеру
+LOG_ROTATE_WHEN = "midnight"  # период для ротации по времени
+LOG_BACKUP_COUNT = 5  # сколько старых файлов хранить
+
+# Статистика времени обработки команд
+METRICS_DIR = "metrics"
+METRICS_WINDOW = 1000  # сколько последних измерений учитывать в перцентилях
+METRICS_BUDGET_SECONDS = 2.0  # целевое время отклика на команду
+
+# Поиск строк по значению ("найди", "перейди к")
+INDEX_KEY_SPACING = 1 << 20  # шаг ключей строк; вставки делят промежутки пополам
+INDEX_PREFIX_LIMIT = 20  # сколько значений, начинающихся с фразы, рассматривать
+INDEX_FUZZY_THRESHOLD = 0.5  # наименьшее сходство по триграммам для нечёткого поиска
@@ -0,0 +1,370 @@
+import bz2
+import csv
+import gzip
+import io
+import json
+import logging
+import lzma
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from itertools import islice
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from formulas import ERROR_VALUE
+from table_storage import format_number, parse_number
+from constants import EMPTY_CELL, EXPORT_CHUNK_ROWS
+
+# Формат файла -> расширение
+EXPORT_FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "columnar": ".vtc"}
+# Сжатие -> расширение; все три есть в стандартной библиотеке
+COMPRESSIONS = {"gzip": ".gz", "bz2": ".bz2", "lzma": ".xz"}
+
+COLUMNAR_MAGIC = b"VTCOL1\n"
+UINT32 = struct.Struct("<I")
+
+
+def export_path(directory: str, name: str, format: str = "csv", compression: Optional[str] = None) -> str:
+    """Путь файла выгрузки таблицы: имя таблицы с расширениями формата и сжатия."""
+    suffix = EXPORT_FORMATS[format] + (COMPRESSIONS[compression] if compression else "")
+    return os.path.join(directory, name.replace(os.sep, "_") + suffix)
+
+
+def open_compressed(raw: BinaryIO, compression: Optional[str], mode: str) -> BinaryIO:
+    """Оборачивает открытый файл сжатием; закрытие обёртки файл не закрывает."""
+    if compression is None:
+        return raw
+    if compression == "gzip":
+        # Время в заголовке не пишется, чтобы одинаковые таблицы давали одинаковые файлы;
+        # уровень 6 (как у zlib по умолчанию) в разы быстрее уровня 9 при почти том же размере
+        return gzip.GzipFile(fileobj=raw, mode=mode, compresslevel=6, mtime=0)
+    if compression == "bz2":
+        return bz2.BZ2File(raw, mode)
+    if compression == "lzma":
+        return lzma.LZMAFile(raw, mode)
+    raise ValueError(f"Неизвестное сжатие: {compression}")
+
+
+@contextmanager
+def atomic_output(path: str, compression: Optional[str] = None):
+    """Файл для записи, который появляется под именем `path` только целиком.
+
+    Запись идёт во временный файл рядом, после fsync он переименовывается.
+    При ошибке временный файл удаляется, а прежний файл остаётся как был.
+    """
+    tmp_path = path + ".tmp"
+    raw = open(tmp_path, "wb")
+    try:
+        f = open_compressed(raw, compression, "wb")
+        yield f
+        if f is not raw:
+            f.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    except BaseException:
+        raw.close()
+        os.remove(tmp_path)
+        raise
+    raw.close()
+    os.replace(tmp_path, path)
+
+
+def text_writer(f: BinaryIO) -> io.TextIOWrapper:
+    return io.TextIOWrapper(f, encoding="utf-8", newline="")
+
+
+def write_csv(f: BinaryIO, headers: Sequence[str], rows: Iterable[List[str]], chunk_rows: int) -> int:
+    text = text_writer(f)
+    writer = csv.writer(text)
+    writer.writerow(headers)
+    count = 0
+    for chunk in chunks(rows, chunk_rows):
+        writer.writerows(chunk)
+        count += len(chunk)
+    # Файл закрывает atomic_output, поэтому обёртка отсоединяется, а не закрывается
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_jsonl(f: BinaryIO, headers: Sequence[str], rows: Iterable[List[str]], chunk_rows: int) -> int:
+    text = text_writer(f)
+    encoder = json.JSONEncoder(ensure_ascii=False)
+    count = 0
+    for chunk in chunks(rows, chunk_rows):
+        text.write("".join(encoder.encode(dict(zip(headers, values))) + "\n" for values in chunk))
+        count += len(chunk)
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_columnar(f: BinaryIO, headers: Sequence[str], rows: Iterable[List[str]], chunk_rows: int) -> int:
+    """Двоичный формат по столбцам.
+
+    После сигнатуры и заголовков (JSON) идут блоки по `chunk_rows` строк:
+    число строк блока и данные каждого столбца. Столбец, где все значения —
+    числа или пустые ячейки, пишется как маска пустых ячеек и float64;
+    остальные — как словарь различных значений блока и номера в нём.
+    Блок с нулём строк завершает файл.
+    """
+    header = json.dumps({"headers": list(headers)}, ensure_ascii=False).encode("utf-8")
+    f.write(COLUMNAR_MAGIC + UINT32.pack(len(header)) + header)
+    count = 0
+    for chunk in chunks(rows, chunk_rows):
+        f.write(UINT32.pack(len(chunk)))
+        for values in zip(*chunk):
+            f.write(encode_column(values))
+        count += len(chunk)
+    f.write(UINT32.pack(0))
+    return count
+
+
+def encode_column(values: Sequence[str]) -> bytes:
+    numbers = array("d")
+    for value in values:
+        if value == EMPTY_CELL:
+            numbers.append(0.0)
+            continue
+        number = parse_number(value)
+        if number is None:
+            break
+        numbers.append(number)
+    else:
+        if sys.byteorder == "big":
+            numbers.byteswap()
+        return b"n" + bytes(value == EMPTY_CELL for value in values) + numbers.tobytes()
+    dictionary: Dict[str, int] = {}
+    codes = array("I", [dictionary.setdefault(value, len(dictionary)) for value in values])
+    words = [word.encode("utf-8") for word in dictionary]
+    lengths = array("I", map(len, words))
+    if sys.byteorder == "big":
+        codes.byteswap()
+        lengths.byteswap()
+    return b"t" + UINT32.pack(len(words)) + lengths.tobytes() + b"".join(words) + codes.tobytes()
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "columnar": write_columnar}
+
+
+def chunks(rows: Iterable[List[str]], size: int) -> Iterator[List[List[str]]]:
+    """Строки пачками: в памяти одновременно не больше `size` строк."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_export(
+    path: str,
+    headers: Sequence[str],
+    rows: Iterable[List[str]],
+    format: str = "csv",
+    compression: Optional[str] = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> int:
+    """Записывает строки в файл указанного формата. Возвращает число строк."""
+    writer = WRITERS.get(format)
+    if writer is None:
+        raise ValueError(f"Неизвестный формат выгрузки: {format}")
+    with atomic_output(path, compression) as f:
+        return writer(f, headers, rows, chunk_rows)
+
+
+def read_export(path: str) -> Iterator[List[str]]:
+    """Читает файл выгрузки: первая строка — заголовки, затем строки таблицы.
+
+    Формат и сжатие определяются по расширениям файла.
+    """
+    stem, suffix = os.path.splitext(path)
+    compression = next((name for name, extension in COMPRESSIONS.items() if extension == suffix), None)
+    if compression:
+        stem, suffix = os.path.splitext(stem)
+    format = next((name for name, extension in EXPORT_FORMATS.items() if extension == suffix), None)
+    if format is None:
+        raise ValueError(f"Неизвестный формат файла: {path}")
+    with open(path, "rb") as raw:
+        f = open_compressed(raw, compression, "rb")
+        if format == "columnar":
+            yield from read_columnar(f)
+            return
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        if format == "csv":
+            yield from csv.reader(text)
+            return
+        headers = None
+        for line in text:
+            record = json.loads(line)
+            if headers is None:
+                headers = list(record)
+                yield headers
+            yield [record[header] for header in headers]
+
+
+def read_columnar(f: BinaryIO) -> Iterator[List[str]]:
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Файл не в двоичном формате выгрузки")
+    header = json.loads(f.read(read_uint32(f)).decode("utf-8"))
+    headers = header["headers"]
+    yield headers
+    while True:
+        count = read_uint32(f)
+        if not count:
+            return
+        columns = [decode_column(f, count) for _ in headers]
+        yield from map(list, zip(*columns))
+
+
+def read_uint32(f: BinaryIO) -> int:
+    return UINT32.unpack(f.read(UINT32.size))[0]
+
+
+def decode_column(f: BinaryIO, count: int) -> List[str]:
+    kind = f.read(1)
+    if kind == b"n":
+        nulls = f.read(count)
+        numbers = array("d")
+        numbers.frombytes(f.read(count * numbers.itemsize))
+        if sys.byteorder == "big":
+            numbers.byteswap()
+        return [EMPTY_CELL if null else format_number(number) for null, number in zip(nulls, numbers)]
+    size = read_uint32(f)
+    lengths = array("I")
+    lengths.frombytes(f.read(size * lengths.itemsize))
+    codes = array("I")
+    if sys.byteorder == "big":
+        lengths.byteswap()
+    words = [f.read(length).decode("utf-8") for length in lengths]
+    codes.frombytes(f.read(count * codes.itemsize))
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return [words[code] for code in codes]
+
+
+class TableSnapshot:
+    """Копия значений таблицы для записи в другом потоке.
+
+    Снимок снимается в основном потоке: строки копируются средствами
+    хранилища (для хранения по столбцам — копией массивов), а вместо
+    значений формул запоминаются только вычисленные значения. Поэтому
+    таблицу можно менять дальше, пока снимок записывается.
+    """
+
+    def __init__(self, table):
+        self.name = table.name
+        self.headers = list(table.headers)
+        self.data = table.data.snapshot()
+        self.saved_rows = table.saved_row_count()
+        engine = table.formulas
+        self.computed: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+        for row, col in engine.formulas:
+            self.computed[row].append((col, engine.display((row, col)) or ERROR_VALUE))
+
+    def rows(self, display: bool = True) -> Iterator[List[str]]:
+        """Строки для файла: при `display` — сохраняемые строки со значениями формул,
+        иначе — все строки с исходными значениями ячеек, как в хранилище."""
+        if not display:
+            yield from self.data.rows()
+            return
+        computed = self.computed
+        for row, values in enumerate(self.data.rows(self.saved_rows)):
+            cells = computed.get(row)
+            if cells:
+                values = list(values)
+                for col, value in cells:
+                    values[col] = value
+            yield values
+
+
+def export_task(
+    source, path: str, format: str = "csv", compression: Optional[str] = None, display: bool = True
+) -> Callable:
+    """Задание для Exporter: записать строки источника (TableSnapshot или таблицы
+    из хранилища) в файл. Возвращает путь и число записанных строк."""
+
+    def run() -> Tuple[str, int]:
+        return path, write_export(path, source.headers, source.rows(display), format, compression)
+
+    return run
+
+
+class ExportJob:
+    """Пачка заданий записи, выполняемых по порядку; после ошибки остальные не выполняются."""
+
+    def __init__(self, label: str, tasks: List[Callable]):
+        self.label = label
+        self.tasks = tasks
+        self.results: List[Tuple[str, int]] = []
+        self.error: Optional[BaseException] = None
+        self.seconds = 0.0
+        self.done = threading.Event()
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            for task in self.tasks:
+                result = task()
+                if result is not None:
+                    self.results.append(result)
+        except Exception as e:
+            self.error = e
+            logging.getLogger(__name__).exception("Ошибка выгрузки '%s'", self.label)
+        finally:
+            self.seconds = time.perf_counter() - started
+            self.done.set()
+
+    @property
+    def ok(self) -> bool:
+        return self.done.is_set() and self.error is None
+
+
+class Exporter:
+    """Запись файлов в фоновом потоке, чтобы голосовой цикл не ждал диска.
+
+    Задания выполняются по одному в порядке поступления. Завершённые задания
+    забираются из основного потока методом `completed` — например, чтобы
+    сообщить оператору о сохранении.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.queue: "queue.Queue[Optional[ExportJob]]" = queue.Queue()
+        self.finished = deque()
+        self.thread: Optional[threading.Thread] = None
+
+    def submit(self, label: str, tasks: List[Callable]) -> ExportJob:
+        job = ExportJob(label, tasks)
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="exporter", daemon=True)
+            self.thread.start()
+        self.queue.put(job)
+        return job
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.run()
+            self.logger.info("Выгрузка '%s' за %.3f с: %s", job.label, job.seconds, job.results)
+            self.finished.append(job)
+
+    def completed(self) -> List[ExportJob]:
+        jobs = []
+        while self.finished:
+            jobs.append(self.finished.popleft())
+        return jobs
+
+    def close(self):
+        """Дожидается записи всех поставленных заданий и останавливает поток."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
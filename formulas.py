@@ -0,0 +1,625 @@
+import logging
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from command_parser import AGGREGATE_WORDS, is_number_word, match_column, spoken_number
+from table_storage import NUMBER_PATTERN, format_number
+
+FORMULA_PREFIX = "="
+FORMULA_WORD = "формула"
+
+# Значения ячеек с ошибкой вычисления
+ERROR_CYCLE = "#ЦИКЛ"
+ERROR_VALUE = "#ЗНАЧ"
+ERROR_DIV0 = "#ДЕЛ0"
+ERROR_REF = "#ССЫЛКА"
+
+ADDITIVE = {"плюс": "+", "минус": "-"}
+MULTIPLICATIVE = {"умножить": "*", "разделить": "/"}
+OPERATOR_WORDS = {"+": "плюс", "-": "минус", "*": "умножить на", "/": "разделить на"}
+
+Key = Tuple[int, int]
+
+NAN = float("nan")
+# Итоги по столбцу складываются нарастающим итогом, поэтому округляются,
+# чтобы ошибка округления не попадала в ячейку (как у команды "сумма")
+AGGREGATE_DIGITS = 9
+
+
+class FormulaError(ValueError):
+    """Фразу не удалось разобрать как формулу."""
+
+
+class EvaluationError(Exception):
+    """Формулу не удалось вычислить; `code` — значение ошибки для ячейки."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+def cell_number(value: str) -> Optional[float]:
+    """Число из значения ячейки ("25,0", "-3") или None для текста и пустых ячеек."""
+    if not NUMBER_PATTERN.fullmatch(value):
+        return None
+    try:
+        return float(value.replace(",", "."))
+    except ValueError:
+        return None
+
+
+class FormulaParser:
+    """Разбор произнесённой формулы в дерево.
+
+    Грамматика (слова после "формула" или после "=" в ячейке):
+        выражение := слагаемое (("плюс" | "минус") слагаемое)*
+        слагаемое := множитель (("умножить" | "разделить") ["на"] множитель)*
+        множитель := число
+                   | "строка" N ["столбец" название]   — ячейка (по умолчанию в своём столбце)
+                   | "столбец" название                — ячейка своей строки
+                   | агрегат "столбца" название        — по всему столбцу
+                   | агрегат "строки" [N]              — по строке (по умолчанию своей)
+        агрегат   := "сумма" | "среднее" | "максимум" | "минимум"
+
+    Узлы дерева — кортежи: ("num", число), ("cell", строка, столбец),
+    ("agg", функция, "column"|"row", номер), ("op", знак, левый, правый).
+    Строка или столбец None означают строку или столбец самой формулы.
+    """
+
+    def __init__(self, tokens: Sequence[str], headers: List[str]):
+        self.tokens = list(tokens)
+        self.headers = headers
+        self.column_index = {header: col for col, header in enumerate(headers)}
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self) -> tuple:
+        if not self.tokens:
+            raise FormulaError("пустая формула")
+        node = self.expression()
+        if self.pos < len(self.tokens):
+            raise FormulaError(f"лишние слова: {' '.join(self.tokens[self.pos:])}")
+        return node
+
+    def expression(self) -> tuple:
+        node = self.term()
+        while self.peek() in ADDITIVE:
+            op = ADDITIVE[self.tokens[self.pos]]
+            self.pos += 1
+            node = ("op", op, node, self.term())
+        return node
+
+    def term(self) -> tuple:
+        node = self.factor()
+        while self.peek() in MULTIPLICATIVE:
+            op = MULTIPLICATIVE[self.tokens[self.pos]]
+            self.pos += 1
+            if self.peek() == "на":
+                self.pos += 1
+            node = ("op", op, node, self.factor())
+        return node
+
+    def factor(self) -> tuple:
+        token = self.peek()
+        if token is None:
+            raise FormulaError("формула оборвана")
+        if token in AGGREGATE_WORDS:
+            self.pos += 1
+            scope = self.peek()
+            self.pos += 1
+            if scope == "столбца":
+                return ("agg", token, "column", self.column())
+            if scope == "строки":
+                row = self.number() - 1 if self.peek() is not None and is_number_word(self.peek()) else None
+                return ("agg", token, "row", row)
+            raise FormulaError(f"после '{token}' ожидается 'столбца' или 'строки'")
+        if token == "строка":
+            self.pos += 1
+            row = int(self.number()) - 1
+            col = None
+            if self.peek() == "столбец":
+                self.pos += 1
+                col = self.column()
+            return ("cell", row, col)
+        if token == "столбец":
+            self.pos += 1
+            return ("cell", None, self.column())
+        if is_number_word(token):
+            return ("num", self.number())
+        raise FormulaError(f"непонятное слово '{token}'")
+
+    def number(self) -> float:
+        """Самое длинное число из слов или цифр, начиная с текущего слова."""
+        end = self.pos
+        while end < len(self.tokens) and is_number_word(self.tokens[end]):
+            end += 1
+        while end > self.pos:
+            text = " ".join(self.tokens[self.pos : end])
+            value = cell_number(text) if end == self.pos + 1 else None
+            if value is None:
+                value = spoken_number(text)
+            if value is not None:
+                self.pos = end
+                return value
+            end -= 1
+        raise FormulaError("ожидается число")
+
+    def column(self) -> int:
+        """Название столбца (возможно, из нескольких слов) — самое длинное совпадение."""
+        col, self.pos = match_column(self.tokens, self.pos, self.column_index)
+        if col is None:
+            raise FormulaError(f"столбец '{self.peek()}' не найден")
+        return col
+
+
+def unparse(node: tuple, headers: List[str]) -> str:
+    """Каноническая запись формулы: числа цифрами, названия столбцов полностью."""
+    kind = node[0]
+    if kind == "num":
+        return format_number(node[1])
+    if kind == "cell":
+        parts = []
+        if node[1] is not None:
+            parts.append(f"строка {node[1] + 1}")
+        if node[2] is not None:
+            parts.append(f"столбец {headers[node[2]]}")
+        return " ".join(parts)
+    if kind == "agg":
+        if node[2] == "column":
+            return f"{node[1]} столбца {headers[node[3]]}"
+        return f"{node[1]} строки" + (f" {node[3] + 1}" if node[3] is not None else "")
+    return f"{unparse(node[2], headers)} {OPERATOR_WORDS[node[1]]} {unparse(node[3], headers)}"
+
+
+def parse_formula(text: str, headers: List[str]) -> tuple:
+    """Разбирает формулу, записанную в ячейке ("=сумма столбца зарплата")."""
+    return FormulaParser(text[len(FORMULA_PREFIX) :].split(), headers).parse()
+
+
+class FormulaEngine:
+    """Вычисление формул таблицы с графом зависимостей.
+
+    Формула хранится в ячейке как текст "=<каноническая запись>", поэтому
+    сохраняется в журнал, отменяется и восстанавливается как обычное
+    значение. Движок подписан на изменения таблицы: при изменении ячейки
+    пересчитываются только зависящие от неё формулы (и зависящие от них),
+    каждая не раньше своих зависимостей. Вычисленные значения кэшируются,
+    а об их изменении таблица сообщает подписчикам событием "computed".
+    Ссылки на строки позиционные: после вставки или удаления строки
+    "строка 3" указывает на строку, которая теперь третья.
+
+    Итоги по столбцу берутся из сумм и количеств чисел столбца, которые
+    TableQueries (queries.py) обновляет при каждом изменении ячейки, а
+    движок — при каждом вычислении формулы в этом столбце. Поэтому правка
+    ячейки пересчитывает итог без прохода по столбцу.
+
+    Перед вычислением формулы на циклах ссылок находятся по графу
+    зависимостей и получают ошибку цикла. Остальные формулы вычисляются
+    после своих зависимостей, поэтому результат, в том числе выбор ошибки,
+    не зависит от того, в каком порядке вносились правки. Таблица вызывает
+    `evaluate_all` после того, как создан TableQueries, и загруженные
+    формулы считаются тем же путём, что и правки.
+    """
+
+    def __init__(self, table):
+        self.logger = logging.getLogger(__name__)
+        self.table = table
+        self.formulas: Dict[Key, tuple] = {}
+        self.values: Dict[Key, Union[float, str]] = {}
+        # Обратные ссылки: ячейка, столбец (агрегат по столбцу), строка (агрегат по строке)
+        # и номер строки, на который формула ссылается явно, -> формулы
+        self.by_cell: Dict[Key, Set[Key]] = defaultdict(set)
+        self.by_column: Dict[int, Set[Key]] = defaultdict(set)
+        self.by_row: Dict[int, Set[Key]] = defaultdict(set)
+        self.by_absolute_row: Dict[int, Set[Key]] = defaultdict(set)
+        # Ссылки формулы без привязки к её ячейке: None — своя строка или свой столбец
+        self.patterns: Dict[Key, tuple] = {}
+        # Строки с формулами по возрастанию и столбцы формул в каждой: при вставке
+        # и удалении строки сдвигаются только формулы ниже неё
+        self.rows: List[int] = []
+        self.row_columns: Dict[int, Set[int]] = {}
+        # Последняя строка с формулой: вставки и удаления ниже неё формулы не сдвигают
+        self.last_row = -1
+        # Формулы с ошибкой и формулы, ещё не пересчитанные в текущем проходе recompute
+        self.errors: Set[Key] = set()
+        self.stale: Set[Key] = set()
+        self.evaluating: Set[Key] = set()
+        for row, values in enumerate(table.data):
+            for col, value in enumerate(values):
+                if value.startswith(FORMULA_PREFIX):
+                    self.add(row, col, value)
+
+    def __len__(self) -> int:
+        return len(self.formulas)
+
+    def compile(self, words: Sequence[str]) -> str:
+        """Переводит произнесённую формулу в текст для ячейки. Вызывает FormulaError."""
+        return FORMULA_PREFIX + unparse(FormulaParser(words, self.table.headers).parse(), self.table.headers)
+
+    def add(self, row: int, col: int, text: str) -> bool:
+        try:
+            self.formulas[(row, col)] = parse_formula(text, self.table.headers)
+        except FormulaError as e:
+            self.logger.warning("Ячейка [строка %s, столбец %s]: не формула '%s': %s", row + 1, col + 1, text, e)
+            return False
+        pattern = self.patterns[(row, col)] = (set(), set(), set())
+        self.collect(self.formulas[(row, col)], *pattern)
+        self.index((row, col))
+        columns = self.row_columns.get(row)
+        if columns is None:
+            columns = self.row_columns[row] = set()
+            insort(self.rows, row)
+            self.last_row = self.rows[-1]
+        columns.add(col)
+        return True
+
+    def remove(self, key: Key) -> Optional[str]:
+        """Убирает формулу из ячейки и возвращает её прежнее значение для вывода."""
+        old = self.display(key)
+        self.unindex(key)
+        del self.formulas[key]
+        del self.patterns[key]
+        self.values.pop(key, None)
+        self.errors.discard(key)
+        self.stale.discard(key)
+        row, col = key
+        columns = self.row_columns[row]
+        columns.discard(col)
+        if not columns:
+            del self.row_columns[row]
+            del self.rows[bisect_left(self.rows, row)]
+            self.last_row = self.rows[-1] if self.rows else -1
+        return old
+
+    def collect(self, node: tuple, cells: Set[tuple], columns: Set[int], rows: Set[Optional[int]]):
+        """Собирает ячейки, столбцы и строки, от которых зависит формула `node`."""
+        kind = node[0]
+        if kind == "cell":
+            cells.add((node[1], node[2]))
+        elif kind == "agg":
+            if node[2] == "column":
+                columns.add(node[3])
+            else:
+                rows.add(node[3])
+        elif kind == "op":
+            self.collect(node[2], cells, columns, rows)
+            self.collect(node[3], cells, columns, rows)
+
+    def targets(self, key: Key):
+        """Ячейки, столбцы, строки и явные номера строк, от которых зависит формула в `key`."""
+        row, col = key
+        cells, columns, rows = self.patterns[key]
+        for ref_row, ref_col in cells:
+            yield self.by_cell, (row if ref_row is None else ref_row, col if ref_col is None else ref_col)
+            if ref_row is not None:
+                yield self.by_absolute_row, ref_row
+        for ref_col in columns:
+            yield self.by_column, ref_col
+        for ref_row in rows:
+            yield self.by_row, row if ref_row is None else ref_row
+            if ref_row is not None:
+                yield self.by_absolute_row, ref_row
+
+    def index(self, key: Key):
+        for index, target in self.targets(key):
+            index[target].add(key)
+
+    def unindex(self, key: Key):
+        for index, target in self.targets(key):
+            keys = index[target]
+            keys.discard(key)
+            if not keys:
+                del index[target]
+
+    def dependents(self, cells: Iterable[Key]) -> Set[Key]:
+        """Формулы, которые прямо или через другие формулы зависят от ячеек `cells`."""
+        result: Set[Key] = set()
+        stack = list(cells)
+        while stack:
+            row, col = stack.pop()
+            for group in (self.by_cell.get((row, col)), self.by_column.get(col), self.by_row.get(row)):
+                for key in group or ():
+                    if key not in result:
+                        result.add(key)
+                        stack.append(key)
+        return result
+
+    def display(self, key: Key) -> Optional[str]:
+        value = self.values.get(key)
+        if value is None:
+            return None
+        return value if isinstance(value, str) else format_number(value)
+
+    def substitute(self, row: int, values: List[str]) -> List[str]:
+        """Значения строки для вывода: вместо формул — вычисленные значения."""
+        if not self.formulas or row > self.last_row:
+            return values
+        shown = None
+        for col in range(len(values)):
+            if (row, col) in self.formulas:
+                if shown is None:
+                    shown = list(values)
+                shown[col] = self.display((row, col)) or ERROR_VALUE
+        return shown or values
+
+    def on_change(self, change):
+        if change.event == "set":
+            key = (change.row, change.col)
+            was_formula = key in self.formulas
+            is_formula = change.new.startswith(FORMULA_PREFIX)
+            if not was_formula and not is_formula and not self.formulas:
+                return
+            previous = {key: self.remove(key)} if was_formula else {}
+            if is_formula and self.add(change.row, change.col, change.new):
+                previous.setdefault(key, None)
+            self.recompute(self.dependents([key]) | set(previous), previous)
+        elif change.event in ("append", "insert"):
+            has_formula = any(value.startswith(FORMULA_PREFIX) for value in change.new)
+            if not self.formulas and not has_formula:
+                return
+            self.shift(change.row, 1)
+            added = [
+                (change.row, col)
+                for col, value in enumerate(change.new)
+                if value.startswith(FORMULA_PREFIX) and self.add(change.row, col, value)
+            ]
+            dirty = self.affected_by_rows(change.row, change.new) | self.dependents(added) | set(added)
+            self.recompute(dirty, dict.fromkeys(added))
+        elif change.event == "delete":
+            if not self.formulas:
+                return
+            if change.row <= self.last_row:
+                for key in [(change.row, col) for col in range(len(change.old)) if (change.row, col) in self.formulas]:
+                    self.table.notify_computed(key[0], key[1], self.remove(key), None)
+            self.shift(change.row + 1, -1)
+            self.recompute(self.affected_by_rows(change.row, change.old), {})
+
+    def shift(self, start: int, delta: int):
+        """Сдвигает формулы в строках начиная со `start` после вставки или удаления строки.
+
+        Переиндексируются только сдвинутые формулы: их ссылки на свою строку
+        сдвигаются вместе с ними, а ссылки на номера строк не меняются.
+        """
+        first = bisect_left(self.rows, start)
+        moved_rows = self.rows[first:]
+        if not moved_rows:
+            return
+        entries = []
+        for row in moved_rows:
+            for col in self.row_columns.pop(row):
+                key = (row, col)
+                self.unindex(key)
+                node, pattern = self.formulas.pop(key), self.patterns.pop(key)
+                entries.append((key, node, pattern, self.values.pop(key, None), key in self.errors))
+                self.errors.discard(key)
+        self.rows[first:] = [row + delta for row in moved_rows]
+        for (row, col), node, pattern, value, error in entries:
+            key = (row + delta, col)
+            self.formulas[key] = node
+            self.patterns[key] = pattern
+            if value is not None:
+                self.values[key] = value
+            if error:
+                self.errors.add(key)
+            self.row_columns.setdefault(key[0], set()).add(col)
+            self.index(key)
+        self.last_row = self.rows[-1]
+
+    def affected_by_rows(self, start: int, values: List[str]) -> Set[Key]:
+        """Формулы, на которые влияет вставка или удаление строки `values` в позиции `start`.
+
+        Это агрегаты по столбцам, где в строке есть число или формула (пустые
+        и текстовые ячейки агрегаты не учитывают), и формулы со ссылками на
+        строки с номером не меньше `start`; ссылки на свою строку сдвигаются
+        вместе с формулой и не затрагиваются.
+        """
+        direct = set()
+        for col, value in enumerate(values):
+            if col in self.by_column and (value.startswith(FORMULA_PREFIX) or cell_number(value) is not None):
+                direct.update(self.by_column[col])
+        for row, keys in self.by_absolute_row.items():
+            if row >= start:
+                direct.update(keys)
+        return direct | self.dependents(direct)
+
+    def recompute(self, dirty: Set[Key], previous: Dict[Key, Optional[str]]):
+        """Пересчитывает формулы `dirty` и сообщает об изменившихся значениях.
+
+        Зависимости вычисляются раньше зависящих от них формул (обход в
+        глубину), поэтому каждая формула считается один раз.
+        """
+        for key in dirty:
+            if key not in previous:
+                previous[key] = self.display(key)
+            self.values.pop(key, None)
+        self.evaluate_all(dirty)
+        for key, old in previous.items():
+            new = self.display(key) if key in self.formulas else None
+            if new != old:
+                self.table.notify_computed(key[0], key[1], old, new)
+
+    def evaluate_all(self, keys: Optional[Set[Key]] = None):
+        """Вычисляет формулы `keys` (по умолчанию все), значения которых сброшены."""
+        self.stale = {key for key in (self.formulas if keys is None else keys) if key in self.formulas}
+        for key in sorted(self.cycles(self.stale)):
+            self.logger.warning("Формула в ячейке [строка %s, столбец %s] образует цикл", key[0] + 1, key[1] + 1)
+            self.store(key, ERROR_CYCLE)
+        for key in sorted(self.stale):
+            if key not in self.values:
+                self.evaluate(key)
+        self.stale = set()
+
+    def cycles(self, keys: Set[Key]) -> Set[Key]:
+        """Формулы из `keys`, лежащие на цикле ссылок между формулами из `keys`.
+
+        Формула на цикле зависит от самой себя, поэтому зависит и от
+        изменённой ячейки: если на цикле есть формула из `keys`, там весь
+        цикл. Компоненты сильной связности ищутся алгоритмом Тарьяна без
+        рекурсии.
+        """
+        by_column: Dict[int, List[Key]] = defaultdict(list)
+        for key in keys:
+            by_column[key[1]].append(key)
+
+        def successors(key: Key) -> Iterator[Key]:
+            row, col = key
+            cells, columns, rows = self.patterns[key]
+            for ref_row, ref_col in cells:
+                target = (row if ref_row is None else ref_row, col if ref_col is None else ref_col)
+                if target in keys:
+                    yield target
+            for ref_col in columns:
+                yield from (target for target in by_column.get(ref_col, ()) if target != key)
+            for ref_row in rows:
+                ref_row = row if ref_row is None else ref_row
+                for ref_col in self.row_columns.get(ref_row, ()):
+                    target = (ref_row, ref_col)
+                    if target != key and target in keys:
+                        yield target
+
+        found: Set[Key] = set()
+        order: Dict[Key, int] = {}
+        low: Dict[Key, int] = {}
+        stack: List[Key] = []
+        on_stack: Set[Key] = set()
+        for root in keys:
+            if root in order:
+                continue
+            order[root] = low[root] = len(order)
+            stack.append(root)
+            on_stack.add(root)
+            path = [(root, successors(root))]
+            while path:
+                key, targets = path[-1]
+                for target in targets:
+                    if target == key:
+                        found.add(key)
+                    elif target not in order:
+                        order[target] = low[target] = len(order)
+                        stack.append(target)
+                        on_stack.add(target)
+                        path.append((target, successors(target)))
+                        break
+                    elif target in on_stack:
+                        low[key] = min(low[key], order[target])
+                else:
+                    path.pop()
+                    if path:
+                        parent = path[-1][0]
+                        low[parent] = min(low[parent], low[key])
+                    if low[key] == order[key]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == key:
+                                break
+                        if len(component) > 1:
+                            found.update(component)
+        return found
+
+    def evaluate(self, key: Key) -> Union[float, str]:
+        if key in self.evaluating:
+            raise EvaluationError(ERROR_CYCLE)
+        self.evaluating.add(key)
+        try:
+            value: Union[float, str] = self.eval_node(self.formulas[key], key)
+        except EvaluationError as e:
+            value = e.code
+        except ZeroDivisionError:
+            value = ERROR_DIV0
+        finally:
+            self.evaluating.discard(key)
+        self.store(key, value)
+        return value
+
+    def store(self, key: Key, value: Union[float, str]):
+        self.values[key] = value
+        self.stale.discard(key)
+        if isinstance(value, str):
+            self.errors.add(key)
+        else:
+            self.errors.discard(key)
+        # Итоги по столбцу видят новое значение сразу, не дожидаясь события "computed"
+        numbers = self.table.queries.columns.get(key[1])
+        if numbers is not None:
+            numbers.set(key[0], NAN if isinstance(value, str) else value)
+
+    def eval_node(self, node: tuple, key: Key) -> float:
+        kind = node[0]
+        if kind == "num":
+            return node[1]
+        if kind == "cell":
+            row = key[0] if node[1] is None else node[1]
+            col = key[1] if node[2] is None else node[2]
+            value = self.value_at(row, col)
+            if value is None:
+                raise EvaluationError(ERROR_VALUE)
+            return value
+        if kind == "agg":
+            if node[2] == "column":
+                return self.column_aggregate(node[1], node[3], key, self.table.queries.numbers(node[3]))
+            row = key[0] if node[3] is None else node[3]
+            if not 0 <= row < len(self.table.data):
+                raise EvaluationError(ERROR_REF)
+            cells = ((row, col) for col in range(len(self.table.headers)))
+            numbers = [value for value in (self.value_at(*cell) for cell in cells if cell != key) if value is not None]
+            return aggregate(node[1], numbers)
+        left = self.eval_node(node[2], key)
+        right = self.eval_node(node[3], key)
+        if node[1] == "+":
+            return left + right
+        if node[1] == "-":
+            return left - right
+        if node[1] == "*":
+            return left * right
+        return left / right
+
+    def column_aggregate(self, function: str, col: int, key: Key, numbers) -> float:
+        """Итог по столбцу из сумм и количеств ColumnNumbers, без прохода по строкам."""
+        # Формулы столбца, которые в этом проходе ещё не пересчитаны, считаются раньше итога
+        for stale in sorted(other for other in self.stale if other[1] == col and other != key):
+            self.evaluate(stale)
+        errors = sorted(other for other in self.errors if other[1] == col and other != key)
+        if errors:
+            raise EvaluationError(self.values[errors[0]])
+        if key[1] == col:
+            # Своя ячейка в итог не входит; её новое значение запишется после вычисления
+            numbers.set(key[0], NAN)
+        # Текущая сумма после вычитаний может округлиться до -0.0; "+ 0.0" убирает знак нуля
+        if function == "сумма":
+            return round(numbers.total, AGGREGATE_DIGITS) + 0.0
+        if not numbers.count:
+            raise EvaluationError(ERROR_VALUE)
+        if function == "среднее":
+            return round(numbers.total / numbers.count, AGGREGATE_DIGITS) + 0.0
+        numbers.extremes()
+        return numbers.maximum if function == "максимум" else numbers.minimum
+
+    def value_at(self, row: int, col: int) -> Optional[float]:
+        """Числовое значение ячейки: вычисленное для формулы, None для текста и пустых ячеек."""
+        key = (row, col)
+        if key in self.formulas:
+            value = self.values[key] if key in self.values else self.evaluate(key)
+            if isinstance(value, str):
+                raise EvaluationError(value)
+            return value
+        if not (0 <= row < len(self.table.data) and 0 <= col < len(self.table.headers)):
+            raise EvaluationError(ERROR_REF)
+        return cell_number(self.table.data.get(row, col))
+
+
+def aggregate(function: str, numbers: List[float]) -> float:
+    """Итог по строке; округляется так же, как итог по столбцу (FormulaEngine.column_aggregate)."""
+    if function == "сумма":
+        return round(sum(numbers), AGGREGATE_DIGITS) + 0.0
+    if not numbers:
+        raise EvaluationError(ERROR_VALUE)
+    if function == "среднее":
+        return round(sum(numbers) / len(numbers), AGGREGATE_DIGITS) + 0.0
+    if function == "максимум":
+        return max(numbers)
+    return min(numbers)
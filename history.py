@@ -0,0 +1,249 @@
+import logging
+from collections import deque
+from typing import Optional, Tuple
+from table import Table, TableChange
+from constants import HISTORY_MAX_STEPS, HISTORY_MAX_BYTES, HISTORY_CHECKPOINT_EVERY
+
+# Условный размер записи без учёта значений ячеек, байт
+RECORD_OVERHEAD = 64
+
+
+class CellEdit:
+    """Изменение значения ячейки."""
+
+    __slots__ = ("row", "col", "old", "new")
+
+    def __init__(self, row: int, col: int, old: str, new: str):
+        self.row = row
+        self.col = col
+        self.old = old
+        self.new = new
+
+    def undo(self, table: Table):
+        table.apply_change(TableChange("set", self.row, self.col, new=self.old))
+
+    def redo(self, table: Table):
+        table.apply_change(TableChange("set", self.row, self.col, new=self.new))
+
+    def size(self) -> int:
+        return RECORD_OVERHEAD + len(self.old) + len(self.new)
+
+
+class RowInsert:
+    """Добавление строки в конец или вставка строки."""
+
+    __slots__ = ("row", "values")
+
+    def __init__(self, row: int, values: Tuple[str, ...]):
+        self.row = row
+        self.values = values
+
+    def undo(self, table: Table):
+        table.apply_change(TableChange("delete", self.row))
+
+    def redo(self, table: Table):
+        table.apply_change(TableChange("insert", self.row, new=self.values))
+
+    def size(self) -> int:
+        return RECORD_OVERHEAD + sum(len(value) for value in self.values)
+
+
+class RowDelete:
+    """Удаление строки; хранит её значения для восстановления."""
+
+    __slots__ = ("row", "values")
+
+    def __init__(self, row: int, values: Tuple[str, ...]):
+        self.row = row
+        self.values = values
+
+    def undo(self, table: Table):
+        table.apply_change(TableChange("insert", self.row, new=self.values))
+
+    def redo(self, table: Table):
+        table.apply_change(TableChange("delete", self.row))
+
+    def size(self) -> int:
+        return RECORD_OVERHEAD + sum(len(value) for value in self.values)
+
+
+class Step:
+    """Изменения таблицы, сделанные одной командой, и положение курсора до и после неё.
+
+    `checkpoint` отмечает, что после этого шага стоит контрольная точка.
+    """
+
+    __slots__ = ("label", "ops", "cursor_before", "cursor_after", "size", "checkpoint")
+
+    def __init__(self, label: str, cursor_before: Tuple[int, int]):
+        self.label = label
+        self.ops = []
+        self.cursor_before = cursor_before
+        self.cursor_after = cursor_before
+        self.size = RECORD_OVERHEAD
+        self.checkpoint = False
+
+
+class History:
+    """Журнал отмены и повтора действий над одной таблицей.
+
+    Подписывается на изменения таблицы и группирует их в шаги: всё, что
+    изменилось между `begin` и `commit`, отменяется одной командой "отмена".
+    Отмена применяет обратные изменения через `Table.apply_change`, поэтому
+    её стоимость зависит только от числа изменённых ячеек и строк.
+
+    Хранится не больше `max_steps` шагов и примерно `max_bytes` байт значений,
+    самые старые шаги отбрасываются; последний шаг остаётся всегда, даже
+    если он один больше `max_bytes`. Каждые `checkpoint_every` шагов
+    ставится контрольная точка; `rollback` отменяет все шаги до предыдущей
+    точки. Контрольная точка — отметка на шаге, а не копия таблицы: откат
+    идёт через те же обратные изменения, поэтому подписчики таблицы (вывод,
+    индексы, формулы, журнал) получают обычные события и не пересчитываются
+    целиком.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        max_steps: int = HISTORY_MAX_STEPS,
+        max_bytes: int = HISTORY_MAX_BYTES,
+        checkpoint_every: int = HISTORY_CHECKPOINT_EVERY,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.table = table
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        self.checkpoint_every = checkpoint_every
+        self.done = deque()
+        self.undone = []
+        self.bytes = 0
+        self.steps_since_checkpoint = 0
+        self.current: Optional[Step] = None
+        self.recording = True
+        table.add_listener(self.on_change)
+
+    def __len__(self) -> int:
+        return len(self.done)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.undone)
+
+    def cursor(self) -> Tuple[int, int]:
+        return self.table.current_row, self.table.current_col
+
+    def begin(self, label: str = ""):
+        """Начинает шаг: следующие изменения таблицы отменяются вместе."""
+        self.current = Step(label, self.cursor())
+
+    def on_change(self, change: TableChange):
+        if not self.recording:
+            return
+        if change.event == "set":
+            op = CellEdit(change.row, change.col, change.old, change.new)
+        elif change.event in ("append", "insert"):
+            op = RowInsert(change.row, tuple(change.new))
+        elif change.event == "delete":
+            op = RowDelete(change.row, tuple(change.old))
+        else:
+            return
+        if self.current is None:
+            # Изменение вне команды (например, из кода) становится отдельным шагом
+            self.begin()
+            self.current.ops.append(op)
+            self.current.size += op.size()
+            self.commit()
+            return
+        self.current.ops.append(op)
+        self.current.size += op.size()
+
+    def commit(self):
+        """Завершает шаг. Шаги без изменений таблицы не сохраняются."""
+        step, self.current = self.current, None
+        if step is None or not step.ops:
+            return
+        step.cursor_after = self.cursor()
+        self.done.append(step)
+        self.bytes += step.size
+        self.clear_redo()
+        self.steps_since_checkpoint += 1
+        if self.steps_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+        self.trim()
+
+    def clear_redo(self):
+        """Забывает отменённые шаги: после нового действия их нельзя повторить."""
+        self.undone.clear()
+
+    def trim(self):
+        """Отбрасывает самые старые шаги сверх ограничений; последний шаг не отбрасывается."""
+        while len(self.done) > 1 and (len(self.done) > self.max_steps or self.bytes > self.max_bytes):
+            self.bytes -= self.done.popleft().size
+
+    def checkpoint(self) -> bool:
+        """Ставит контрольную точку после последнего шага."""
+        self.steps_since_checkpoint = 0
+        if not self.done:
+            return False
+        self.done[-1].checkpoint = True
+        return True
+
+    def undo(self) -> Optional[Step]:
+        """Отменяет последний шаг и возвращает его (None, если отменять нечего)."""
+        if not self.done:
+            return None
+        step = self.done.pop()
+        self.bytes -= step.size
+        self.recording = False
+        try:
+            for op in reversed(step.ops):
+                op.undo(self.table)
+        finally:
+            self.recording = True
+        self.table.current_row, self.table.current_col = step.cursor_before
+        self.undone.append(step)
+        self.steps_since_checkpoint = max(self.steps_since_checkpoint - 1, 0)
+        return step
+
+    def redo(self) -> Optional[Step]:
+        """Повторяет последний отменённый шаг и возвращает его (None, если повторять нечего)."""
+        if not self.undone:
+            return None
+        step = self.undone.pop()
+        self.recording = False
+        try:
+            for op in step.ops:
+                op.redo(self.table)
+        finally:
+            self.recording = True
+        self.table.current_row, self.table.current_col = step.cursor_after
+        self.done.append(step)
+        self.bytes += step.size
+        self.steps_since_checkpoint += 1
+        return step
+
+    def rollback(self) -> int:
+        """Отменяет шаги до предыдущей контрольной точки. Возвращает число отменённых шагов."""
+        count = 0
+        while self.undo():
+            count += 1
+            if self.done and self.done[-1].checkpoint:
+                break
+        self.steps_since_checkpoint = 0
+        return count
+
+    def close(self):
+        """Отписывается от изменений таблицы."""
+        if self.table is not None and self.on_change in self.table.listeners:
+            self.table.remove_listener(self.on_change)
+
+    def detach(self):
+        """Отвязывает историю от выгружаемой из памяти таблицы; шаги остаются."""
+        self.close()
+        self.table = None
+        self.current = None
+
+    def attach(self, table: Table):
+        """Привязывает историю к заново загруженной таблице с тем же содержимым."""
+        self.table = table
+        table.add_listener(self.on_change)
@@ -0,0 +1,280 @@
+import csv
+import glob
+import json
+import logging
+import os
+import shutil
+import time
+from typing import List, Optional
+from export import ExportJob, Exporter, TableSnapshot, write_export
+from table import Table, TableChange
+from constants import JOURNAL_DIR, JOURNAL_FSYNC_EVERY, JOURNAL_FSYNC_INTERVAL, JOURNAL_COMPACT_EVERY
+
+JOURNAL_SUFFIX = ".jsonl"
+SNAPSHOT_SUFFIX = ".snapshot.csv"
+# Прежний журнал и новый снимок, пока сжатие журнала не закончено
+OLD_SUFFIX = ".old"
+NEW_SUFFIX = ".new"
+
+
+def journal_path(name: str, directory: str = JOURNAL_DIR) -> str:
+    """Путь к журналу таблицы с указанным именем."""
+    return os.path.join(directory, name.replace(os.sep, "_") + JOURNAL_SUFFIX)
+
+
+class TableJournal:
+    """Журнал изменений таблицы, защищающий несохранённую работу от сбоев.
+
+    Каждое изменение таблицы дописывается в конец файла одной строкой JSON,
+    поэтому стоимость записи не зависит от размера таблицы. Данные
+    сбрасываются на диск (fsync) пачками: раз в `fsync_every` записей или
+    `fsync_interval` секунд. После `compact_every` записей журнал сжимается:
+    журнал начинается заново, а таблица целиком пишется в снимок CSV.
+    Снимок пишется в фоне через `exporter` (без него — сразу), поэтому
+    голосовой цикл не ждёт записи всей таблицы. При запуске `restore`
+    собирает таблицу из снимка и журнала.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        directory: str = JOURNAL_DIR,
+        fsync_every: int = JOURNAL_FSYNC_EVERY,
+        fsync_interval: float = JOURNAL_FSYNC_INTERVAL,
+        compact_every: int = JOURNAL_COMPACT_EVERY,
+        exporter: Optional[Exporter] = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.table = table
+        self.path = journal_path(table.name, directory)
+        self.snapshot_path = self.path[: -len(JOURNAL_SUFFIX)] + SNAPSHOT_SUFFIX
+        self.exporter = exporter
+        # Фоновая запись снимка при сжатии журнала
+        self.compacting: Optional[ExportJob] = None
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.records_since_compact = 0
+        self.cursor = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, base: Optional[str] = None):
+        """Начинает журнал со снимка текущего состояния и подписывается на изменения.
+
+        Первый снимок нужен сразу: без него журнал не к чему применять.
+        Если задан `base` — CSV с тем же содержимым, что у таблицы (файл
+        хранилища рабочего пространства), — снимком становится жёсткая
+        ссылка на этот файл, и таблица не переписывается. Хранилище
+        заменяется только целиком (os.replace), поэтому снимок после этого
+        не меняется. Без `base` таблица пишется в снимок сразу.
+        """
+        self.wait_compaction()
+        if self.file:
+            self.file.close()
+        if base is None:
+            self.write_snapshot()
+        else:
+            self.link_snapshot(base)
+        for path in (self.path + OLD_SUFFIX, self.snapshot_path + NEW_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+        self.write_header()
+        self.table.add_listener(self.on_change)
+
+    def resume(self):
+        """Продолжает журнал, приостановленный вызовом close, с того же места."""
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.last_sync = time.monotonic()
+        self.table.add_listener(self.on_change)
+
+    def on_change(self, change: TableChange):
+        if change.event == "set":
+            self.write({"op": "set", "r": change.row, "c": change.col, "v": change.new})
+        elif change.event in ("append", "insert"):
+            self.write({"op": change.event, "r": change.row, "v": list(change.new)})
+        elif change.event == "delete":
+            self.write({"op": "delete", "r": change.row})
+
+    def record_cursor(self):
+        """Записывает позицию курсора, если она изменилась (вызывается после каждой команды)."""
+        cursor = (self.table.current_row, self.table.current_col)
+        if cursor != self.cursor:
+            self.cursor = cursor
+            self.write({"op": "cursor", "r": cursor[0], "c": cursor[1]})
+        if self.records_since_compact >= self.compact_every:
+            self.compact()
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Запись уходит в ОС сразу, а fsync — пачкой
+        self.file.flush()
+        self.unsynced += 1
+        self.records_since_compact += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.file and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def compact(self):
+        """Начинает журнал заново, а таблицу записывает в снимок в фоне.
+
+        В голосовом цикле снимается только TableSnapshot, прежний журнал
+        переименовывается в .old, и начинается новый. Фоновое задание пишет
+        снимок в файл .new (через временный файл и переименование), затем
+        удаляет прежний журнал и ставит снимок на место. Пока задание не
+        закончено, `restore` берёт прежний снимок и оба журнала.
+        """
+        if self.compacting is not None and not self.compacting.done.is_set():
+            # Прежнее сжатие ещё пишется; журнал сожмётся после следующей команды
+            return
+        self.settle_compaction()
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+        snapshot = TableSnapshot(self.table)
+        old_path = self.path + OLD_SUFFIX
+        os.replace(self.path, old_path)
+        self.write_header()
+        new_path = self.snapshot_path + NEW_SUFFIX
+        snapshot_path = self.snapshot_path
+
+        def commit():
+            # Снимок .new уже записан целиком, прежний журнал больше не нужен
+            os.remove(old_path)
+            os.replace(new_path, snapshot_path)
+
+        tasks = [lambda: write_export(new_path, snapshot.headers, snapshot.rows(display=False)), commit]
+        label = f"сжатие журнала '{self.table.name}'"
+        if self.exporter is not None:
+            self.compacting = self.exporter.submit(label, tasks)
+        else:
+            self.compacting = ExportJob(label, tasks)
+            self.compacting.run()
+            self.settle_compaction()
+        self.logger.info("Журнал таблицы '%s' сжимается в снимок %s", self.table.name, self.snapshot_path)
+
+    def write_header(self):
+        """Начинает новый файл журнала с описания таблицы и позиции курсора."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            header = {"op": "table", "name": self.table.name, "headers": self.table.headers, "storage": self.table.storage}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"op": "cursor", "r": self.table.current_row, "c": self.table.current_col}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.cursor = (self.table.current_row, self.table.current_col)
+        self.unsynced = 0
+        self.records_since_compact = 0
+
+    def settle_compaction(self):
+        """Учитывает законченное сжатие; если снимок не записался, журнал останется в двух файлах."""
+        job, self.compacting = self.compacting, None
+        if job is not None and job.error is not None:
+            self.logger.error("Не удалось сжать журнал таблицы '%s': %s", self.table.name, job.error)
+
+    def wait_compaction(self):
+        if self.compacting is not None:
+            self.compacting.done.wait()
+            self.settle_compaction()
+
+    def write_snapshot(self):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.table.headers)
+            writer.writerows(self.table.data.rows())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def link_snapshot(self, base: str):
+        tmp_path = self.snapshot_path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(base, tmp_path)
+        except OSError:
+            # Другая файловая система или ссылки не поддерживаются: файл копируется без разбора строк
+            shutil.copyfile(base, tmp_path)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def close(self, remove: bool = False):
+        """Закрывает журнал. При `remove` удаляет его вместе со снимком (таблица сохранена)."""
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+        if self.on_change in self.table.listeners:
+            self.table.remove_listener(self.on_change)
+        if remove:
+            self.wait_compaction()
+            for path in (self.path, self.snapshot_path, self.path + OLD_SUFFIX, self.snapshot_path + NEW_SUFFIX):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def find(directory: str = JOURNAL_DIR) -> List[str]:
+        """Возвращает журналы несохранённых таблиц, начиная с самого свежего."""
+        paths = glob.glob(os.path.join(directory, "*" + JOURNAL_SUFFIX))
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    @staticmethod
+    def read_records(path: str) -> List[dict]:
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f):
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Последняя строка могла оборваться при сбое
+                    logging.getLogger(__name__).warning("Журнал %s: пропущена повреждённая строка %s", path, number + 1)
+        return records
+
+    @staticmethod
+    def restore(path: str) -> Optional[Table]:
+        """Восстанавливает таблицу из снимка и журнала. Возвращает None, если журнал пуст."""
+        logger = logging.getLogger(__name__)
+        records = TableJournal.read_records(path)
+        if not records or records[0].get("op") != "table":
+            return None
+
+        header = records[0]
+        snapshot_path = path[: -len(JOURNAL_SUFFIX)] + SNAPSHOT_SUFFIX
+        if os.path.exists(path + OLD_SUFFIX):
+            # Сжатие не закончилось: прежний снимок, прежний журнал, затем новый
+            old_records = TableJournal.read_records(path + OLD_SUFFIX)
+            records = records[:1] + old_records[1:] + records[1:]
+        elif os.path.exists(snapshot_path + NEW_SUFFIX):
+            # Новый снимок записан, но не успел встать на место
+            snapshot_path += NEW_SUFFIX
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                table = Table(header["name"], header["headers"], storage=header.get("storage"), rows=reader)
+        else:
+            table = Table(header["name"], header["headers"], storage=header.get("storage"))
+        for record in records[1:]:
+            op = record["op"]
+            if op == "cursor":
+                table.current_row, table.current_col = record["r"], record["c"]
+            elif op == "set":
+                table.apply_change(TableChange("set", record["r"], record["c"], new=record["v"]))
+            elif op in ("append", "insert"):
+                table.apply_change(TableChange(op, record["r"], new=record["v"]))
+            elif op == "delete":
+                table.apply_change(TableChange("delete", record["r"]))
+        table.current_row = min(table.current_row, len(table.data) - 1)
+        table.current_col = min(table.current_col, len(table.headers) - 1)
+        logger.info("Таблица '%s' восстановлена из журнала %s: %s записей", table.name, path, len(records) - 1)
+        return table
@@ -1,24 +1,107 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
+from constants import LOG_DIR, LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_ROTATION, LOG_MAX_BYTES, LOG_ROTATE_WHEN, LOG_BACKUP_COUNT
 
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
-def setup_logging(console_output=True):
+# Настройка выполняется один раз на процесс; после fork — заново
+_listener = None
+_listener_pid = None
 
-    logs_dir = "logs"
-    os.makedirs(logs_dir, exist_ok=True)
-    log_filename = os.path.join(logs_dir, 'voice_table.log')
-    
-    logger = logging.getLogger(__name__)
-    if not logger.handlers:
-        handlers = [logging.FileHandler(log_filename, encoding="utf-8")]
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись как одну строку JSON для машинной обработки."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def create_file_handler(path: str, rotation: str) -> logging.Handler:
+    """Файловый обработчик с ротацией по размеру ("size"), по времени ("time") или без неё."""
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    return logging.FileHandler(path, encoding="utf-8")
+
+
+def create_console_handler() -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging(console_output=True, log_format: str = LOG_FORMAT, rotation: str = LOG_ROTATION):
+    """Настраивает логирование процесса и возвращает логгер.
+
+    Записи попадают в очередь через QueueHandler, а в файл (и в консоль)
+    их пишет QueueListener в отдельном потоке, поэтому медленный диск не
+    задерживает распознавание. Повторные вызовы ничего не перенастраивают,
+    только при необходимости добавляют вывод в консоль.
+    `log_format`: "text" или "json" (одна запись JSON на строку).
+    """
+    global _listener, _listener_pid
+
+    if _listener is not None and _listener_pid == os.getpid():
+        if console_output and not any(
+            type(handler) is logging.StreamHandler for handler in _listener.handlers
+        ):
+            _listener.handlers += (create_console_handler(),)
+        return logging.getLogger(__name__)
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = create_file_handler(os.path.join(LOG_DIR, LOG_FILE), rotation)
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    handlers = [file_handler]
     if console_output:
-        handlers.append(logging.StreamHandler())
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        handlers=handlers
-    )
-    
+        handlers.append(create_console_handler())
+
+    root = logging.getLogger()
+    # Обработчики, унаследованные от родительского процесса, пишут в очередь без слушателя
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+    atexit.register(stop_logging)
     return logging.getLogger(__name__)
+
+
+def stop_logging():
+    """Дописывает накопленные записи и останавливает поток логирования.
+
+    Записи, сделанные позже (например, из __del__ при выходе), пишутся
+    обработчиками напрямую.
+    """
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+    _listener = None
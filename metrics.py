@@ -0,0 +1,194 @@
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional, TextIO, Tuple
+from constants import METRICS_WINDOW, METRICS_BUDGET_SECONDS
+
+# Этапы обработки команды в порядке выполнения
+STAGES = ("recognition", "dispatch", "convert", "table", "display", "save", "total")
+STAGE_NAMES = {
+    "recognition": "распознавание",
+    "dispatch": "разбор",
+    "convert": "числа",
+    "table": "таблица",
+    "display": "вывод",
+    "save": "сохранение",
+    "total": "всего",
+}
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """Последние `window` измерений; перцентили считаются только по запросу."""
+
+    __slots__ = ("values", "count", "total")
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.values.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=QUANTILES) -> List[float]:
+        """Перцентили по окну (метод ближайшего ранга)."""
+        ordered = sorted(self.values)
+        if not ordered:
+            return [0.0 for _ in quantiles]
+        return [ordered[max(math.ceil(q * len(ordered)) - 1, 0)] for q in quantiles]
+
+
+class StageTimer:
+    """Контекстный менеджер, добавляющий время выполнения блока к этапу текущей команды."""
+
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics: "CommandMetrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.add(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class CommandMetrics:
+    """Время этапов обработки голосовых команд с разбивкой по типам команд.
+
+    Во время обработки фразы этапы накапливаются в `pending`, а в `finish`
+    попадают в скользящие гистограммы по паре (тип команды, этап). Этап
+    "dispatch" — разбор фразы и выбор обработчика. Этап "total" считается
+    от конца речи (прихода последнего блока звука) до завершения команды.
+    Если он превышает `budget`, в лог пишется разбивка по этапам.
+    """
+
+    def __init__(self, window: int = METRICS_WINDOW, budget: float = METRICS_BUDGET_SECONDS):
+        self.logger = logging.getLogger(__name__)
+        self.window = window
+        self.budget = budget
+        self.histograms: Dict[Tuple[str, str], RollingHistogram] = {}
+        self.pending: Dict[str, float] = {}
+        self.speech_end: Optional[float] = None
+        self.over_budget = 0
+
+    def stage(self, name: str) -> StageTimer:
+        return StageTimer(self, name)
+
+    def add(self, stage: str, seconds: float):
+        self.pending[stage] = self.pending.get(stage, 0.0) + seconds
+
+    def recognized(self, speech_end: float):
+        """Отмечает, что фраза распознана; `speech_end` — время прихода последнего блока речи.
+
+        Блок приходит целиком (CHUNK_SIZE фреймов, 0,25 с), поэтому речь
+        могла закончиться раньше на длину блока: это время ожидания блока в
+        "распознавание" и "всего" не входит.
+        """
+        self.speech_end = speech_end
+        self.pending["recognition"] = time.perf_counter() - speech_end
+
+    def start(self) -> float:
+        """Начинает обработку распознанной фразы и возвращает время начала."""
+        return time.perf_counter()
+
+    def finish(self, kind: str, started: float):
+        """Сохраняет этапы обработанной команды типа `kind`."""
+        end = time.perf_counter()
+        total = end - (self.speech_end if self.speech_end is not None else started)
+        self.pending["total"] = total
+        for stage, seconds in self.pending.items():
+            histogram = self.histograms.get((kind, stage))
+            if histogram is None:
+                histogram = self.histograms[(kind, stage)] = RollingHistogram(self.window)
+            histogram.add(seconds)
+        if total > self.budget:
+            self.over_budget += 1
+            stages = ", ".join(f"{stage} {seconds:.3f}" for stage, seconds in self.pending.items())
+            self.logger.warning("Команда '%s' выполнялась %.2f с: %s", kind, total, stages)
+        self.pending = {}
+        self.speech_end = None
+
+    def summary(self) -> List[dict]:
+        """Статистика по каждой паре (тип команды, этап)."""
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        rows = []
+        for (kind, stage), histogram in sorted(
+            self.histograms.items(), key=lambda item: (item[0][0], order.get(item[0][1], len(order)))
+        ):
+            p50, p95, p99 = histogram.percentiles()
+            rows.append(
+                {
+                    "command": kind,
+                    "stage": stage,
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "p50": p50,
+                    "p95": p95,
+                    "p99": p99,
+                }
+            )
+        return rows
+
+    def report(self, file: Optional[TextIO] = None):
+        """Выводит перцентили времени этапов в миллисекундах."""
+        rows = self.summary()
+        if not rows:
+            print("Статистика пока не собрана", file=file)
+            return
+        print(f"\nВремя обработки команд, мс (p50 / p95 / p99), бюджет {self.budget:.1f} с:", file=file)
+        kind = None
+        for row in rows:
+            if row["command"] != kind:
+                kind = row["command"]
+                print(f"{kind}:", file=file)
+            print(
+                f"  {STAGE_NAMES.get(row['stage'], row['stage'])}: "
+                f"{row['p50'] * 1000:.1f} / {row['p95'] * 1000:.1f} / {row['p99'] * 1000:.1f} (n={row['count']})",
+                file=file,
+            )
+        if self.over_budget:
+            print(f"Превышений бюджета: {self.over_budget}", file=file)
+
+    def to_prometheus(self) -> str:
+        """Статистика в текстовом формате Prometheus (тип summary)."""
+        lines = [
+            "# HELP voice_table_command_seconds Время этапов обработки голосовой команды",
+            "# TYPE voice_table_command_seconds summary",
+        ]
+        for row in self.summary():
+            labels = f'command="{escape_label(row["command"])}",stage="{row["stage"]}"'
+            for quantile, key in zip(QUANTILES, ("p50", "p95", "p99")):
+                lines.append(f'voice_table_command_seconds{{{labels},quantile="{quantile}"}} {row[key]:.6f}')
+            lines.append(f"voice_table_command_seconds_sum{{{labels}}} {row['sum']:.6f}")
+            lines.append(f"voice_table_command_seconds_count{{{labels}}} {row['count']}")
+        lines.append("# HELP voice_table_over_budget_total Команды, превысившие бюджет времени отклика")
+        lines.append("# TYPE voice_table_over_budget_total counter")
+        lines.append(f"voice_table_over_budget_total {self.over_budget}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory: str):
+        """Записывает статистику в metrics.json и metrics.prom в указанной папке."""
+        if not self.histograms:
+            return
+        os.makedirs(directory, exist_ok=True)
+        data = {"budget_seconds": self.budget, "over_budget": self.over_budget, "stages": self.summary()}
+        with open(os.path.join(directory, "metrics.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(directory, "metrics.prom"), "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        self.logger.info("Статистика времени команд записана в %s", directory)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
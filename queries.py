@@ -0,0 +1,283 @@
+from array import array
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence
+from constants import EMPTY_CELL
+from formulas import FORMULA_PREFIX, cell_number
+
+NAN = float("nan")
+
+COMPARISONS = ("равно", "больше", "меньше")
+
+# После "больше" и "меньше" числа звучат в родительном падеже ("больше тридцати"),
+# а text2num понимает только именительный
+GENITIVE_NUMBERS = {
+    "одного": "один", "двух": "два", "трёх": "три", "трех": "три", "четырёх": "четыре", "четырех": "четыре",
+    "сорока": "сорок", "девяноста": "девяносто", "ста": "сто",
+    "двухсот": "двести", "трёхсот": "триста", "трехсот": "триста", "четырёхсот": "четыреста",
+    "четырехсот": "четыреста", "тысяч": "тысяча", "миллионов": "миллион",
+}
+for _word in (
+    "пять шесть семь восемь девять десять одиннадцать двенадцать тринадцать четырнадцать "
+    "пятнадцать шестнадцать семнадцать восемнадцать девятнадцать двадцать тридцать"
+).split():
+    GENITIVE_NUMBERS[_word[:-1] + "и"] = _word
+for _tens in ("пять", "шесть", "семь", "восемь"):
+    GENITIVE_NUMBERS[_tens[:-1] + "идесяти"] = _tens + "десят"
+    GENITIVE_NUMBERS[_tens[:-1] + "исот"] = _tens + "сот"
+GENITIVE_NUMBERS["девятисот"] = "девятьсот"
+
+
+def nominative_number(words) -> str:
+    """Переводит числительные в родительном падеже в именительный, остальные слова не меняет."""
+    return " ".join(GENITIVE_NUMBERS.get(word, word) for word in words)
+
+
+def number_or_nan(value: str) -> float:
+    """Число из значения ячейки; NaN для текста, пустых ячеек и формул."""
+    if value.startswith(FORMULA_PREFIX):
+        return NAN
+    number = cell_number(value)
+    return NAN if number is None else number
+
+
+class ColumnNumbers:
+    """Числа одного столбца в array('d') и итоги по ним.
+
+    Текст, пустые ячейки и формулы с ошибкой хранятся как NaN и в итоги не
+    входят. Сумма и количество чисел обновляются при каждом изменении ячейки.
+    Минимум и максимум тоже, пока из столбца не уходит крайнее значение;
+    тогда они пересчитываются при следующем запросе.
+    """
+
+    __slots__ = ("values", "total", "count", "minimum", "maximum", "stale")
+
+    def __init__(self, values: array):
+        import numpy as np
+
+        self.values = values
+        numbers = np.frombuffer(values, dtype=np.float64)
+        present = ~np.isnan(numbers)
+        self.count = int(np.count_nonzero(present))
+        self.total = float(numbers[present].sum())
+        del numbers
+        self.minimum = self.maximum = NAN
+        self.stale = True
+
+    def add(self, number: float):
+        if number != number:
+            return
+        self.total += number
+        self.count += 1
+        if not self.stale:
+            self.minimum = min(self.minimum, number)
+            self.maximum = max(self.maximum, number)
+
+    def discard(self, number: float):
+        if number != number:
+            return
+        self.count -= 1
+        # Без чисел сумма точно ноль, а не накопленная ошибка округления
+        self.total = self.total - number if self.count else 0.0
+        if not self.stale and (number <= self.minimum or number >= self.maximum):
+            self.stale = True
+
+    def set(self, row: int, number: float):
+        self.discard(self.values[row])
+        self.values[row] = number
+        self.add(number)
+
+    def insert(self, row: int, number: float):
+        self.values.insert(row, number)
+        self.add(number)
+
+    def pop(self, row: int):
+        self.discard(self.values.pop(row))
+
+    def extremes(self):
+        """Пересчитывает минимум и максимум, если они устарели."""
+        if self.stale and self.count:
+            import numpy as np
+
+            numbers = np.frombuffer(self.values, dtype=np.float64)
+            self.minimum = float(np.nanmin(numbers))
+            self.maximum = float(np.nanmax(numbers))
+            # Представление буфера держит array от изменения размера, поэтому сразу отпускается
+            del numbers
+            self.stale = False
+
+
+class RowView:
+    """Строки таблицы в заданном порядке — только номера строк, без копирования значений."""
+
+    __slots__ = ("table", "rows", "title")
+
+    def __init__(self, table, rows: Sequence[int], title: str):
+        self.table = table
+        self.rows = rows
+        self.title = title
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for row in self.rows:
+            yield self.table.display_row(int(row))
+
+
+class TableQueries:
+    """Итоги по столбцам, сортировка и отбор строк таблицы.
+
+    Числа столбца разбираются из строк один раз, при первом запросе к нему,
+    и дальше поддерживаются подпиской на изменения таблицы вместе с итогами
+    (ColumnNumbers). Поэтому сумма и среднее отвечают сразу, а сортировка и
+    отбор выполняются операциями numpy над массивом чисел или кодами
+    текстового столбца. Результат сортировки и отбора — RowView с номерами
+    строк; значения при выводе берутся из таблицы.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.columns: Dict[int, ColumnNumbers] = {}
+        table.add_listener(self.on_change)
+
+    def on_change(self, change):
+        if not self.columns:
+            return
+        if change.event == "set":
+            numbers = self.columns.get(change.col)
+            if numbers is not None:
+                numbers.set(change.row, number_or_nan(change.new))
+        elif change.event in ("append", "insert"):
+            for col, numbers in self.columns.items():
+                numbers.insert(change.row, number_or_nan(change.new[col]))
+        elif change.event == "delete":
+            for numbers in self.columns.values():
+                numbers.pop(change.row)
+        elif change.event == "computed" and change.new is not None:
+            # Формула только что записана (в столбце NaN) или её значение пересчитано;
+            # при удалении формулы (new=None) новое значение уже пришло событием "set"
+            numbers = self.columns.get(change.col)
+            if numbers is not None:
+                numbers.set(change.row, number_or_nan(change.new))
+
+    def numbers(self, col: int) -> ColumnNumbers:
+        numbers = self.columns.get(col)
+        if numbers is None:
+            numbers = self.columns[col] = ColumnNumbers(self.parse_column(col))
+        return numbers
+
+    def parse_column(self, col: int) -> array:
+        """Разбирает числа столбца. Каждое различное значение разбирается один раз."""
+        import numpy as np
+
+        data = self.table.data
+        column = data.columns[col] if hasattr(data, "columns") else None
+        if column is not None and column.kind == "numeric":
+            numbers = np.array(column.values, dtype=np.float64)
+            numbers[np.frombuffer(column.nulls, dtype=np.uint8) != 0] = NAN
+        elif column is not None:
+            # Пустые ячейки хранятся с кодом 0, поэтому маска накладывается после выборки
+            parsed = np.array([number_or_nan(value) for value in column.dictionary] + [NAN], dtype=np.float64)
+            numbers = parsed[np.array(column.codes, dtype=np.intp)]
+            numbers[np.frombuffer(column.nulls, dtype=np.uint8) != 0] = NAN
+        else:
+            texts = [values[col] for values in data]
+            parsed = {value: number_or_nan(value) for value in set(texts)}
+            numbers = np.fromiter(map(parsed.__getitem__, texts), dtype=np.float64, count=len(texts))
+        engine = self.table.formulas
+        for row, formula_col in engine.formulas:
+            if formula_col == col:
+                value = engine.display((row, col))
+                numbers[row] = NAN if value is None else number_or_nan(value)
+        values = array("d")
+        values.frombytes(numbers.tobytes())
+        return values
+
+    def aggregate(self, col: int, function: str) -> Optional[float]:
+        """Сумма, среднее, максимум или минимум чисел столбца; None, если чисел нет."""
+        numbers = self.numbers(col)
+        if function == "сумма":
+            return numbers.total
+        if not numbers.count:
+            return None
+        if function == "среднее":
+            return numbers.total / numbers.count
+        numbers.extremes()
+        return numbers.maximum if function == "максимум" else numbers.minimum
+
+    def count(self, col: int) -> int:
+        return self.numbers(col).count
+
+    def sort(self, col: int, descending: bool = False) -> RowView:
+        """Строки, упорядоченные по столбцу; пустые и нечисловые значения — в конце.
+
+        Столбец, где есть числа, сортируется по числам, иначе — по тексту.
+        """
+        import numpy as np
+
+        count = self.table.visible_row_count()
+        numbers = self.numbers(col)
+        if numbers.count:
+            keys = np.frombuffer(numbers.values, dtype=np.float64, count=count)
+            # NaN при сортировке numpy всегда оказываются в конце
+            rows = np.argsort(-keys if descending else keys, kind="stable")
+            del keys
+        else:
+            rows = self.text_order(col, count, descending)
+        direction = "по убыванию" if descending else "по возрастанию"
+        return RowView(self.table, rows, f"сортировка по '{self.table.headers[col]}' {direction}")
+
+    def text_order(self, col: int, count: int, descending: bool):
+        import numpy as np
+
+        data = self.table.data
+        if hasattr(data, "columns"):
+            column = data.columns[col]
+            dictionary = np.array(column.dictionary + [""], dtype=object)
+            # Ранг каждого слова словаря; сравниваются числа, а не строки
+            ranks = np.empty(len(dictionary), dtype=np.intp)
+            ranks[np.argsort(dictionary, kind="stable")] = np.arange(len(dictionary))
+            keys = ranks[np.array(column.codes[:count], dtype=np.intp)]
+            empty = np.frombuffer(column.nulls, dtype=np.uint8, count=count) != 0
+        else:
+            texts = [values[col] for values in islice(data, count)]
+            rank = {text: index for index, text in enumerate(sorted(set(texts)))}
+            keys = np.fromiter(map(rank.__getitem__, texts), dtype=np.intp, count=len(texts))
+            empty = keys == rank.get(EMPTY_CELL, -1)
+        if descending:
+            keys = -keys
+        keys[empty] = np.iinfo(np.intp).max
+        return np.argsort(keys, kind="stable")
+
+    def filter(self, col: int, value: str, comparison: str = "равно") -> RowView:
+        """Строки, в которых значение столбца равно `value` (больше или меньше — для чисел)."""
+        import numpy as np
+
+        count = self.table.visible_row_count()
+        number = cell_number(value)
+        header = self.table.headers[col]
+        if number is not None:
+            numbers = np.frombuffer(self.numbers(col).values, dtype=np.float64, count=count)
+            if comparison == "больше":
+                mask = numbers > number
+            elif comparison == "меньше":
+                mask = numbers < number
+            else:
+                mask = numbers == number
+            del numbers
+            rows = np.flatnonzero(mask)
+        elif comparison != "равно":
+            rows = np.empty(0, dtype=np.intp)
+        elif hasattr(self.table.data, "columns"):
+            column = self.table.data.columns[col]
+            code = column.lookup.get(value) if column.kind == "text" else None
+            if code is None:
+                rows = np.empty(0, dtype=np.intp)
+            else:
+                codes = np.array(column.codes[:count], dtype=np.intp)
+                present = np.frombuffer(column.nulls, dtype=np.uint8, count=count) == 0
+                rows = np.flatnonzero((codes == code) & present)
+        else:
+            rows = [row for row, values in enumerate(islice(self.table.data, count)) if values[col] == value]
+        words = {"равно": "=", "больше": ">", "меньше": "<"}
+        return RowView(self.table, rows, f"отбор: {header} {words[comparison]} {value}")
@@ -0,0 +1,57 @@
+import json
+import logging
+from typing import Dict, Iterable, List
+from command_parser import command_grammar
+from constants import SAMPLE_RATE, PAUSE_RESUME_WORDS, NUMBER_WORDS
+from formulas import OPERATOR_WORDS
+
+MODE_DICTATION = "dictation"
+MODE_COMMAND = "command"
+MODE_EDIT = "edit"
+MODE_PAUSE = "pause"
+
+# Слово для всего, что не входит в грамматику: иначе Vosk подгоняет любой звук под словарь
+UNKNOWN = "[unk]"
+
+
+class RecognizerSet:
+    """Распознаватели для разных режимов работы на одной загруженной модели Vosk.
+
+    Диктовка использует полный словарь модели, остальные режимы — грамматику
+    из короткого списка фраз, что заметно дешевле при декодировании.
+    Распознаватели создаются по первому запросу и переиспользуются.
+    Модель можно присвоить позже, когда она загрузится в фоне.
+    """
+
+    def __init__(self, model, rate: int = SAMPLE_RATE):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.rate = rate
+        self._grammars: Dict[str, List[str]] = {
+            MODE_PAUSE: list(PAUSE_RESUME_WORDS) + [UNKNOWN],
+            MODE_COMMAND: command_grammar() + list(OPERATOR_WORDS.values()) + [NUMBER_WORDS, UNKNOWN],
+        }
+        self._recognizers: Dict[str, "KaldiRecognizer"] = {}
+        self.set_headers([])
+
+    def set_headers(self, headers: Iterable[str]):
+        """Перестраивает грамматику режима редактирования под столбцы таблицы."""
+        self._grammars[MODE_EDIT] = ["редактировать строка столбец", NUMBER_WORDS] + list(headers) + [UNKNOWN]
+        self._recognizers.pop(MODE_EDIT, None)
+        self.logger.debug("Грамматика редактирования обновлена: %s", self._grammars[MODE_EDIT])
+
+    def get(self, mode: str) -> "KaldiRecognizer":
+        """Возвращает распознаватель для указанного режима."""
+        rec = self._recognizers.get(mode)
+        if rec is None:
+            from vosk import KaldiRecognizer
+
+            if self.model is None:
+                raise RuntimeError("Модель распознавания ещё не загружена")
+            if mode == MODE_DICTATION:
+                rec = KaldiRecognizer(self.model, self.rate)
+            else:
+                rec = KaldiRecognizer(self.model, self.rate, json.dumps(self._grammars[mode], ensure_ascii=False))
+            self._recognizers[mode] = rec
+            self.logger.info("Создан распознаватель для режима '%s'", mode)
+        return rec
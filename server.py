@@ -0,0 +1,240 @@
+"""Сервер распознавания: одна модель Vosk на много рабочих мест.
+
+Каждый клиент открывает TCP-соединение и передаёт сырой звук (16 кГц, моно,
+16 бит). В ответ сервер отправляет тот же текст, что оператор увидел бы в
+консоли. У каждой сессии своя таблица, история и распознаватели, модель
+загружена в памяти один раз. Декодирование выполняется на общем
+ограниченном пуле потоков; пока блок сессии не обработан, следующий из
+сокета не читается, поэтому быстрый клиент упирается в управление потоком TCP.
+
+Запуск сервера:
+    python server.py serve --port 8765
+Проверка с записями вместо микрофонов (по сессии на файл):
+    python server.py send запись1.wav запись2.wav --port 8765
+"""
+
+import argparse
+import asyncio
+import io
+import itertools
+import logging
+import os
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from audio_capture import PushAudioSource
+from constants import (
+    MODEL_PATH,
+    CHUNK_SIZE,
+    SAMPLE_RATE,
+    SERVER_HOST,
+    SERVER_PORT,
+    SERVER_DECODE_WORKERS,
+    SERVER_MAX_SESSIONS,
+    SERVER_OUTPUT_DIR,
+)
+
+BYTES_PER_CHUNK = CHUNK_SIZE * 2
+
+
+class Session:
+    """Сессия одного рабочего места: свой VoiceTableCreator на общей модели."""
+
+    def __init__(self, session_id: int, model, output_dir: str):
+        from voice_creator import VoiceTableCreator
+
+        self.session_id = session_id
+        self.console = io.StringIO()
+        self.source = PushAudioSource()
+        session_dir = os.path.join(output_dir, f"session_{session_id}")
+        os.makedirs(session_dir, exist_ok=True)
+        self.creator = VoiceTableCreator(
+            model=model,
+            audio_source=self.source,
+            output_dir=session_dir,
+            output=self.console,
+            journal_dir=None,
+            metrics_dir=session_dir,
+            workspace_dir=None,
+            sync_url=None,
+        )
+        self.creator.print_help()
+        self.creator.prepare_listening()
+
+    def feed(self, data: bytes) -> bool:
+        """Декодирует блок звука. Возвращает False, если сессия завершена командой выхода."""
+        self.source.push(data)
+        return self.creator.process_available_audio()
+
+    def finish(self):
+        """Дораспознаёт остаток звука в конце потока."""
+        self.source.end()
+        self.creator.process_available_audio()
+        self.creator.finish_exports()
+
+    def close(self):
+        """Записывает статистику времени команд сессии."""
+        self.creator.dump_metrics()
+
+    def drain_console(self) -> str:
+        """Забирает накопленный вывод для отправки клиенту."""
+        text = self.console.getvalue()
+        self.console.seek(0)
+        self.console.truncate()
+        return text
+
+
+class RecognitionServer:
+    """Асинхронный TCP-сервер, обслуживающий сессии на одной модели."""
+
+    def __init__(
+        self,
+        model,
+        decode_workers: int = SERVER_DECODE_WORKERS,
+        max_sessions: int = SERVER_MAX_SESSIONS,
+        output_dir: str = SERVER_OUTPUT_DIR,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.output_dir = output_dir
+        self.pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+        self.session_slots = asyncio.Semaphore(max_sessions)
+        self.session_ids = itertools.count(1)
+        self.active_sessions = 0
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        async with self.session_slots:
+            session_id = next(self.session_ids)
+            peer = writer.get_extra_info("peername")
+            self.active_sessions += 1
+            self.logger.info("Сессия %s открыта для %s, активных сессий: %s", session_id, peer, self.active_sessions)
+            session = None
+            try:
+                session = await loop.run_in_executor(self.pool, Session, session_id, self.model, self.output_dir)
+                await self.send(writer, session.drain_console())
+                while True:
+                    data = await self.read_chunk(reader)
+                    if not data:
+                        await loop.run_in_executor(self.pool, session.finish)
+                        break
+                    # Следующий блок читается только после декодирования текущего
+                    alive = await loop.run_in_executor(self.pool, session.feed, data)
+                    await self.send(writer, session.drain_console())
+                    if not alive:
+                        break
+                await self.send(writer, session.drain_console())
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                self.logger.warning("Сессия %s: соединение прервано: %s", session_id, e)
+            except Exception:
+                self.logger.exception("Сессия %s: ошибка обработки", session_id)
+            finally:
+                if session:
+                    # Фоновые записи дожидаются при любом завершении сессии, иначе поток выгрузки остаётся жить
+                    try:
+                        await loop.run_in_executor(self.pool, session.creator.finish_exports)
+                    except Exception:
+                        self.logger.exception("Сессия %s: ошибка завершения записи файлов", session_id)
+                    session.close()
+                self.active_sessions -= 1
+                self.logger.info("Сессия %s закрыта", session_id)
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass
+
+    @staticmethod
+    async def read_chunk(reader: asyncio.StreamReader) -> bytes:
+        """Читает блок звука целым числом отсчётов; пустые байты означают конец потока."""
+        try:
+            return await reader.readexactly(BYTES_PER_CHUNK)
+        except asyncio.IncompleteReadError as e:
+            return e.partial[: len(e.partial) // 2 * 2]
+
+    @staticmethod
+    async def send(writer: asyncio.StreamWriter, text: str):
+        if text:
+            writer.write(text.encode("utf-8"))
+            await writer.drain()
+
+    async def serve(self, host: str = SERVER_HOST, port: int = SERVER_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        self.logger.info("Сервер распознавания слушает %s:%s", host, port)
+        print(f"Сервер распознавания слушает {host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False)
+
+
+async def stream_wav(path: str, host: str = "127.0.0.1", port: int = SERVER_PORT, realtime: bool = False) -> str:
+    """Клиент для проверки: передаёт WAV-файл серверу и возвращает полученный вывод."""
+    reader, writer = await asyncio.open_connection(host, port)
+    received: List[bytes] = []
+
+    async def receive():
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            received.append(data)
+
+    receiver = asyncio.create_task(receive())
+    with wave.open(path, "rb") as wav:
+        if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) != (1, 2, SAMPLE_RATE):
+            raise ValueError(f"Файл {path}: ожидается моно, 16 бит, {SAMPLE_RATE} Гц")
+        while True:
+            data = wav.readframes(CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+            if realtime:
+                await asyncio.sleep(CHUNK_SIZE / SAMPLE_RATE)
+    writer.write_eof()
+    await receiver
+    writer.close()
+    return b"".join(received).decode("utf-8")
+
+
+async def send_files(paths: List[str], host: str, port: int, realtime: bool):
+    outputs = await asyncio.gather(*(stream_wav(path, host, port, realtime) for path in paths))
+    for path, output in zip(paths, outputs):
+        print(f"===== {path} =====")
+        print(output)
+
+
+def load_model(path: str):
+    from vosk import Model, SetLogLevel
+
+    SetLogLevel(-1)
+    return Model(path)
+
+
+if __name__ == "__main__":
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Сервер распознавания для нескольких рабочих мест")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="запустить сервер")
+    serve_parser.add_argument("--host", default=SERVER_HOST)
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    serve_parser.add_argument("--workers", type=int, default=SERVER_DECODE_WORKERS, help="потоков декодирования")
+    serve_parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS)
+    serve_parser.add_argument("--model", default=MODEL_PATH)
+    serve_parser.add_argument("--output", default=SERVER_OUTPUT_DIR, help="папка для таблиц сессий")
+    send_parser = commands.add_parser("send", help="передать WAV-файлы серверу, по сессии на файл")
+    send_parser.add_argument("files", nargs="+")
+    send_parser.add_argument("--host", default="127.0.0.1")
+    send_parser.add_argument("--port", type=int, default=SERVER_PORT)
+    send_parser.add_argument("--realtime", action="store_true", help="передавать со скоростью записи")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        setup_logging(console_output=False)
+        server = RecognitionServer(load_model(args.model), args.workers, args.max_sessions, args.output)
+        asyncio.run(server.serve(args.host, args.port))
+    else:
+        asyncio.run(send_files(args.files, args.host, args.port, args.realtime))
@@ -0,0 +1,545 @@
+"""Отправка изменений таблиц на центральный сервер (бэкенд).
+
+Таблица не отправляется целиком после каждого "сохрани": на сервер уходят
+только изменения — новые значения ячеек, вставленные и удалённые строки.
+Голосовой цикл лишь ставит изменение в очередь и дописывает его в исходящий
+файл на диске (outbox), а пачки отправляет фоновый поток через одно
+постоянное HTTP-соединение. Если сервер недоступен, попытки повторяются
+с растущей паузой, а изменения ждут в outbox, в том числе между запусками.
+
+Протокол: POST на адрес сервера с JSON
+    {"station": "<станция>", "deltas": [{"seq": 1, "table": "Товары", "op": "set", "r": 0, "c": 1, "v": "5"}, ...]}
+Ответ: {"acked": <номер последнего принятого изменения>}. Номера seq на
+станции растут без повторов, поэтому пачку, отправленную повторно после
+обрыва связи, сервер пропускает, а не применяет второй раз.
+
+Операции:
+    table    таблица создана или заменена: "headers" и строки "rows"
+    set      значение "v" ячейки ("r", "c"), исходное, с формулами
+    insert   строка "v" вставлена перед строкой "r" (или добавлена в конец)
+    delete   строка "r" удалена
+    complete таблица сохранена командой "сохрани": "rows" — число
+             сохраняемых строк, "computed" — значения формул [[r, c, v], ...]
+    drop     создание таблицы отменено
+
+Сервер-заглушка для проверки без настоящего бэкенда:
+    python sync.py serve --port 8780
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from export import TableSnapshot
+from table import Table, TableChange
+from workspace import write_atomic
+from constants import (
+    SYNC_DIR,
+    SYNC_BATCH_SIZE,
+    SYNC_BATCH_INTERVAL,
+    SYNC_TIMEOUT,
+    SYNC_BACKOFF_INITIAL,
+    SYNC_BACKOFF_MAX,
+    SYNC_SEGMENT_RECORDS,
+    SYNC_CLOSE_TIMEOUT,
+    SYNC_PORT,
+)
+
+SEGMENT_PATTERN = "outbox-*.jsonl"
+STATE_FILE = "state.json"
+REJECTED_FILE = "rejected.jsonl"
+
+
+def change_delta(name: str, change: TableChange) -> Optional[dict]:
+    """Изменение таблицы в виде для отправки; вычисленные значения формул не отправляются."""
+    if change.event == "set":
+        return {"table": name, "op": "set", "r": change.row, "c": change.col, "v": change.new}
+    if change.event in ("append", "insert"):
+        return {"table": name, "op": "insert", "r": change.row, "v": list(change.new)}
+    if change.event == "delete":
+        return {"table": name, "op": "delete", "r": change.row}
+    return None
+
+
+class PersistentConnection:
+    """HTTP-соединение с сервером, которое держится открытым между пачками.
+
+    Если сервер закрыл простаивавшее соединение, запрос один раз
+    повторяется через новое.
+    """
+
+    def __init__(self, url: str, timeout: float = SYNC_TIMEOUT):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.connection: Optional[http.client.HTTPConnection] = None
+        self.connects = 0
+
+    def post(self, payload: dict) -> Tuple[int, bytes]:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        for attempt in range(2):
+            reused = self.connection is not None
+            if not reused:
+                self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+                self.connects += 1
+            try:
+                self.connection.request("POST", self.path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                self.close()
+            return response.status, data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class TableSync:
+    """Отправка изменений таблиц на сервер пачками из фонового потока.
+
+    Основной поток вызывает `record` и методы table_*: изменение получает
+    номер seq, дописывается в текущий сегмент outbox в `directory` (запись
+    уходит в ОС сразу, fsync делает фоновый поток) и ставится в очередь.
+    Новая таблица отправляется со всеми строками: в основном потоке
+    снимается только TableSnapshot, а строки в JSON переводит фоновый поток.
+
+    Фоновый поток отправляет пачку, когда набралось `batch_size` изменений
+    или прошло `batch_interval` секунд. Принятые сервером изменения
+    убираются из очереди, а сегменты outbox, где все изменения приняты,
+    удаляются. При ошибке связи или ответе 5xx пачка повторяется с паузой,
+    которая удваивается до `backoff_max`; пачка с ответом 4xx сервером не
+    будет принята никогда, поэтому откладывается в rejected.jsonl.
+
+    Неотправленные изменения остаются в outbox и отправляются при следующем
+    запуске. Имя станции и номер последнего принятого изменения хранятся в
+    state.json рядом.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        directory: str = SYNC_DIR,
+        station: Optional[str] = None,
+        batch_size: int = SYNC_BATCH_SIZE,
+        batch_interval: float = SYNC_BATCH_INTERVAL,
+        timeout: float = SYNC_TIMEOUT,
+        backoff_initial: float = SYNC_BACKOFF_INITIAL,
+        backoff_max: float = SYNC_BACKOFF_MAX,
+        segment_records: int = SYNC_SEGMENT_RECORDS,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.url = url
+        self.directory = directory
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.segment_records = segment_records
+        self.connection = PersistentConnection(url, timeout)
+        self.condition = threading.Condition()
+        # Изменения по порядку seq, ещё не принятые сервером
+        self.pending = deque()
+        # Новые таблицы, строки которых фоновый поток ещё не записал в outbox
+        self.unwritten = deque()
+        # Сегменты outbox: [путь, наибольший seq в нём]; последний — текущий
+        self.segments = deque()
+        self.segment = None
+        self.segment_count = 0
+        self.unsynced = 0
+        self.acked = 0
+        self.next_seq = 1
+        self.sent = 0
+        self.rejected = 0
+        self.failures = 0
+        self.closing = False
+        self.deadline = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.station = station
+        self.load()
+        self.open_segment()
+        if self.pending:
+            self.logger.info("В outbox %s неотправленных изменений", len(self.pending))
+        self.thread = threading.Thread(target=self.run, name="table-sync", daemon=True)
+        self.thread.start()
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, STATE_FILE)
+
+    def load(self):
+        """Читает состояние и неотправленные изменения прошлых запусков."""
+        state = {}
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            self.logger.warning("Не удалось прочитать %s", self.state_path)
+        self.acked = state.get("acked", 0)
+        self.station = self.station or state.get("station") or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        last_seq = max(self.acked, state.get("next_seq", 1) - 1)
+        paths = glob.glob(os.path.join(self.directory, SEGMENT_PATTERN))
+        for path in sorted(paths, key=lambda path: int(os.path.basename(path)[7:-6])):
+            deltas = []
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        deltas.append(json.loads(line))
+                    except ValueError:
+                        # Последняя запись могла оборваться при сбое
+                        self.logger.warning("Пропущена повреждённая запись в %s", path)
+            segment_seq = max((delta["seq"] for delta in deltas), default=0)
+            last_seq = max(last_seq, segment_seq)
+            if segment_seq <= self.acked:
+                os.remove(path)
+                continue
+            self.segments.append([path, segment_seq])
+            self.pending.extend(delta for delta in deltas if delta["seq"] > self.acked)
+        # Строки новых таблиц дописываются в outbox позже следующих изменений
+        self.pending = deque(sorted(self.pending, key=lambda delta: delta["seq"]))
+        self.next_seq = last_seq + 1
+        self.save_state()
+
+    def save_state(self):
+        state = {"station": self.station, "acked": self.acked, "next_seq": self.next_seq}
+        write_atomic(self.state_path, lambda f: json.dump(state, f, ensure_ascii=False))
+
+    def open_segment(self):
+        path = os.path.join(self.directory, f"outbox-{self.next_seq:012d}.jsonl")
+        self.segment = open(path, "a", encoding="utf-8")
+        self.segments.append([path, 0])
+        self.segment_count = 0
+
+    def write(self, delta: dict):
+        """Дописывает изменение в текущий сегмент outbox (под self.condition)."""
+        if self.segment_count >= self.segment_records:
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+            self.segment.close()
+            self.open_segment()
+        self.segment.write(json.dumps(delta, ensure_ascii=False) + "\n")
+        self.segment.flush()
+        segment = self.segments[-1]
+        segment[1] = max(segment[1], delta["seq"])
+        self.segment_count += 1
+        self.unsynced += 1
+
+    def record(self, delta: dict, snapshot: Optional[TableSnapshot] = None):
+        """Ставит изменение в очередь на отправку (вызывается из основного потока).
+
+        Со `snapshot` строки таблицы добавляются к изменению в фоновом потоке.
+        """
+        with self.condition:
+            if self.segment is None:
+                self.logger.warning("Изменение таблицы '%s' после остановки отправки", delta.get("table"))
+                return
+            delta["seq"] = self.next_seq
+            self.next_seq += 1
+            if snapshot is None:
+                self.write(delta)
+            else:
+                delta["snapshot"] = snapshot
+                self.unwritten.append(delta)
+            self.pending.append(delta)
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def table_added(self, table: Table):
+        self.record({"table": table.name, "op": "table", "headers": list(table.headers)}, TableSnapshot(table))
+
+    def table_changed(self, name: str, change: TableChange):
+        delta = change_delta(name, change)
+        if delta is not None:
+            self.record(delta)
+
+    def table_completed(self, name: str, snapshot: TableSnapshot):
+        computed = [[row, col, value] for row, cells in snapshot.computed.items() for col, value in cells]
+        self.record({"table": name, "op": "complete", "rows": snapshot.saved_rows, "computed": computed})
+
+    def table_dropped(self, name: str):
+        self.record({"table": name, "op": "drop"})
+
+    def run(self):
+        delay = 0.0
+        closing = False
+        while True:
+            with self.condition:
+                if delay:
+                    # Пауза перед повтором прерывается только началом завершения
+                    self.condition.wait_for(lambda: self.closing != closing, delay)
+                elif not closing:
+                    self.condition.wait_for(
+                        lambda: self.closing or len(self.pending) >= self.batch_size, self.batch_interval
+                    )
+                closing = self.closing
+            self.write_snapshots()
+            self.sync_segment()
+            batch = self.next_batch()
+            if not batch:
+                if closing:
+                    return
+                continue
+            if self.send(batch):
+                delay = 0.0
+                self.failures = 0
+                continue
+            self.failures += 1
+            delay = min(self.backoff_max, self.backoff_initial * 2 ** (self.failures - 1))
+            delay *= random.uniform(0.5, 1.0)
+            if closing and time.monotonic() + delay > self.deadline:
+                return
+            self.logger.info("Повтор отправки через %.1f с", delay)
+
+    def write_snapshots(self):
+        """Переводит строки новых таблиц в JSON и дописывает их в outbox."""
+        while self.unwritten:
+            delta = self.unwritten[0]
+            delta["rows"] = list(delta["snapshot"].rows(display=False))
+            with self.condition:
+                del delta["snapshot"]
+                self.unwritten.popleft()
+                if self.segment is not None:
+                    self.write(delta)
+
+    def sync_segment(self):
+        with self.condition:
+            if self.segment is None or not self.unsynced:
+                return
+            # Копия дескриптора: основной поток может тем временем закрыть сегмент
+            fd = os.dup(self.segment.fileno())
+            self.unsynced = 0
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def next_batch(self) -> List[dict]:
+        with self.condition:
+            batch = []
+            for delta in islice(self.pending, self.batch_size):
+                if "snapshot" in delta:
+                    break
+                batch.append(delta)
+            return batch
+
+    def send(self, batch: List[dict]) -> bool:
+        """Отправляет пачку. False — пачку нужно повторить позже."""
+        try:
+            status, body = self.connection.post({"station": self.station, "deltas": batch})
+        except (OSError, http.client.HTTPException) as e:
+            self.logger.warning("Сервер %s недоступен: %s", self.url, e)
+            return False
+        if 400 <= status < 500 and status not in (408, 429):
+            self.logger.error("Сервер отклонил пачку %s-%s: %s %s", batch[0]["seq"], batch[-1]["seq"], status, body[:200])
+            with open(os.path.join(self.directory, REJECTED_FILE), "a", encoding="utf-8") as f:
+                for delta in batch:
+                    f.write(json.dumps(delta, ensure_ascii=False) + "\n")
+            self.rejected += len(batch)
+            self.acknowledge(batch[-1]["seq"])
+            return True
+        if status != 200:
+            self.logger.warning("Сервер ответил %s на пачку из %s изменений", status, len(batch))
+            return False
+        try:
+            acked = json.loads(body)["acked"]
+        except (ValueError, KeyError, TypeError):
+            self.logger.warning("Непонятный ответ сервера: %s", body[:200])
+            return False
+        self.acknowledge(min(acked, batch[-1]["seq"]))
+        return True
+
+    def acknowledge(self, acked: int):
+        """Убирает из очереди принятые изменения и удаляет полностью принятые сегменты outbox."""
+        with self.condition:
+            while self.pending and self.pending[0]["seq"] <= acked:
+                self.pending.popleft()
+                self.sent += 1
+            self.acked = max(self.acked, acked)
+            done = []
+            while len(self.segments) > 1 and self.segments[0][1] <= self.acked:
+                done.append(self.segments.popleft()[0])
+        if done:
+            # Номер принятого изменения записывается до удаления сегментов:
+            # иначе после перезапуска номера seq пошли бы заново
+            self.save_state()
+            for path in done:
+                os.remove(path)
+
+    def status(self) -> str:
+        with self.condition:
+            waiting = len(self.pending)
+        text = f"Отправка на сервер: передано изменений {self.sent}, ждут отправки {waiting}"
+        if self.failures:
+            text += f", сервер недоступен (попыток: {self.failures})"
+        if self.rejected:
+            text += f", отклонено {self.rejected}"
+        return text
+
+    def close(self, timeout: float = SYNC_CLOSE_TIMEOUT):
+        """Отправляет, что успеет за `timeout` секунд; остальное остаётся в outbox до следующего запуска."""
+        with self.condition:
+            self.closing = True
+            self.deadline = time.monotonic() + timeout
+            self.condition.notify()
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            self.logger.warning("Отправка на сервер не закончилась за %s с", timeout)
+        with self.condition:
+            if self.segment is None:
+                return
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+            self.segment.close()
+            self.segment = None
+            self.save_state()
+        self.logger.info(self.status())
+
+
+class StandInBackend(ThreadingHTTPServer):
+    """Сервер-заглушка центральной системы для проверки отправки.
+
+    Применяет полученные изменения к таблицам в памяти и пропускает
+    изменения с уже принятыми номерами seq. С `fail_every` каждый N-й
+    запрос применяется, но отвечает ошибкой 503, как будто ответ потерялся;
+    с `offline` все запросы отклоняются с 503. GET /tables возвращает
+    таблицы в JSON.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", SYNC_PORT), fail_every: int = 0):
+        super().__init__(address, StandInHandler)
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.tables: Dict[str, dict] = {}
+        self.last_seq: Dict[str, int] = {}
+        self.fail_every = fail_every
+        self.offline = False
+        self.requests = 0
+        self.duplicates = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/deltas"
+
+    def receive(self, body: bytes) -> Tuple[int, dict]:
+        with self.lock:
+            self.requests += 1
+            if self.offline:
+                return 503, {"error": "offline"}
+            try:
+                payload = json.loads(body)
+                station, deltas = payload["station"], payload["deltas"]
+            except (ValueError, KeyError, TypeError):
+                return 400, {"error": "bad request"}
+            last = self.last_seq.get(station, 0)
+            for delta in deltas:
+                if delta["seq"] <= last:
+                    self.duplicates += 1
+                    continue
+                self.apply(delta)
+                last = delta["seq"]
+            self.last_seq[station] = last
+            if self.fail_every and self.requests % self.fail_every == 0:
+                return 503, {"error": "response lost"}
+            return 200, {"acked": last}
+
+    def apply(self, delta: dict):
+        name, op = delta["table"], delta["op"]
+        if op == "table":
+            self.tables[name] = {"headers": delta["headers"], "rows": delta["rows"], "completed": None}
+            return
+        if op == "drop":
+            self.tables.pop(name, None)
+            return
+        table = self.tables.get(name)
+        if table is None:
+            self.logger.warning("Изменение %s неизвестной таблицы '%s'", delta["seq"], name)
+            return
+        rows = table["rows"]
+        try:
+            if op == "set":
+                rows[delta["r"]][delta["c"]] = delta["v"]
+            elif op == "insert":
+                rows.insert(delta["r"], delta["v"])
+            elif op == "delete":
+                del rows[delta["r"]]
+            elif op == "complete":
+                table["completed"] = {"rows": delta["rows"], "computed": delta["computed"]}
+        except IndexError:
+            self.logger.warning("Изменение %s не подходит к таблице '%s'", delta["seq"], name)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply(*self.server.receive(body))
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/tables":
+            self.reply(404, {"error": "not found"})
+            return
+        with self.server.lock:
+            self.reply(200, self.server.tables)
+
+    def reply(self, status: int, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="запустить сервер-заглушку")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=SYNC_PORT)
+    serve.add_argument("--fail-every", type=int, default=0, help="отвечать ошибкой на каждый N-й запрос")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    backend = StandInBackend((args.host, args.port), fail_every=args.fail_every)
+    print(f"Сервер-заглушка: {backend.url}, таблицы: http://{args.host}:{args.port}/tables")
+    try:
+        backend.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.server_close()
+
+
+if __name__ == "__main__":
+    main()
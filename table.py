@@ -1,8 +1,32 @@
 from dataclasses import dataclass
-from typing import List, Optional
-from tabulate import tabulate
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional
 import logging
+from export import write_export
+from formulas import FormulaEngine
 from logging_config import setup_logging
+from queries import RowView, TableQueries
+from table_index import TableIndex
+from table_renderer import TableRenderer
+from table_storage import create_storage
+from constants import EMPTY_CELL, TABLE_STORAGE
+
+
+class TableChange(NamedTuple):
+    """Изменение таблицы, о котором сообщается подписчикам.
+
+    event: "append" (строка добавлена в конец), "insert" (строка вставлена),
+    "delete" (строка удалена) или "set" (изменено значение ячейки).
+    Для "append"/"insert" в new — значения строки, для "delete" в old.
+    Событие "computed" — изменилось вычисленное значение формулы в ячейке;
+    old и new — значения для вывода (None, если формулы до или после нет).
+    """
+
+    event: str
+    row: int
+    col: Optional[int] = None
+    old: Any = None
+    new: Any = None
+
 
 @dataclass
 class Table:
@@ -14,37 +38,113 @@ class Table:
     logger: logging.Logger = None
     previous_position: Optional[tuple] = None
 
-    def __init__(self, name: str, headers: List[str], console_output: bool = False):
+    def __init__(
+        self,
+        name: str,
+        headers: List[str],
+        console_output: bool = False,
+        storage: Optional[str] = None,
+        rows: Optional[Iterable[List[str]]] = None,
+    ):
         self.name = name
         self.headers = headers
-        self.data = []
+        # Номер столбца по названию без просмотра списка заголовков
+        self.column_index = {header: col for col, header in enumerate(headers)}
+        # Список списков или хранение по столбцам (см. table_storage.py)
+        self.storage = storage or TABLE_STORAGE
+        self.data = create_storage(self.storage, len(headers))
+        # Готовые строки (например, из сохранённого файла) загружаются без уведомлений
+        for values in rows or ():
+            self.data.append(list(values))
         self.current_row = 0
         self.current_col = 0
         self.previous_position = None
         self.logger = setup_logging(console_output=console_output)
-        self.new_row()
-        self.logger.info(f"Создана таблица '{name}' с столбцами: {', '.join(headers)}")
+        self.listeners: List[Callable[[TableChange], None]] = []
+        self.formulas = FormulaEngine(self)
+        # Итоги по столбцам в формулах берутся из TableQueries, поэтому формулы
+        # вычисляются после его создания, а отрисовка — после вычисления
+        self.queries = TableQueries(self)
+        self.formulas.evaluate_all()
+        self.renderer = TableRenderer(self)
+        self.indexes = TableIndex(self)
+        # Движок формул подписывается после запросов и отрисовки, чтобы его события
+        # "computed" приходили с номерами строк, уже сдвинутыми при вставке и удалении
+        self.add_listener(self.formulas.on_change)
+        if not self.data:
+            self.new_row()
+        self.logger.info("Создана таблица '%s' с столбцами: %s", name, ', '.join(headers))
+
+    def add_listener(self, listener: Callable[[TableChange], None]):
+        """Подписывает функцию на изменения таблицы"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[TableChange], None]):
+        """Отписывает функцию от изменений таблицы"""
+        self.listeners.remove(listener)
+
+    def notify(self, change: TableChange):
+        # Подписчик, добавленный во время рассылки (например, журнал), это изменение уже не получает
+        for listener in tuple(self.listeners):
+            listener(change)
+
+    def notify_computed(self, row: int, col: int, old: Optional[str], new: Optional[str]):
+        """Сообщает подписчикам об изменении вычисленного значения формулы"""
+        self.notify(TableChange("computed", row, col, old, new))
+
+    def display_row(self, row: int) -> List[str]:
+        """Значения строки для вывода и экспорта: вместо формул — их значения"""
+        return self.formulas.substitute(row, self.data[row])
+
+    def display_rows(self, stop: Optional[int] = None) -> Iterator[List[str]]:
+        for row, values in enumerate(self.data.rows(stop)):
+            yield self.formulas.substitute(row, values)
+
+    def apply_change(self, change: TableChange) -> TableChange:
+        """Применяет изменение как есть, без сдвига курсора и других побочных действий.
+
+        Нужен для восстановления из журнала и отмены действий. Прежние значения
+        берутся из таблицы, поэтому в change.old можно ничего не передавать.
+        """
+        if change.event == "set":
+            change = change._replace(old=self.data.get(change.row, change.col))
+            self.data.set(change.row, change.col, change.new)
+        elif change.event == "append":
+            change = change._replace(row=len(self.data))
+            self.data.append(list(change.new))
+        elif change.event == "insert":
+            self.data.insert(change.row, list(change.new))
+        elif change.event == "delete":
+            change = change._replace(old=self.data.pop(change.row))
+        else:
+            raise ValueError(f"Неизвестное изменение таблицы: {change.event}")
+        self.notify(change)
+        return change
 
     def new_row(self):
         """Добавляет новую строку в таблицу"""
-        self.data.append(["_" for _ in range(len(self.headers))])
-        self.logger.debug(f"Добавлена новая строка {self.current_row + 1}")
+        row = [EMPTY_CELL for _ in range(len(self.headers))]
+        self.data.append(row)
+        self.logger.debug("Добавлена новая строка %s", self.current_row + 1)
+        self.notify(TableChange("append", len(self.data) - 1, new=row))
 
-    def set_current_value(self, value: str, history_callback=None) -> bool:
+    def set_cell(self, row: int, col: int, value: str):
+        """Записывает значение в ячейку, не меняя текущую позицию"""
+        old = self.data.get(row, col)
+        self.data.set(row, col, value)
+        self.notify(TableChange("set", row, col, old, value))
+
+    def set_current_value(self, value: str) -> bool:
         if self.current_col < len(self.headers):
-            self.data[self.current_row][self.current_col] = value
+            self.set_cell(self.current_row, self.current_col, value)
             self.logger.info(
-                f"Записано значение '{value}' в ячейку [строка {self.current_row + 1}, {self.headers[self.current_col]}]"
+                "Записано значение '%s' в ячейку [строка %s, %s]", value, self.current_row + 1, self.headers[self.current_col]
             )
             if value != "_":
                 self.last_filled_position = (self.current_row, self.current_col)
             self.current_col += 1
             if self.current_col >= len(self.headers):
-                prev_row = self.current_row
-                prev_col = self.current_col
                 self.next_row()
-                if history_callback:
-                    history_callback(("next_row", prev_row, prev_col))
             return True
         return False
 
@@ -52,19 +152,39 @@ class Table:
         self.current_row += 1
         self.current_col = 0
         self.new_row()
-        self.logger.info(f"Переход к новой строке {self.current_row + 1}")
+        self.logger.info("Переход к новой строке %s", self.current_row + 1)
         return True
 
-    def display(self):
-        display_data = self.data
-        if self.current_col == 0 and len(self.data) > self.current_row + 1 and all(val == "_" for val in self.data[-1]):
-            display_data = self.data[:-1]
-        print(f'\nТаблица "{self.name}":')
-        print(
-            tabulate(display_data, headers=self.headers, showindex=[f"Строка {i+1}" for i in range(len(display_data))])
-        )
-        print(f"\nТекущая позиция: Строка {self.current_row + 1}, {self.headers[self.current_col]}")
-        print()
+    def visible_row_count(self) -> int:
+        """Число строк для вывода: пустая строка в конце, куда ещё не перешли, не показывается"""
+        count = len(self.data)
+        if self.current_col == 0 and count > self.current_row + 1 and all(val == EMPTY_CELL for val in self.data[-1]):
+            count -= 1
+        return count
+
+    def display(self, file=None, full: bool = False, view: Optional[RowView] = None):
+        """Выводит таблицу: по умолчанию только строки вокруг текущей, при full — целиком.
+
+        С view выводятся строки результата сортировки или отбора.
+        """
+        print(f'\nТаблица "{self.name}":', file=file)
+        if view is not None:
+            print(f"({view.title}, строк: {len(view)})", file=file)
+            self.renderer.render_rows(view.rows, file=file, limit=None if full else self.renderer.viewport_rows)
+            print(file=file)
+            return
+        if full:
+            from tabulate import tabulate
+
+            display_data = list(self.display_rows(self.visible_row_count()))
+            print(
+                tabulate(display_data, headers=self.headers, showindex=[f"Строка {i+1}" for i in range(len(display_data))]),
+                file=file,
+            )
+        else:
+            self.renderer.render(file=file)
+        print(f"\nТекущая позиция: Строка {self.current_row + 1}, {self.headers[self.current_col]}", file=file)
+        print(file=file)
 
     def set_position(self, row: int, col: int) -> bool:
         """Устанавливает текущую позицию для редактирования"""
@@ -72,44 +192,47 @@ class Table:
             self.previous_position = (self.current_row, self.current_col)
             self.current_row = row
             self.current_col = col
-            self.logger.info(f"Установлена позиция: строка {row+1}, столбец {self.headers[col]}")
+            self.logger.info("Установлена позиция: строка %s, столбец %s", row+1, self.headers[col])
             return True
         return False
 
     def delete_row(self, row: int) -> bool:
         """Удаляет указанную строку из таблицы"""
         if 0 <= row < len(self.data):
-            self.data.pop(row)
+            removed = self.data.pop(row)
+            self.notify(TableChange("delete", row, old=removed))
             if row < self.current_row:
                 self.current_row -= 1
             if not self.data:
                 self.new_row()
-            self.logger.info(f"Удалена строка {row + 1}")
+            self.logger.info("Удалена строка %s", row + 1)
             return True
-        self.logger.warning(f"Неверный индекс строки {row} для удаления")
+        self.logger.warning("Неверный индекс строки %s для удаления", row)
         return False
 
-    def insert_row(self, row: int) -> bool:
-        """Вставляет новую строку перед указанной позицией"""
+    def insert_row(self, row: int, values: Optional[List[str]] = None) -> bool:
+        """Вставляет строку (по умолчанию пустую) перед указанной позицией"""
         if 0 <= row <= len(self.data):
-            self.data.insert(row, ["_" for _ in range(len(self.headers))])
+            if values is None:
+                values = [EMPTY_CELL for _ in range(len(self.headers))]
+            self.data.insert(row, values)
+            self.notify(TableChange("insert", row, new=values))
 
             if row <= self.current_row:
                 self.current_row += 1
 
-            self.logger.info(f"Вставлена новая строка перед позицией {row + 1}")
+            self.logger.info("Вставлена новая строка перед позицией %s", row + 1)
             return True
-        self.logger.warning(f"Неверный индекс строки {row} для вставки")
+        self.logger.warning("Неверный индекс строки %s для вставки", row)
         return False
 
-    def save_to_csv(self, filename: str = None):
-        import csv
+    def saved_row_count(self) -> int:
+        """Сколько строк сохраняется в файл: строка, в которую ещё ничего не введено, не сохраняется"""
+        return len(self.data) - 1 if self.current_col == 0 else len(self.data)
 
+    def save_to_csv(self, filename: str = None):
+        """Сохраняет таблицу в CSV в текущем потоке (фоновая выгрузка — см. export.py)"""
         if filename is None:
             filename = f"{self.name}.csv"
-        save_data = self.data[:-1] if self.current_col == 0 else self.data
-        with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(self.headers)
-            writer.writerows(save_data)
-        self.logger.info(f"Таблица сохранена в файл {filename}")
+        write_export(filename, self.headers, self.display_rows(self.saved_row_count()))
+        self.logger.info("Таблица сохранена в файл %s", filename)
@@ -0,0 +1,263 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+from constants import EMPTY_CELL, INDEX_FUZZY_THRESHOLD, INDEX_KEY_SPACING, INDEX_PREFIX_LIMIT
+from formulas import FORMULA_PREFIX
+
+SEARCH_KINDS = ("exact", "prefix", "fuzzy")
+
+
+def normalize(value: str) -> str:
+    """Значение для сравнения: нижний регистр, "ё" как "е", одиночные пробелы."""
+    return " ".join(value.lower().replace("ё", "е").split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def indexable(value: str) -> bool:
+    return value != EMPTY_CELL and not value.startswith(FORMULA_PREFIX)
+
+
+class RowKeys:
+    """Ключи строк, возрастающие вместе с номером строки.
+
+    Индексы хранят ключи, а не номера строк, поэтому вставка и удаление
+    строки не требуют перенумерации: новая строка получает ключ посередине
+    между соседями, а номер строки по ключу находится двоичным поиском.
+    Когда между соседями не остаётся места, ключи раздаются заново с шагом
+    `spacing`; это редкая операция, о которой сообщается словарём замен.
+    """
+
+    def __init__(self, count: int, spacing: int = INDEX_KEY_SPACING):
+        self.spacing = spacing
+        self.keys = list(range(spacing, (count + 1) * spacing, spacing))
+        self.relabels = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def key(self, row: int) -> int:
+        return self.keys[row]
+
+    def position(self, key: int) -> int:
+        return bisect_left(self.keys, key)
+
+    def insert(self, row: int) -> Optional[Dict[int, int]]:
+        """Добавляет ключ для строки, вставленной в позицию `row`.
+
+        Возвращает замену старых ключей на новые, если пришлось раздать их заново.
+        """
+        mapping = None
+        before = self.keys[row - 1] if row > 0 else 0
+        after = self.keys[row] if row < len(self.keys) else before + 2 * self.spacing
+        if after - before < 2:
+            mapping = self.relabel()
+            before = self.keys[row - 1] if row > 0 else 0
+            after = self.keys[row] if row < len(self.keys) else before + 2 * self.spacing
+        self.keys.insert(row, (before + after) // 2)
+        return mapping
+
+    def pop(self, row: int) -> int:
+        return self.keys.pop(row)
+
+    def relabel(self) -> Dict[int, int]:
+        new_keys = list(range(self.spacing, (len(self.keys) + 1) * self.spacing, self.spacing))
+        mapping = dict(zip(self.keys, new_keys))
+        self.keys = new_keys
+        self.relabels += 1
+        return mapping
+
+
+class ColumnIndex:
+    """Индекс одного столбца: значение -> ключи строк, упорядоченные значения для поиска
+    по началу и триграммы значений для нечёткого поиска."""
+
+    __slots__ = ("rows", "values", "grams")
+
+    def __init__(self):
+        self.rows: Dict[str, List[int]] = {}
+        self.values: List[str] = []
+        self.grams: Dict[str, Set[str]] = {}
+
+    @classmethod
+    def build(cls, pairs: Iterable[Tuple[str, int]]) -> "ColumnIndex":
+        """Строит индекс по парам (значение, ключ) с возрастающими ключами."""
+        index = cls()
+        for value, key in pairs:
+            keys = index.rows.get(value)
+            if keys is None:
+                index.rows[value] = [key]
+            else:
+                keys.append(key)
+        index.values = sorted(index.rows)
+        for value in index.values:
+            for gram in trigrams(value):
+                index.grams.setdefault(gram, set()).add(value)
+        return index
+
+    def add(self, value: str, key: int):
+        keys = self.rows.get(value)
+        if keys is not None:
+            insort(keys, key)
+            return
+        self.rows[value] = [key]
+        insort(self.values, value)
+        for gram in trigrams(value):
+            self.grams.setdefault(gram, set()).add(value)
+
+    def remove(self, value: str, key: int):
+        keys = self.rows[value]
+        del keys[bisect_left(keys, key)]
+        if keys:
+            return
+        del self.rows[value]
+        del self.values[bisect_left(self.values, value)]
+        for gram in trigrams(value):
+            values = self.grams[gram]
+            values.discard(value)
+            if not values:
+                del self.grams[gram]
+
+    def remap(self, mapping: Dict[int, int]):
+        # Замена сохраняет порядок ключей, поэтому списки остаются упорядоченными
+        for value, keys in self.rows.items():
+            self.rows[value] = [mapping[key] for key in keys]
+
+    def search(self, kind: str, text: str) -> List[Tuple[float, str]]:
+        """Значения столбца, подходящие под `text`, со степенью сходства от 0 до 1."""
+        if kind == "exact":
+            return [(1.0, text)] if text in self.rows else []
+        if kind == "prefix":
+            found = []
+            for value in self.values[bisect_left(self.values, text) :]:
+                if not value.startswith(text) or len(found) >= INDEX_PREFIX_LIMIT:
+                    break
+                found.append((len(text) / len(value), value))
+            return found
+        query = trigrams(text)
+        shared = Counter()
+        for gram in query:
+            shared.update(self.grams.get(gram, ()))
+        found = []
+        for value, count in shared.items():
+            score = 2 * count / (len(query) + len(trigrams(value)))
+            if score >= INDEX_FUZZY_THRESHOLD:
+                found.append((score, value))
+        return found
+
+
+class Match(NamedTuple):
+    """Найденное значение: столбец, значение, ключи строк с ним и степень сходства."""
+
+    col: int
+    value: str
+    keys: List[int]
+    score: float
+
+
+class TableIndex:
+    """Индексы значений по столбцам для поиска строк голосом.
+
+    Индекс столбца строится при первом поиске по нему и дальше обновляется
+    по изменениям таблицы, поэтому поиск не просматривает строки: точное
+    совпадение — обращение к словарю, поиск по началу — двоичный поиск по
+    упорядоченным значениям, нечёткий — по общим триграммам различных значений.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.keys: Optional[RowKeys] = None
+        self.columns: Dict[int, ColumnIndex] = {}
+        table.add_listener(self.on_change)
+
+    def column(self, col: int) -> ColumnIndex:
+        index = self.columns.get(col)
+        if index is None:
+            if self.keys is None:
+                self.keys = RowKeys(len(self.table.data))
+            data = self.table.data
+            if hasattr(data, "columns"):
+                column = data.columns[col]
+                values = (column.get(row) for row in range(len(column)))
+            else:
+                values = (row[col] for row in data)
+            # Одинаковые значения нормализуются один раз
+            normalized: Dict[str, str] = {}
+            pairs = (
+                (normalized.get(value) or normalized.setdefault(value, normalize(value)), key)
+                for value, key in zip(values, self.keys.keys)
+                if indexable(value)
+            )
+            index = self.columns[col] = ColumnIndex.build(pairs)
+        return index
+
+    def on_change(self, change):
+        if self.keys is None:
+            return
+        if change.event == "set":
+            index = self.columns.get(change.col)
+            if index is not None:
+                key = self.keys.key(change.row)
+                if indexable(change.old):
+                    index.remove(normalize(change.old), key)
+                if indexable(change.new):
+                    index.add(normalize(change.new), key)
+        elif change.event in ("append", "insert"):
+            mapping = self.keys.insert(change.row)
+            if mapping:
+                for index in self.columns.values():
+                    index.remap(mapping)
+            key = self.keys.key(change.row)
+            for col, index in self.columns.items():
+                if indexable(change.new[col]):
+                    index.add(normalize(change.new[col]), key)
+        elif change.event == "delete":
+            key = self.keys.pop(change.row)
+            for col, index in self.columns.items():
+                if indexable(change.old[col]):
+                    index.remove(normalize(change.old[col]), key)
+
+    def find(self, words: Sequence[str], columns: Optional[Iterable[int]] = None) -> List[Match]:
+        """Значения, подходящие под фразу, в порядке убывания сходства.
+
+        Сначала ищутся точные совпадения, затем значения, начинающиеся с фразы,
+        затем похожие. На каждом шаге пробуются и окончания фразы, чтобы в
+        "перейди к товару молоко" найти "молоко".
+        """
+        columns = list(range(len(self.table.headers)) if columns is None else columns)
+        for kind in SEARCH_KINDS:
+            for start in range(len(words)):
+                text = normalize(" ".join(words[start:]))
+                matches = [
+                    Match(col, value, index.rows[value], score)
+                    for col in columns
+                    for index in (self.column(col),)
+                    for score, value in index.search(kind, text)
+                ]
+                if matches:
+                    matches.sort(key=lambda match: -match.score)
+                    return matches
+        return []
+
+    def locate(self, matches: List[Match], after_row: int) -> Optional[Tuple[int, int, str, int]]:
+        """Первая после `after_row` строка с лучшим совпадением (по кругу от начала таблицы).
+
+        Возвращает строку, столбец, значение и число строк с лучшими совпадениями.
+        """
+        if not matches:
+            return None
+        best = [match for match in matches if match.score == matches[0].score]
+        current = self.keys.key(after_row) if after_row < len(self.keys) else self.keys.key(-1)
+        following, wrapped = [], []
+        for match in best:
+            position = bisect_right(match.keys, current)
+            if position < len(match.keys):
+                following.append((match.keys[position], match))
+            else:
+                wrapped.append((match.keys[0], match))
+        key, match = min(following or wrapped, key=lambda item: item[0])
+        total = sum(len(match.keys) for match in best)
+        return self.keys.position(key), match.col, match.value, total
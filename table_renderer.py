@@ -0,0 +1,131 @@
+from collections import Counter
+from typing import List, Optional, Sequence, Tuple
+from constants import TABLE_VIEWPORT_ROWS, TABLE_VIEWPORT_AFTER
+from formulas import FORMULA_PREFIX
+
+COLUMN_GAP = "  "
+
+
+class TableRenderer:
+    """Отрисовка таблицы с кэшем ширины столбцов и отформатированных строк.
+
+    Подписывается на изменения таблицы и обновляет ширину столбцов по
+    счётчикам длин значений, не просматривая все строки. Выводит только окно
+    строк вокруг текущей, поэтому стоимость отрисовки не зависит от размера
+    таблицы. Заново форматируются только изменившиеся строки, пока ширина
+    столбцов не меняется. Для ячеек с формулами учитывается вычисленное
+    значение: его длина приходит с событием "computed".
+    """
+
+    def __init__(self, table, viewport_rows: int = TABLE_VIEWPORT_ROWS, viewport_after: int = TABLE_VIEWPORT_AFTER):
+        self.table = table
+        self.viewport_rows = viewport_rows
+        self.viewport_after = viewport_after
+        # Для каждого столбца: длина значения -> сколько ячеек такой длины
+        self.length_counts: List[Counter] = [Counter({len(header): 1}) for header in table.headers]
+        for values in table.display_rows():
+            for col, value in enumerate(values):
+                self.length_counts[col][len(value)] += 1
+        self.widths = [max(counts) for counts in self.length_counts]
+        # Отформатированные ячейки строки без подписи "Строка N" вместе с номером раскладки,
+        # при которой они отформатированы; None — строку нужно переформатировать
+        self.lines: List[Optional[Tuple[int, str]]] = [None] * len(table.data)
+        self.layout = 0
+        self.rows_formatted = 0
+        table.add_listener(self.on_change)
+
+    def on_change(self, change):
+        if change.event == "set":
+            self.lines[change.row] = None
+            if not change.old.startswith(FORMULA_PREFIX):
+                self.remove_length(change.col, len(change.old))
+            if not change.new.startswith(FORMULA_PREFIX):
+                self.add_length(change.col, len(change.new))
+        elif change.event in ("append", "insert"):
+            self.lines.insert(change.row, None)
+            for col, value in enumerate(change.new):
+                if not value.startswith(FORMULA_PREFIX):
+                    self.add_length(col, len(value))
+        elif change.event == "delete":
+            self.lines.pop(change.row)
+            for col, value in enumerate(change.old):
+                if not value.startswith(FORMULA_PREFIX):
+                    self.remove_length(col, len(value))
+        elif change.event == "computed":
+            # Длины вычисленных значений формул; old/new равны None при появлении и удалении формулы
+            if change.row < len(self.lines):
+                self.lines[change.row] = None
+            if change.old is not None:
+                self.remove_length(change.col, len(change.old))
+            if change.new is not None:
+                self.add_length(change.col, len(change.new))
+
+    def add_length(self, col: int, length: int):
+        self.length_counts[col][length] += 1
+        if length > self.widths[col]:
+            self.set_width(col, length)
+
+    def remove_length(self, col: int, length: int):
+        counts = self.length_counts[col]
+        counts[length] -= 1
+        if counts[length] == 0:
+            del counts[length]
+            if length == self.widths[col]:
+                # Число различных длин мало, поэтому пересчёт не зависит от числа строк
+                self.set_width(col, max(counts))
+
+    def set_width(self, col: int, width: int):
+        self.widths[col] = width
+        # Все строки устаревают, но переформатируются только при выводе
+        self.layout += 1
+
+    def format_row(self, row: int) -> str:
+        cached = self.lines[row]
+        if cached is not None and cached[0] == self.layout:
+            return cached[1]
+        values = self.table.display_row(row)
+        line = COLUMN_GAP.join(value.ljust(width) for value, width in zip(values, self.widths)).rstrip()
+        self.lines[row] = (self.layout, line)
+        self.rows_formatted += 1
+        return line
+
+    def viewport(self, row_count: int) -> range:
+        """Диапазон строк, который помещается в окно вокруг текущей строки."""
+        end = min(row_count, max(self.table.current_row + 1 + self.viewport_after, self.viewport_rows))
+        start = max(0, end - self.viewport_rows)
+        return range(start, end)
+
+    def render_header(self, label_width: int, file=None):
+        header = COLUMN_GAP.join(name.ljust(width) for name, width in zip(self.table.headers, self.widths))
+        print(" " * label_width + COLUMN_GAP + header.rstrip(), file=file)
+        print(
+            "-" * label_width + COLUMN_GAP + COLUMN_GAP.join("-" * width for width in self.widths),
+            file=file,
+        )
+
+    def render(self, file=None, rows: Optional[range] = None):
+        """Выводит заголовок и строки `rows` (по умолчанию — окно вокруг текущей строки)."""
+        row_count = self.table.visible_row_count()
+        if rows is None:
+            rows = self.viewport(row_count)
+        label_width = len(f"Строка {row_count}")
+        self.render_header(label_width, file=file)
+        if rows.start > 0:
+            print(f"... строки 1-{rows.start} скрыты", file=file)
+        for row in rows:
+            print(f"Строка {row + 1}".ljust(label_width) + COLUMN_GAP + self.format_row(row), file=file)
+        if rows.stop < row_count:
+            print(f"... строки {rows.stop + 1}-{row_count} скрыты", file=file)
+        if len(rows) < row_count:
+            print("(вся таблица: команда 'покажи всю таблицу')", file=file)
+
+    def render_rows(self, rows: Sequence[int], file=None, limit: Optional[int] = None):
+        """Выводит строки в заданном порядке (результат сортировки или отбора), не больше `limit`."""
+        label_width = len(f"Строка {self.table.visible_row_count()}")
+        self.render_header(label_width, file=file)
+        shown = rows if limit is None else rows[:limit]
+        for row in shown:
+            row = int(row)
+            print(f"Строка {row + 1}".ljust(label_width) + COLUMN_GAP + self.format_row(row), file=file)
+        if len(shown) < len(rows):
+            print(f"... ещё строк: {len(rows) - len(shown)}", file=file)
@@ -0,0 +1,269 @@
+import re
+import sys
+from array import array
+from itertools import islice
+from typing import Iterator, List, Optional
+from constants import EMPTY_CELL
+
+# Числа после words_to_number выглядят как "25,0" или "1,5e+16"
+NUMBER_PATTERN = re.compile(r"-?\d[\d,e+-]*")
+
+
+def parse_number(value: str) -> Optional[float]:
+    """Разбирает число в формате words_to_number. Возвращает None, если строка не число
+    или не восстанавливается из числа символ в символ."""
+    if not NUMBER_PATTERN.fullmatch(value):
+        return None
+    try:
+        number = float(value.replace(",", "."))
+    except ValueError:
+        return None
+    return number if format_number(number) == value else None
+
+
+def format_number(number: float) -> str:
+    return str(number).replace(".", ",")
+
+
+class ListStorage(list):
+    """Хранение строк списком списков строк (вариант по умолчанию)."""
+
+    def get(self, row: int, col: int) -> str:
+        return self[row][col]
+
+    def set(self, row: int, col: int, value: str):
+        # Строка заменяется копией, а не меняется на месте: её могут читать снимки таблицы
+        values = self[row][:]
+        values[col] = value
+        self[row] = values
+
+    def rows(self, stop: Optional[int] = None) -> Iterator[List[str]]:
+        """Перебирает строки без копирования списка."""
+        return islice(self, stop)
+
+    def snapshot(self) -> "ListStorage":
+        """Копия таблицы, которую не затронут следующие изменения. Строки не копируются:
+        set заменяет строку целиком, поэтому снимок продолжает видеть прежнюю."""
+        return ListStorage(self)
+
+    def memory_usage(self) -> int:
+        """Приблизительный объём памяти в байтах (списки и уникальные строки)."""
+        seen = set()
+        total = sys.getsizeof(self)
+        for row in self:
+            total += sys.getsizeof(row)
+            for value in row:
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        return total
+
+
+class NumericColumn:
+    """Числовой столбец: значения в array('d') и маска пустых ячеек (байт на строку)."""
+
+    kind = "numeric"
+
+    def __init__(self):
+        self.values = array("d")
+        self.nulls = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def get(self, row: int) -> str:
+        return EMPTY_CELL if self.nulls[row] else format_number(self.values[row])
+
+    def set(self, row: int, value: str) -> bool:
+        """Записывает значение. Возвращает False, если значение не числовое."""
+        if value == EMPTY_CELL:
+            self.values[row] = 0.0
+            self.nulls[row] = 1
+            return True
+        number = parse_number(value)
+        if number is None:
+            return False
+        self.values[row] = number
+        self.nulls[row] = 0
+        return True
+
+    def insert(self, row: int, value: str) -> bool:
+        """Вставляет значение. Возвращает False, если значение не числовое."""
+        if value == EMPTY_CELL:
+            self.values.insert(row, 0.0)
+            self.nulls.insert(row, 1)
+            return True
+        number = parse_number(value)
+        if number is None:
+            return False
+        self.values.insert(row, number)
+        self.nulls.insert(row, 0)
+        return True
+
+    def pop(self, row: int):
+        self.values.pop(row)
+        self.nulls.pop(row)
+
+    def snapshot(self) -> "NumericColumn":
+        column = NumericColumn()
+        column.values = self.values[:]
+        column.nulls = self.nulls[:]
+        return column
+
+    def memory_usage(self) -> int:
+        return sys.getsizeof(self.values) + sys.getsizeof(self.nulls)
+
+
+class TextColumn:
+    """Текстовый столбец со словарным кодированием: каждая строка хранится один раз,
+    в ячейках — номера в словаре (array('i')) и маска пустых ячеек."""
+
+    kind = "text"
+
+    def __init__(self):
+        self.codes = array("i")
+        self.nulls = bytearray()
+        self.dictionary: List[str] = []
+        self.lookup = {}
+
+    @classmethod
+    def from_column(cls, column) -> "TextColumn":
+        """Переводит столбец в текстовый, когда в него попало нечисловое значение."""
+        text = cls()
+        for row in range(len(column)):
+            text.insert(row, column.get(row))
+        return text
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def encode(self, value: str) -> int:
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self.dictionary.append(sys.intern(value))
+            self.lookup[value] = code
+        return code
+
+    def get(self, row: int) -> str:
+        return EMPTY_CELL if self.nulls[row] else self.dictionary[self.codes[row]]
+
+    def set(self, row: int, value: str) -> bool:
+        if value == EMPTY_CELL:
+            self.codes[row] = 0
+            self.nulls[row] = 1
+        else:
+            self.codes[row] = self.encode(value)
+            self.nulls[row] = 0
+        return True
+
+    def insert(self, row: int, value: str) -> bool:
+        if value == EMPTY_CELL:
+            self.codes.insert(row, 0)
+            self.nulls.insert(row, 1)
+        else:
+            self.codes.insert(row, self.encode(value))
+            self.nulls.insert(row, 0)
+        return True
+
+    def pop(self, row: int):
+        self.codes.pop(row)
+        self.nulls.pop(row)
+
+    def snapshot(self) -> "TextColumn":
+        # Словарь только пополняется, поэтому копии достаточно ссылки на него
+        column = TextColumn()
+        column.codes = self.codes[:]
+        column.nulls = self.nulls[:]
+        column.dictionary = self.dictionary
+        column.lookup = self.lookup
+        return column
+
+    def memory_usage(self) -> int:
+        total = sys.getsizeof(self.codes) + sys.getsizeof(self.nulls)
+        total += sys.getsizeof(self.dictionary) + sys.getsizeof(self.lookup)
+        return total + sum(sys.getsizeof(value) for value in self.dictionary)
+
+
+class ColumnarStorage:
+    """Хранение по столбцам с тем же интерфейсом, что у ListStorage.
+
+    Пока в столбец попадают только числа, он хранится как NumericColumn;
+    первое нечисловое значение переводит его в TextColumn. Пустые ячейки
+    хранятся маской, а не строками "_". Строки таблицы собираются из
+    столбцов при чтении, поэтому их нельзя менять на месте — только через set.
+    """
+
+    def __init__(self, column_count: int):
+        self.columns = [NumericColumn() for _ in range(column_count)]
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self.length))]
+        if row < 0:
+            row += self.length
+        if not 0 <= row < self.length:
+            raise IndexError("Индекс строки вне таблицы")
+        return [column.get(row) for column in self.columns]
+
+    def __iter__(self) -> Iterator[List[str]]:
+        return self.rows()
+
+    def get(self, row: int, col: int) -> str:
+        return self.columns[col].get(row)
+
+    def set(self, row: int, col: int, value: str):
+        column = self.columns[col]
+        if not column.set(row, value):
+            column = self.columns[col] = TextColumn.from_column(column)
+            column.set(row, value)
+
+    def insert(self, row: int, values: List[str]):
+        for col, value in enumerate(values):
+            column = self.columns[col]
+            if not column.insert(row, value):
+                column = self.columns[col] = TextColumn.from_column(column)
+                column.insert(row, value)
+        self.length += 1
+
+    def append(self, values: List[str]):
+        self.insert(self.length, values)
+
+    def pop(self, row: int = -1) -> List[str]:
+        if row < 0:
+            row += self.length
+        values = self[row]
+        for column in self.columns:
+            column.pop(row)
+        self.length -= 1
+        return values
+
+    def rows(self, stop: Optional[int] = None) -> Iterator[List[str]]:
+        stop = self.length if stop is None else min(stop, self.length)
+        for row in range(stop):
+            yield [column.get(row) for column in self.columns]
+
+    def snapshot(self) -> "ColumnarStorage":
+        """Копия столбцов (копируются массивы, а не строки), которую не затронут
+        следующие изменения таблицы."""
+        storage = ColumnarStorage(0)
+        storage.columns = [column.snapshot() for column in self.columns]
+        storage.length = self.length
+        return storage
+
+    def memory_usage(self) -> int:
+        """Приблизительный объём памяти в байтах."""
+        return sys.getsizeof(self) + sum(column.memory_usage() for column in self.columns)
+
+
+def create_storage(kind: str, column_count: int):
+    """Создаёт хранилище строк указанного вида ("list" или "columnar")."""
+    if kind == "list":
+        return ListStorage()
+    if kind == "columnar":
+        return ColumnarStorage(column_count)
+    raise ValueError(f"Неизвестный вид хранения '{kind}', доступны: list, columnar")
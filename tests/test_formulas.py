@@ -0,0 +1,82 @@
+"""Формулы после правок совпадают с формулами таблицы, заново прочитанной из строк."""
+
+import logging
+import random
+
+import pytest
+
+from history import History
+from table import Table
+
+HEADERS = ["a", "b", "c", "d"]
+FORMULAS = [
+    "=сумма столбца a",
+    "=сумма столбца c",
+    "=среднее столбца b",
+    "=максимум столбца a",
+    "=минимум столбца c",
+    "=столбец a умножить на 2",
+    "=строка 2 столбец b плюс 1",
+    "=сумма строки",
+    "=столбец c плюс столбец a",
+    "=сумма столбца d",
+    "=строка 1 столбец d разделить на столбец a",
+]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def rebuilt(table: Table) -> Table:
+    return Table(table.name, table.headers, storage=table.storage, rows=[list(values) for values in table.data.rows()])
+
+
+def shown(table: Table):
+    return [table.display_row(row) for row in range(len(table.data))]
+
+
+@pytest.mark.parametrize("storage", ["list", "columnar"])
+@pytest.mark.parametrize("seed", range(4))
+def test_edits_match_rebuilt_table(storage, seed):
+    rng = random.Random(seed)
+    table = Table("T", HEADERS, storage=storage)
+    history = History(table)
+    for _ in range(150):
+        rows = len(table.data)
+        action = rng.random()
+        if action < 0.55:
+            value = rng.choice([f"{rng.randint(-5, 20)},0", "текст", "_", "0,1", rng.choice(FORMULAS)])
+            table.set_cell(rng.randrange(rows), rng.randrange(len(HEADERS)), value)
+        elif action < 0.75:
+            table.insert_row(rng.randrange(rows + 1), [rng.choice(["1,0", "_", "x", rng.choice(FORMULAS)]) for _ in HEADERS])
+        elif action < 0.85 and rows > 1:
+            table.delete_row(rng.randrange(rows))
+        else:
+            history.begin()
+            table.set_cell(rng.randrange(rows), rng.randrange(len(HEADERS)), "7,0")
+            history.commit()
+            if rng.random() < 0.5:
+                history.undo()
+        assert shown(table) == shown(rebuilt(table))
+
+
+def test_cycle_error_does_not_depend_on_edit_order():
+    table = Table("T", ["a", "b", "c"])
+    table.set_cell(0, 2, "=строка 2 столбец b")
+    table.insert_row(1, ["_", "_", "=сумма строки"])
+    table.set_cell(1, 0, "=максимум столбца c")
+    assert shown(table) == [["_", "_", "#ЗНАЧ"], ["#ЦИКЛ", "_", "#ЦИКЛ"]]
+    assert shown(table) == shown(rebuilt(table))
+
+
+def test_loaded_aggregates_are_rounded():
+    rows = [["1,0", "=среднее столбца a", "_"], ["1,0", "=сумма столбца c", "_"], ["2,0", "_", "_"]]
+    table = Table("T", ["a", "b", "c"], rows=rows)
+    table.set_cell(2, 0, "11,0")
+    loaded = rebuilt(table)
+    assert [values[1] for values in shown(loaded)[:2]] == ["4,333333333", "0,0"]
+    assert shown(loaded) == shown(table)
@@ -0,0 +1,80 @@
+"""Отмена и повтор через обратные изменения возвращают таблицу точно в прежнее состояние."""
+
+import logging
+import random
+
+import pytest
+
+from history import History
+from table import Table
+
+HEADERS = ["a", "b", "c"]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def state(table: Table):
+    return [table.display_row(row) for row in range(len(table.data))], list(table.data.rows())
+
+
+def command(table: Table, history: History, rng: random.Random):
+    history.begin()
+    for _ in range(rng.randint(1, 3)):
+        rows = len(table.data)
+        action = rng.random()
+        if action < 0.6:
+            value = rng.choice([f"{rng.randint(0, 9)},0", "x", "_", "=сумма столбца a", "=столбец a плюс 1"])
+            table.set_cell(rng.randrange(rows), rng.randrange(len(HEADERS)), value)
+        elif action < 0.8:
+            table.insert_row(rng.randrange(rows + 1), [rng.choice(["1,0", "_", "x"]) for _ in HEADERS])
+        elif rows > 1:
+            table.delete_row(rng.randrange(rows))
+    history.commit()
+
+
+@pytest.mark.parametrize("storage", ["list", "columnar"])
+def test_undo_and_redo_restore_every_state(storage):
+    rng = random.Random(4)
+    table = Table("T", HEADERS, storage=storage)
+    history = History(table, max_steps=1000)
+    states = [state(table)]
+    for _ in range(60):
+        command(table, history, rng)
+        states.append(state(table))
+    for expected in reversed(states[:-1]):
+        assert history.undo() is not None
+        assert state(table) == expected
+    assert history.undo() is None
+    for expected in states[1:]:
+        assert history.redo() is not None
+        assert state(table) == expected
+
+
+def test_rollback_stops_at_checkpoint():
+    rng = random.Random(5)
+    table = Table("T", HEADERS)
+    history = History(table, checkpoint_every=1000)
+    for _ in range(5):
+        command(table, history, rng)
+    history.checkpoint()
+    marked = state(table)
+    for _ in range(4):
+        command(table, history, rng)
+    assert history.rollback() == 4
+    assert state(table) == marked
+
+
+def test_trim_keeps_newest_step():
+    table = Table("T", HEADERS)
+    history = History(table, max_bytes=1)
+    history.begin()
+    table.set_cell(0, 0, "очень длинное значение")
+    history.commit()
+    assert len(history) == 1
+    history.undo()
+    assert table.data.get(0, 0) == "_"
@@ -0,0 +1,97 @@
+"""Таблица, восстановленная из снимка и журнала, совпадает с таблицей в памяти."""
+
+import logging
+import os
+import random
+
+import pytest
+
+from export import Exporter
+from history import History
+from journal import TableJournal
+from table import Table
+from workspace import Workspace
+
+HEADERS = ["a", "b", "c"]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def edit(table: Table, rng: random.Random, journal: TableJournal = None):
+    rows = len(table.data)
+    action = rng.random()
+    if action < 0.6:
+        value = rng.choice([f"{rng.randint(0, 9)},0", "текст", "_", "=сумма столбца a", "=сумма строки"])
+        table.set_cell(rng.randrange(rows), rng.randrange(len(HEADERS)), value)
+    elif action < 0.8:
+        table.insert_row(rng.randrange(rows + 1), [rng.choice(["1,0", "_", "x"]) for _ in HEADERS])
+    elif rows > 1:
+        table.delete_row(rng.randrange(rows))
+    table.current_row = rng.randrange(len(table.data))
+    if journal is not None:
+        journal.record_cursor()
+
+
+def assert_restored(path: str, table: Table):
+    restored = TableJournal.restore(path)
+    assert list(restored.data.rows()) == list(table.data.rows())
+    assert (restored.current_row, restored.current_col) == (table.current_row, table.current_col)
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_restore_after_compactions(tmp_path, background):
+    rng = random.Random(1)
+    exporter = Exporter() if background else None
+    table = Table("T", HEADERS)
+    journal = TableJournal(table, str(tmp_path), compact_every=7, exporter=exporter)
+    journal.start()
+    for _ in range(200):
+        edit(table, rng, journal)
+    # Без закрытия журнала, как при аварийном завершении
+    journal.wait_compaction()
+    journal.sync()
+    assert_restored(journal.path, table)
+    if exporter is not None:
+        exporter.close()
+
+
+def test_undo_is_journaled(tmp_path):
+    rng = random.Random(2)
+    table = Table("T", HEADERS)
+    history = History(table)
+    journal = TableJournal(table, str(tmp_path))
+    journal.start()
+    for _ in range(50):
+        history.begin()
+        edit(table, rng)
+        history.commit()
+        if rng.random() < 0.3:
+            history.undo()
+        journal.record_cursor()
+    journal.sync()
+    assert_restored(journal.path, table)
+
+
+def test_reopened_table_journals_against_store(tmp_path):
+    workspace = Workspace(str(tmp_path / "ws"), journal_dir=str(tmp_path / "journal"))
+    table = Table("T", HEADERS, rows=[[str(row), "_", "x"] for row in range(100)])
+    entry = workspace.add(table, History(table))
+    workspace.flush(entry)
+    assert workspace.evict(entry)
+
+    entry = workspace.open("T")
+    workspace.activate(entry)
+    entry.table.insert_row(0, ["new", "_", "_"])
+    journal = entry.journal
+    # Снимок журнала — жёсткая ссылка на файл хранилища, таблица не переписывается
+    assert os.path.samefile(journal.snapshot_path, workspace.store_path("T"))
+    rng = random.Random(3)
+    for _ in range(30):
+        edit(entry.table, rng, journal)
+    journal.sync()
+    assert_restored(journal.path, entry.table)
@@ -0,0 +1,75 @@
+"""Изменения из outbox доставляются на сервер ровно один раз и по порядку seq."""
+
+import json
+import logging
+import os
+import threading
+
+import pytest
+
+from sync import STATE_FILE, StandInBackend, TableSync
+from table import Table
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def backend():
+    server = StandInBackend(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def connect(backend: StandInBackend, directory: str) -> TableSync:
+    return TableSync(backend.url, directory, batch_size=16, batch_interval=0.01, backoff_initial=0.01, backoff_max=0.05)
+
+
+def follow(table: Table, sync: TableSync):
+    def listener(change):
+        sync.table_changed(table.name, change)
+
+    table.add_listener(listener)
+    return listener
+
+
+def test_outbox_survives_restart_and_lost_replies(tmp_path, backend):
+    directory = str(tmp_path)
+    backend.offline = True
+    sync = connect(backend, directory)
+    table = Table("Без связи", ["номер", "значение"])
+    listener = follow(table, sync)
+    sync.table_added(table)
+    for number in range(100):
+        table.insert_row(len(table.data), [str(number), "_"])
+        table.set_cell(len(table.data) - 1, 1, str(number * 2))
+    sync.close(timeout=0.1)
+    assert "Без связи" not in backend.tables
+    with open(os.path.join(directory, STATE_FILE), encoding="utf-8") as f:
+        next_seq = json.load(f)["next_seq"]
+
+    # Ответ на каждый четвёртый запрос теряется: сервер пропускает повторные seq
+    backend.offline = False
+    backend.fail_every = 4
+    sync = connect(backend, directory)
+    assert sync.next_seq == next_seq
+    sync.close(timeout=30)
+    assert backend.tables["Без связи"]["rows"] == [list(values) for values in table.data.rows()]
+    assert backend.duplicates > 0
+    assert backend.last_seq[sync.station] == next_seq - 1
+    assert sorted(os.listdir(directory)) == sorted([STATE_FILE, f"outbox-{next_seq:012d}.jsonl"])
+
+    # Номера seq после перезапуска продолжаются, а не начинаются заново
+    table.remove_listener(listener)
+    sync = connect(backend, directory)
+    follow(table, sync)
+    table.set_cell(0, 1, "новое")
+    sync.close(timeout=30)
+    assert backend.last_seq[sync.station] == next_seq
+    assert backend.tables["Без связи"]["rows"][0][1] == "новое"
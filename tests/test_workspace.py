@@ -0,0 +1,61 @@
+"""Выгрузка таблицы из памяти и повторное открытие не меняют её содержимое и историю."""
+
+import logging
+
+import pytest
+
+from export import Exporter
+from history import History
+from table import Table
+from workspace import Workspace
+
+HEADERS = ["фамилия", "балл"]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def create(workspace: Workspace, name: str, rows: int) -> Table:
+    table = Table(name, HEADERS, rows=[[f"ученик {row}", f"{row},0"] for row in range(rows)] + [["итог", "=сумма столбца балл"]])
+    workspace.activate(workspace.add(table, History(table)))
+    return table
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_evicted_table_reopens_with_data_cursor_and_history(tmp_path, background):
+    exporter = Exporter() if background else None
+    workspace = Workspace(str(tmp_path / "ws"), memory_budget=1, journal_dir=str(tmp_path / "journal"), exporter=exporter)
+    first = create(workspace, "Первая", 50)
+    history = workspace.current.history
+    history.begin()
+    first.set_cell(3, 1, "100,0")
+    history.commit()
+    first.current_row, first.current_col = 7, 1
+    rows = list(first.data.rows())
+    shown = [first.display_row(row) for row in range(len(first.data))]
+
+    create(workspace, "Вторая", 10)
+    entry = workspace.get("Первая")
+    if exporter is not None:
+        entry.pending.done.wait()
+    workspace.enforce_budget()
+    assert not entry.loaded
+    assert workspace.evictions == 1
+
+    entry = workspace.open("Первая")
+    workspace.activate(entry)
+    table = entry.table
+    assert list(table.data.rows()) == rows
+    assert [table.display_row(row) for row in range(len(table.data))] == shown
+    assert (table.current_row, table.current_col) == (7, 1)
+    assert entry.history is history and history.table is table
+    assert history.undo() is not None
+    assert table.data.get(3, 1) == "3,0"
+    assert table.display_row(50)[1] == "1225,0"
+    workspace.close()
+    if exporter is not None:
+        exporter.close()
@@ -0,0 +1,108 @@
+import logging
+from collections import deque
+from typing import List
+from constants import (
+    SAMPLE_RATE,
+    VAD_FRAME_MS,
+    VAD_MIN_ENERGY,
+    VAD_NOISE_RATIO,
+    VAD_ZCR_THRESHOLD,
+    VAD_MIN_SPEECH_FRAMES,
+    VAD_HANGOVER_CHUNKS,
+    VAD_PREROLL_CHUNKS,
+)
+
+
+class VoiceActivityDetector:
+    """Пропускает к распознавателю только блоки с речью.
+
+    Каждый блок делится на короткие кадры, для которых векторно считаются
+    энергия (RMS) и доля переходов через ноль. Порог энергии подстраивается
+    под фоновый шум. После речи ещё несколько блоков пропускаются без
+    проверки (нужно распознавателю, чтобы заметить конец фразы), а перед
+    речью добавляются последние блоки тишины, чтобы не терять первый слог.
+    """
+
+    def __init__(
+        self,
+        rate: int = SAMPLE_RATE,
+        frame_ms: int = VAD_FRAME_MS,
+        min_energy: float = VAD_MIN_ENERGY,
+        noise_ratio: float = VAD_NOISE_RATIO,
+        zcr_threshold: float = VAD_ZCR_THRESHOLD,
+        min_speech_frames: int = VAD_MIN_SPEECH_FRAMES,
+        hangover_chunks: int = VAD_HANGOVER_CHUNKS,
+        preroll_chunks: int = VAD_PREROLL_CHUNKS,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.frame_len = rate * frame_ms // 1000
+        self.min_energy = min_energy
+        self.noise_ratio = noise_ratio
+        self.zcr_threshold = zcr_threshold
+        self.min_speech_frames = min_speech_frames
+        self.hangover_chunks = hangover_chunks
+        self.noise_floor = 0.0
+        self._preroll = deque(maxlen=preroll_chunks)
+        self._hangover_left = 0
+        self.chunks_total = 0
+        self.chunks_passed = 0
+        self.decode_time = 0.0
+        self.decoded_chunks = 0
+
+    def is_speech(self, chunk: bytes) -> bool:
+        """Определяет, есть ли в блоке речь."""
+        import numpy as np
+
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        usable = len(samples) - len(samples) % self.frame_len
+        if usable == 0:
+            return False
+        frames = samples[:usable].reshape(-1, self.frame_len).astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+        threshold = max(self.min_energy, self.noise_floor * self.noise_ratio)
+        loud = rms > threshold
+        # Глухие согласные тихие, но с частыми переходами через ноль
+        fricative = (rms > threshold / 2) & (zcr > self.zcr_threshold)
+        speech = np.count_nonzero(loud | fricative) >= self.min_speech_frames
+
+        if not speech:
+            level = float(np.median(rms))
+            self.noise_floor = level if self.noise_floor == 0.0 else 0.95 * self.noise_floor + 0.05 * level
+        return speech
+
+    def process(self, chunk: bytes) -> List[bytes]:
+        """Возвращает блоки, которые нужно передать распознавателю (возможно, ни одного)."""
+        self.chunks_total += 1
+        if self.is_speech(chunk):
+            passed = list(self._preroll)
+            passed.append(chunk)
+            self._preroll.clear()
+            self._hangover_left = self.hangover_chunks
+        elif self._hangover_left > 0:
+            self._hangover_left -= 1
+            passed = [chunk]
+        else:
+            self._preroll.append(chunk)
+            passed = []
+        self.chunks_passed += len(passed)
+        return passed
+
+    def note_decode(self, seconds: float):
+        """Учитывает время декодирования одного блока для оценки экономии."""
+        self.decode_time += seconds
+        self.decoded_chunks += 1
+
+    def stats(self) -> dict:
+        """Возвращает долю отброшенного звука и оценку сэкономленного времени CPU."""
+        dropped = self.chunks_total - self.chunks_passed
+        avg_decode = self.decode_time / self.decoded_chunks if self.decoded_chunks else 0.0
+        return {
+            "chunks_total": self.chunks_total,
+            "chunks_passed": self.chunks_passed,
+            "dropped_fraction": dropped / self.chunks_total if self.chunks_total else 0.0,
+            "cpu_saved_seconds": dropped * avg_decode,
+            "noise_floor": self.noise_floor,
+        }
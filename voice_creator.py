@@ -1,146 +1,501 @@
 import json
 import logging
-from typing import List, Optional
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, TextIO
 from datetime import datetime
-import pyaudio
-from vosk import Model, KaldiRecognizer
-from text_to_num import alpha2digit
 from table import Table
+from export import ExportJob, Exporter
+from journal import TableJournal
+from workspace import Workspace, WorkspaceEntry
+from sync import TableSync
+from history import History
+from metrics import CommandMetrics
+from command_parser import CommandParser, ParsedCommand, edit_target, format_spoken_value, match_column, row_number
+from formulas import ERROR_CYCLE, FORMULA_WORD, FormulaError, cell_number
+from queries import COMPARISONS, nominative_number
+from table_storage import format_number
+from audio_capture import AudioCapture, AudioSource
+from recognizers import RecognizerSet, MODE_DICTATION, MODE_COMMAND, MODE_EDIT, MODE_PAUSE
+from vad import VoiceActivityDetector
 from logging_config import setup_logging
-from constants import TEMPLATES
+from constants import (
+    TEMPLATES,
+    MODEL_PATH,
+    JOURNAL_DIR,
+    SAMPLE_RATE,
+    CHUNK_SIZE,
+    CAPTURE_BUFFER_CHUNKS,
+    STARTUP_AUDIO_SECONDS,
+    EARLY_DISPATCH_COMMANDS,
+    EARLY_DISPATCH_STABLE_CHUNKS,
+    HISTORY_MAX_TABLES,
+    METRICS_DIR,
+    WORKSPACE_DIR,
+    WORKSPACE_MEMORY_BUDGET,
+    EXPORT_DIR,
+    EXPORT_FORMAT,
+    EXPORT_COMPRESSION,
+    SYNC_URL,
+    SYNC_DIR,
+)
+
+# Состояния диалога и режим распознавания, который в них используется
+STATE_MAIN = "main"
+STATE_PAUSE = "pause"
+STATE_EDIT_TARGET = "edit_target"
+STATE_EDIT_VALUE = "edit_value"
+STATE_ROW_NUMBER = "row_number"
+
+STARTUP_STAGES = {"import": "импорт", "stream_open": "открытие микрофона", "model_load": "загрузка модели"}
+
+STATE_MODES = {
+    STATE_MAIN: MODE_DICTATION,
+    STATE_PAUSE: MODE_PAUSE,
+    STATE_EDIT_TARGET: MODE_EDIT,
+    STATE_EDIT_VALUE: MODE_DICTATION,
+    STATE_ROW_NUMBER: MODE_COMMAND,
+}
 
 
 class VoiceTableCreator:
-    def __init__(self):
-        """Инициализация VoiceTableCreator с настройкой логирования, Vosk и PyAudio."""
+    def __init__(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        buffer_chunks: int = CAPTURE_BUFFER_CHUNKS,
+        early_dispatch: bool = True,
+        use_vad: bool = True,
+        model=None,
+        audio_source: Optional[AudioSource] = None,
+        output_dir: str = ".",
+        output: Optional[TextIO] = None,
+        journal_dir: Optional[str] = JOURNAL_DIR,
+        metrics_dir: Optional[str] = METRICS_DIR,
+        workspace_dir: Optional[str] = WORKSPACE_DIR,
+        memory_budget: int = WORKSPACE_MEMORY_BUDGET,
+        sync_url: Optional[str] = SYNC_URL,
+        sync_dir: str = SYNC_DIR,
+    ):
+        """Инициализация VoiceTableCreator с настройкой логирования, Vosk и захвата звука.
+
+        Уже загруженную модель и другой источник звука (см. AudioSource в
+        audio_capture.py) можно передать через `model` и `audio_source`; по
+        умолчанию модель загружается из MODEL_PATH в фоновом потоке, а звук
+        берётся с микрофона. Для источника готовых фраз (TextCommandSource)
+        модель не загружается.
+        Сообщения для оператора выводятся в `output` (по умолчанию в консоль).
+        Изменения несохранённой таблицы пишутся в журнал в `journal_dir`
+        (None отключает журнал). Статистика времени команд при завершении
+        записывается в `metrics_dir` (None — не записывается).
+        Открытые за сеанс таблицы остаются в рабочем пространстве (см.
+        workspace.py): таблицы сверх `memory_budget` байт выгружаются в
+        `workspace_dir` (None — все таблицы остаются в памяти). Файлы таблиц
+        пишутся в фоновом потоке (Exporter), сообщения о записи выводятся
+        перед обработкой следующей фразы.
+        С `sync_url` изменения таблиц отправляются на сервер фоновым потоком
+        (см. sync.py); неотправленные изменения ждут в `sync_dir`.
+        """
         self.logger = logging.getLogger(__name__)
         setup_logging(console_output=False) 
         self.logger.info("Инициализация Voice Table Creator")
-
-        # Инициализация модели распознавания речи
-        self.model = Model("vosk-model-small-ru-0.22")
+        self.startup_times = {}
+        if audio_source is None:
+            audio_source = AudioCapture(chunk_size=chunk_size, buffer_chunks=buffer_chunks)
+
+        # Модель загружается в фоне, звук тем временем копится в startup_audio
+        self.model = model
+        self.model_ready = threading.Event()
+        self.model_error: Optional[BaseException] = None
+        self.startup_audio = deque(maxlen=STARTUP_AUDIO_SECONDS * SAMPLE_RATE // chunk_size + 1)
+        self.startup_reported = False
+        self.recognizers = RecognizerSet(model, SAMPLE_RATE)
+        if model is None and not audio_source.provides_text:
+            threading.Thread(target=self.load_model, name="model-loader", daemon=True).start()
+        else:
+            self.model_ready.set()
         self.table: Optional[Table] = None
-        self.history = []
-
-        # Инициализация PyAudio
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, frames_per_buffer=8000)
-        self.rec = KaldiRecognizer(self.model, 16000)
+        self.history: Optional[History] = None
+        # Имена предыдущих таблиц и убранные из рабочего пространства таблицы —
+        # для отмены и повтора создания таблицы
+        self.previous_tables = deque(maxlen=HISTORY_MAX_TABLES)
+        self.next_tables: List[WorkspaceEntry] = []
+        self.output_dir = output_dir
+        self.output = output
+        self.journal_dir = journal_dir
+        self.exporter = Exporter()
+        # Фоновые записи, о завершении которых нужно сообщить оператору
+        self.export_notices: Dict[ExportJob, str] = {}
+        self.sync = TableSync(sync_url, sync_dir) if sync_url else None
+        self.workspace = Workspace(
+            workspace_dir,
+            memory_budget,
+            journal_dir=journal_dir,
+            export_dir=output_dir,
+            exporter=self.exporter,
+            sync=self.sync,
+        )
+        self.transcript: List[str] = []
+        self.metrics = CommandMetrics()
+        self.metrics_dir = metrics_dir
+        self.parser = CommandParser()
+        self.command_handlers = {
+            "pause": self.pause,
+            "exit": self.request_exit,
+            "help": lambda parsed: self.print_help(),
+            "statistics": lambda parsed: self.show_statistics(),
+            "show_all": self.show_all,
+            "create_template": self.create_template_command,
+            "create_table": self.create_table_command,
+            "next_row": lambda parsed: self.next_row(),
+            "skip": lambda parsed: self.skip_cell(),
+            "undo": lambda parsed: self.undo_last_action(),
+            "redo": lambda parsed: self.redo_last_action(),
+            "checkpoint": self.set_checkpoint,
+            "rollback": lambda parsed: self.rollback_to_checkpoint(),
+            "insert_row": lambda parsed: self.change_rows("insert_row", parsed.args["row"]),
+            "save": self.save,
+            "edit": lambda parsed: self.start_edit(parsed.args),
+            "back": self.go_back,
+            "delete_row": lambda parsed: self.change_rows("delete_row", parsed.args["row"]),
+            "formula": lambda parsed: self.set_value(" ".join(parsed.tokens)),
+            "aggregate": self.aggregate_column,
+            "sort": self.sort_rows,
+            "filter": self.filter_rows,
+            "find": self.find_value,
+            "open_table": self.open_table,
+            "list_tables": lambda parsed: self.list_tables(),
+            "export": self.export_tables,
+        }
+
+        # Захват звука в отдельном потоке
+        self.capture = audio_source
+        started = time.perf_counter()
+        self.capture.start()
+        self.startup_times["stream_open"] = time.perf_counter() - started
+        # Детектор речи отсеивает тишину до распознавателя
+        self.vad = VoiceActivityDetector(SAMPLE_RATE) if use_vad else None
+        self.speech_chunks = deque()
+        self.rec = None
+        self.listen_early = False
+        self.last_partial = ""
+        self.stable_chunks = 0
+        self.state = STATE_MAIN
+        self.pending_action: Optional[str] = None
+        self.edit_cell: Optional[tuple] = None
+        self.early_dispatch = early_dispatch
         self.last_filled_position = None
         self.logger.info("Voice Table Creator успешно инициализирован")
 
     def __del__(self):
-        """Освобождение ресурсов PyAudio при уничтожении объекта."""
+        """Освобождение ресурсов захвата звука при уничтожении объекта."""
         self.logger.info("Завершение работы Voice Table Creator")
-        self.stream.stop_stream()
-        self.stream.close()
-        self.p.terminate()
-
-    def text_to_number(self, text: str) -> float:
-        """Преобразует текст числа в числовое значение с помощью text_to_num."""
-        text = text.strip().lower()
-        if not text:
-            raise ValueError("Пустой текст для конвертации в число")
-
+        if self.vad:
+            self.logger.info("Статистика детектора речи: %s", self.vad.stats())
+        if getattr(self, "workspace", None):
+            self.exporter.close()
+            self.workspace.close()
+        if getattr(self, "sync", None):
+            self.sync.close()
+        self.capture.close()
+
+    def load_model(self, path: str = MODEL_PATH):
+        """Загружает модель Vosk (выполняется в фоновом потоке)."""
+        started = time.perf_counter()
         try:
-            number = alpha2digit(text, "ru")
-            self.logger.debug(f"Преобразовано '{text}' в число {number}")
-            return float(number)
-        except ValueError as e:
-            self.logger.error(f"Не удалось преобразовать '{text}' в число: {str(e)}")
-            raise ValueError(f"Не удалось преобразовать '{text}' в число")
+            from vosk import Model
+
+            self.model = Model(path)
+            self.recognizers.model = self.model
+            self.startup_times["model_load"] = time.perf_counter() - started
+            self.logger.info("Модель распознавания загружена за %.2f с", self.startup_times['model_load'])
+        except BaseException as e:
+            self.model_error = e
+            self.logger.error("Не удалось загрузить модель '%s': %s", path, e)
+        finally:
+            self.model_ready.set()
+
+    def wait_for_model(self):
+        """Дожидается загрузки модели, складывая звук с микрофона в startup_audio."""
+        if not self.model_ready.is_set():
+            print("Загрузка модели распознавания... Можно говорить, команды будут обработаны после загрузки.", file=self.output)
+            while not self.model_ready.wait(0.05):
+                data = self.capture.read(timeout=0.05)
+                if data:
+                    self.startup_audio.append(data)
+        if self.model_error is not None:
+            raise RuntimeError("Модель распознавания не загружена") from self.model_error
+        if not self.startup_reported:
+            self.startup_reported = True
+            self.report_startup()
+
+    def report_startup(self):
+        """Выводит время этапов запуска."""
+        parts = [f"{STARTUP_STAGES.get(name, name)} {seconds:.2f} с" for name, seconds in self.startup_times.items()]
+        print(f"Готов к работе. Запуск: {', '.join(parts)}", file=self.output)
+        self.logger.info("Время запуска: %s", self.startup_times)
 
     def words_to_number(self, text: str) -> str:
-        """Преобразует текст, содержащий числа, в строку с числовыми значениями."""
-        try:
-            number = self.text_to_number(text)
-            return str(number).replace(".", ",")
-        except ValueError:
-            return text
-
-    def listen_command(self, show_listening: bool = True) -> str:
-        """Слушает голосовую команду и возвращает распознанный текст."""
+        """Преобразует число, произнесённое словами, в строку вида "25,0"; другой текст не меняет."""
+        with self.metrics.stage("convert"):
+            return format_spoken_value(text)
+
+    def cell_value(self, text: str) -> Optional[str]:
+        """Значение для записи в ячейку: формула ("формула ...") или число/текст.
+
+        Возвращает None, если формулу не удалось разобрать.
+        """
+        words = text.lower().split()
+        if not words or words[0] != FORMULA_WORD:
+            return self.words_to_number(text)
+        with self.metrics.stage("convert"):
+            try:
+                return self.table.formulas.compile(words[1:])
+            except FormulaError as e:
+                self.logger.warning("Не удалось разобрать формулу '%s': %s", text, e)
+                print(f"Не удалось разобрать формулу: {e}", file=self.output)
+                return None
+
+    def report_formula(self, row: int, col: int):
+        """Предупреждает, если записанная формула ссылается сама на себя через другие ячейки."""
+        if self.table.formulas.values.get((row, col)) == ERROR_CYCLE:
+            print("Формула образует цикл: ячейки ссылаются друг на друга", file=self.output)
+
+    def listen_command(
+        self, show_listening: bool = True, early_dispatch: bool = False, mode: str = MODE_DICTATION
+    ) -> Optional[str]:
+        """Слушает голосовую команду и возвращает распознанный текст.
+
+        Возвращает None, когда источник звука закончился (конец WAV-файла).
+
+        `mode` выбирает распознаватель: полный словарь для диктовки или
+        грамматику для паузы, команд и редактирования.
+
+        При `early_dispatch` управляющие команды из EARLY_DISPATCH_COMMANDS
+        возвращаются по промежуточному результату, как только гипотеза
+        стабильна, не дожидаясь паузы после фразы.
+        """
+        self.wait_for_model()
         if show_listening:
-            print("\nСлушаю...")
+            print("\nСлушаю...", file=self.output)
+        if self.capture.provides_text:
+            return self.capture.read_text()
+        self.start_listening(mode, early_dispatch)
+        while True:
+            data = self.next_speech_chunk()
+            if not data:
+                return self.finish_listening()
+            text = self.accept_speech(data)
+            if text:
+                return text
+
+    def start_listening(self, mode: str, early_dispatch: bool = False):
+        """Выбирает распознаватель для следующей фразы и сбрасывает его."""
+        self.rec = self.recognizers.get(mode)
         self.rec.Reset()
+        self.listen_early = early_dispatch
+        self.last_partial = ""
+        self.stable_chunks = 0
+
+    def prepare_listening(self):
+        """Готовит распознаватель к следующей фразе с учётом состояния диалога."""
+        if self.state != STATE_PAUSE:
+            print("\nСлушаю...", file=self.output)
+        self.start_listening(self.recognizer_mode, self.early_dispatch and self.state == STATE_MAIN)
+
+    def accept_speech(self, data: bytes) -> Optional[str]:
+        """Передаёт блок речи распознавателю. Возвращает текст, если фраза закончена."""
+        rec = self.rec
+        received = time.perf_counter()
+        started = time.thread_time()
+        accepted = rec.AcceptWaveform(data)
+        if self.vad:
+            self.vad.note_decode(time.thread_time() - started)
+        if accepted:
+            result = json.loads(rec.Result())
+            text = result.get("text", "").strip()
+            if text:
+                self.logger.info("Распознано: '%s'", text)
+                self.metrics.recognized(received)
+                return text
+            self.last_partial = ""
+            self.stable_chunks = 0
+        elif self.listen_early:
+            partial = json.loads(rec.PartialResult()).get("partial", "").strip()
+            if partial and partial == self.last_partial:
+                self.stable_chunks += 1
+            else:
+                self.last_partial = partial
+                self.stable_chunks = 0
+            # Полное совпадение с командой, а не с её началом, и гипотеза не меняется
+            if partial in EARLY_DISPATCH_COMMANDS and self.stable_chunks >= EARLY_DISPATCH_STABLE_CHUNKS:
+                rec.Reset()
+                self.logger.info("Распознано досрочно: '%s'", partial)
+                self.metrics.recognized(received)
+                return partial
+        return None
+
+    def finish_listening(self) -> Optional[str]:
+        """Завершает распознавание в конце потока и возвращает остаток фразы, если он есть."""
+        received = time.perf_counter()
+        text = json.loads(self.rec.FinalResult()).get("text", "").strip()
+        if text:
+            self.logger.info("Распознано: '%s'", text)
+            self.metrics.recognized(received)
+            return text
+        return None
+
+    def process_available_audio(self) -> bool:
+        """Обрабатывает весь уже поступивший звук, не дожидаясь нового.
+
+        Нужен для внешних источников, в которые звук передаётся порциями
+        (см. server.py). Возвращает False после команды выхода или в конце потока.
+        """
         while True:
-            data = self.stream.read(4000, exception_on_overflow=False)
-            if self.rec.AcceptWaveform(data):
-                result = json.loads(self.rec.Result())
-                text = result.get("text", "").strip()
+            data = self.capture.read(timeout=0)
+            if data is None:
+                return True
+            if not data:
+                text = self.finish_listening()
                 if text:
-                    self.logger.info(f"Распознано: '{text}'")
-                    return text
-        return ""
+                    self.process_utterance(text)
+                return False
+            for chunk in self.vad.process(data) if self.vad else [data]:
+                text = self.accept_speech(chunk)
+                if text:
+                    if not self.process_utterance(text):
+                        return False
+                    self.prepare_listening()
+
+    def next_speech_chunk(self) -> bytes:
+        """Возвращает следующий блок звука, прошедший детектор речи.
+
+        Пустые байты означают, что источник звука закончился.
+        """
+        while not self.speech_chunks:
+            # Сначала звук, накопленный во время загрузки модели
+            data = self.startup_audio.popleft() if self.startup_audio else self.capture.read()
+            if not data:
+                return b""
+            if self.vad:
+                self.speech_chunks.extend(self.vad.process(data))
+            else:
+                self.speech_chunks.append(data)
+        return self.speech_chunks.popleft()
 
     def create_from_template(self, template_name: str) -> bool:
         """Создаёт таблицу из шаблона."""
         template = TEMPLATES.get(template_name.lower())
         if not template:
-            self.logger.warning(f"Шаблон '{template_name}' не найден")
-            print(f"Шаблон '{template_name}' не найден. Доступные шаблоны: {', '.join(TEMPLATES.keys())}")
+            self.logger.warning("Шаблон '%s' не найден", template_name)
+            print(f"Шаблон '{template_name}' не найден. Доступные шаблоны: {', '.join(TEMPLATES.keys())}", file=self.output)
             return False
 
-        self.create_table(template["name"], template["headers"])
-        self.logger.info(f"Создана таблица из шаблона: {template_name}")
+        self.create_table(template["name"], template["headers"], storage=template.get("storage"))
+        self.logger.info("Создана таблица из шаблона: %s", template_name)
         return True
 
-    def extract_table_info(self, command: str) -> tuple[str, List[str]]:
-        """Извлекает название таблицы и заголовки столбцов из команды."""
-        words = command.lower().split()
-        try:
-            table_idx = words.index("таблицу") + 1
-            columns_idx = words.index("столбцы") + 1
-            if table_idx < columns_idx and table_idx < len(words):
-                table_name = " ".join(words[table_idx : columns_idx - 1])
-                headers = words[columns_idx:]
-                self.logger.debug(f"Извлечено: таблица '{table_name}', столбцы {headers}")
-                return table_name, headers
-        except ValueError:
-            self.logger.warning(f"Некорректная команда для создания таблицы: {command}")
-        return "", []
-
-    def extract_number(self, command: str, after_word: str) -> Optional[int]:
-        """Извлекает число после указанного слова в команде."""
-        words = command.lower().split()
-        try:
-            idx = words.index(after_word) + 1
-            if idx < len(words):
-                return int(self.text_to_number(words[idx]))
-        except (ValueError, IndexError) as e:
-            self.logger.warning(f"Не удалось извлечь число после '{after_word}' в команде '{command}': {str(e)}")
-        return None
-
-    def create_table(self, name: str, headers: List[str]):
+    def create_table(self, name: str, headers: List[str], storage: Optional[str] = None):
         """Создаёт новую таблицу с указанным именем и заголовками."""
-        prev_table = self.table
-        self.table = Table(name, headers, console_output=False) 
-        self.history.append(("create", prev_table))
-        print(f"\nСоздана таблица '{name}' со следующими столбцами:")
-        print(", ".join(headers))
-        self.table.display()
+        if self.history is not None:
+            self.history.clear_redo()
+        current = self.workspace.current
+        self.previous_tables.append(current.name if current else None)
+        self.next_tables.clear()
+        table = Table(name, headers, console_output=False, storage=storage)
+        self.switch_table(self.workspace.add(table, History(table)))
+        print(f"\nСоздана таблица '{name}' со следующими столбцами:", file=self.output)
+        print(", ".join(headers), file=self.output)
+        self.show_table()
+
+    def switch_table(self, entry: Optional[WorkspaceEntry]):
+        """Делает таблицу рабочего пространства текущей вместе с её историей действий и журналом."""
+        self.workspace.activate(entry)
+        self.table = entry.table if entry else None
+        self.history = entry.history if entry else None
+        self.recognizers.set_headers(self.table.headers if self.table else [])
+
+    @property
+    def journal(self) -> Optional[TableJournal]:
+        current = self.workspace.current
+        return current.journal if current else None
+
+    def restore_from_journal(self):
+        """Восстанавливает несохранённые таблицы и позиции курсора после сбоя.
+
+        Текущей становится таблица, изменённая последней.
+        """
+        restored = self.workspace.restore_journals()
+        if not restored:
+            return
+        self.switch_table(restored[0])
+        if len(restored) > 1:
+            names = ", ".join(f"'{entry.name}'" for entry in restored)
+            print(f"\nВосстановлены несохранённые таблицы: {names}; текущая — '{self.table.name}'", file=self.output)
+        else:
+            print(f"\nВосстановлена несохранённая таблица '{self.table.name}'", file=self.output)
+        self.show_table()
+
+    def open_table(self, parsed: ParsedCommand):
+        """Делает текущей таблицу рабочего пространства или сохранённую ранее в CSV."""
+        name = parsed.args["name"]
+        if not name:
+            self.list_tables()
+            return
+        with self.metrics.stage("load"):
+            entry = self.workspace.open(name)
+        if entry is None:
+            print(f"Таблица '{name}' не найдена", file=self.output)
+            self.list_tables()
+            return
+        if entry is not self.workspace.current:
+            # Отмена создания таблицы возвращает к предыдущей, пока не открыта другая
+            self.previous_tables.clear()
+            self.next_tables.clear()
+            with self.metrics.stage("load"):
+                self.switch_table(entry)
+        print(f"\nОткрыта таблица '{entry.name}'", file=self.output)
+        self.show_table()
+
+    def list_tables(self):
+        """Выводит таблицы рабочего пространства."""
+        entries = self.workspace.entries.values()
+        if not entries:
+            print("В рабочем пространстве нет таблиц", file=self.output)
+            return
+        print("\nТаблицы:", file=self.output)
+        for entry in entries:
+            if entry is self.workspace.current:
+                state = "текущая"
+            elif entry.loaded:
+                state = "в памяти" + (", не сохранена" if entry.dirty else "")
+            else:
+                state = "на диске"
+            print(f"- {entry.name} ({state})", file=self.output)
 
     def set_value(self, value: str) -> bool:
         """Устанавливает значение в текущую ячейку таблицы."""
         if not self.table:
             self.logger.warning("Попытка записи значения без созданной таблицы")
-            print("Сначала создайте таблицу")
+            print("Сначала создайте таблицу", file=self.output)
             return False
 
         if self.table.current_col >= len(self.table.headers):
             self.logger.info("Достигнут конец строки, автоматический переход на следующую")
-            print("Достигнут конец строки. Автоматически перехожу на следующую строку")
+            print("Достигнут конец строки. Автоматически перехожу на следующую строку", file=self.output)
             self.next_row()
             return False
 
-        value_converted = self.words_to_number(value)
-        prev_row = self.table.current_row
-        prev_col = self.table.current_col
-        prev_value = self.table.data[prev_row][prev_col]
-
-        if self.table.set_current_value(value_converted, history_callback=lambda action: self.history.append(action)):
-            self.history.append(("set", prev_row, prev_col, prev_value))
-            self.table.display()
+        value_converted = self.cell_value(value)
+        if value_converted is None:
+            return False
+        row, col = self.table.current_row, self.table.current_col
+        with self.metrics.stage("table"):
+            changed = self.table.set_current_value(value_converted)
+        if changed:
+            self.report_formula(row, col)
+            self.show_table()
             return True
         return False
 
@@ -148,240 +503,503 @@ class VoiceTableCreator:
         """Переходит на следующую строку таблицы."""
         if not self.table:
             self.logger.warning("Попытка перехода на следующую строку без созданной таблицы")
-            print("Сначала создайте таблицу")
+            print("Сначала создайте таблицу", file=self.output)
             return
 
-        prev_row = self.table.current_row
-        prev_col = self.table.current_col
-        if self.table.next_row():
-            self.history.append(("next_row", prev_row, prev_col))
-            self.table.display()
+        with self.metrics.stage("table"):
+            self.table.next_row()
+        self.show_table()
 
     def skip_cell(self):
         """Пропускает текущую ячейку, устанавливая значение '_'."""
         if not self.table:
             self.logger.warning("Попытка пропуска ячейки без созданной таблицы")
-            print("Сначала создайте таблицу")
+            print("Сначала создайте таблицу", file=self.output)
             return
 
         if self.table.current_col < len(self.table.headers):
             self.set_value("_")
             self.logger.info(
-                f"Пропущена ячейка [строка {self.table.current_row + 1}, {self.table.headers[self.table.current_col]}]"
+                "Пропущена ячейка [строка %s, %s]", self.table.current_row + 1, self.table.headers[self.table.current_col]
             )
 
     def undo_last_action(self):
-        """Отменяет последнее действие."""
-        if not self.history:
+        """Отменяет последнее действие; после первого действия новой таблицы — её создание."""
+        if self.history is not None and len(self.history):
+            with self.metrics.stage("table"):
+                step = self.history.undo()
+            self.logger.info("Отмена действия: %s", step.label)
+        elif self.previous_tables:
+            created = self.workspace.current
+            self.next_tables.append(created)
+            self.workspace.discard(created, drop=True)
+            name = self.previous_tables.pop()
+            self.switch_table(self.workspace.open(name) if name else None)
+            self.logger.info("Отмена создания таблицы")
+            if not self.table:
+                print("Создание таблицы отменено", file=self.output)
+        else:
             self.logger.info("Попытка отмены действия при пустой истории")
-            print("Нечего отменять")
+            print("Нечего отменять", file=self.output)
             return
-
-        action = self.history.pop()
-        self.logger.info(f"Отмена действия: {action[0]}")
-
-        if action[0] == "create":
-            self.table = action[1]
-        elif action[0] == "set":
-            row, col, prev_value = action[1], action[2], action[3]
-            self.table.data[row][col] = prev_value
-            self.table.current_row = row
-            self.table.current_col = col
-            self.logger.info(
-                f"Восстановлено значение '{prev_value}' в ячейку [строка {row + 1}, {self.table.headers[col]}]"
-            )
-        elif action[0] == "next_row":
-            prev_row, prev_col = action[1], action[2]
-            self.table.current_row = prev_row
-            self.table.current_col = prev_col
-            # Удаляем последнюю пустую строку, если она существует и не нужна
-            if len(self.table.data) > prev_row + 1 and all(val == "_" for val in self.table.data[-1]):
-                self.table.data.pop()
-            self.logger.info(f"Возврат к строке {prev_row + 1}")
-        elif action[0] == "delete_row":
-            row, row_data = action[1], action[2]
-            self.table.data.insert(row, row_data)
-            if row <= self.table.current_row:
-                self.table.current_row += 1
-            self.logger.info(f"Восстановлена удаленная строка {row + 1}")
-
-        elif action[0] == "insert_row":
-            row = action[1]
-            self.table.data.pop(row)
-            if row < self.table.current_row:
-                self.table.current_row -= 1
-            self.logger.info(f"Удалена вставленная строка {row + 1}")
-
         if self.table:
-
-            if (
-                self.table.current_col == 0
-                and len(self.table.data) > self.table.current_row + 1
-                and all(val == "_" for val in self.table.data[self.table.current_row])
-            ):
-                self.table.data.pop()
-                self.table.current_row -= 1
-            self.table.display()
+            self.show_table()
+
+    def redo_last_action(self):
+        """Повторяет последнее отменённое действие."""
+        if self.history is not None and self.history.can_redo:
+            with self.metrics.stage("table"):
+                step = self.history.redo()
+            self.logger.info("Повтор действия: %s", step.label)
+        elif self.next_tables:
+            current = self.workspace.current
+            self.previous_tables.append(current.name if current else None)
+            entry = self.next_tables.pop()
+            self.workspace.restore(entry)
+            self.switch_table(entry)
+            self.logger.info("Повтор создания таблицы")
+        else:
+            print("Нечего повторять", file=self.output)
+            return
+        self.show_table()
+
+    def rollback_to_checkpoint(self):
+        """Отменяет все действия до предыдущей контрольной точки."""
+        with self.metrics.stage("table"):
+            count = self.history.rollback() if self.history is not None else 0
+        if not count:
+            print("Нечего отменять", file=self.output)
+            return
+        self.logger.info("Откат к контрольной точке: отменено %s действий", count)
+        print(f"Отменено действий: {count}", file=self.output)
+        self.show_table()
 
     def print_help(self):
         """Выводит список доступных команд."""
-        print("\nДоступные команды:")
-        print("- создай таблицу [название] столбцы [названия столбцов]")
-        print("- создай таблицу шаблон [номер] (доступные шаблоны: 1, 2, 3)")
-        print("- следующая строка")
-        print("- отмена")
-        print("- пропусти (пропуск текущей ячейки)")
-        print("- сохрани")
-        print("- выход")
-        print("- редактировать строка [номер] столбец [название]")
-        print("- удалить строка [номер]")
-        print("- вставить строка [номер]")
-        print("- вернуться")
-        print("- помощь (показать этот список)")
-        print("\nПросто произносите значения для заполнения текущей ячейки")
+        print("\nДоступные команды:", file=self.output)
+        print("- создай таблицу [название] столбцы [названия столбцов]", file=self.output)
+        print("- создай таблицу шаблон [номер] (доступные шаблоны: 1, 2, 3)", file=self.output)
+        print("- следующая строка", file=self.output)
+        print("- отмена", file=self.output)
+        print("- повтори (повтор отменённого действия)", file=self.output)
+        print("- контрольная точка", file=self.output)
+        print("- откати (отмена всех действий до контрольной точки)", file=self.output)
+        print("- пропусти (пропуск текущей ячейки)", file=self.output)
+        print("- сохрани", file=self.output)
+        print("- выход", file=self.output)
+        print("- редактировать строка [номер] столбец [название]", file=self.output)
+        print("- удалить строка [номер]", file=self.output)
+        print("- вставить строка [номер]", file=self.output)
+        print("- вернуться", file=self.output)
+        print("- покажи всю таблицу", file=self.output)
+        print("- открой таблицу [название] / список таблиц", file=self.output)
+        print("- экспортируй [все таблицы] [в json / в двоичном формате] [со сжатием]", file=self.output)
+        print("- формула [выражение] (например: формула сумма столбца зарплата)", file=self.output)
+        print("- сумма / среднее / максимум / минимум [столбец]", file=self.output)
+        print("- сортируй по [столбец] [по убыванию]", file=self.output)
+        print("- покажи где [столбец] [больше / меньше] [значение]", file=self.output)
+        print("- найди [столбец] [значение] / перейди к [значение]", file=self.output)
+        print("- статистика (время обработки команд)", file=self.output)
+        print("- помощь (показать этот список)", file=self.output)
+        print("\nПросто произносите значения для заполнения текущей ячейки", file=self.output)
+
+    @property
+    def recognizer_mode(self) -> str:
+        """Режим распознавания для текущего состояния диалога."""
+        return STATE_MODES[self.state]
 
     def run(self):
         """Запускает основной цикл обработки голосовых команд."""
         self.logger.info("Запуск Voice Table Creator")
-        print("Голосовой создатель таблиц запущен!")
+        print("Голосовой создатель таблиц запущен!", file=self.output)
         self.print_help()
+        self.restore_from_journal()
 
         while True:
-            command = self.listen_command().lower()
-            if not command:
-                continue
-
-            print(f"Распознано: {command}")
-
-            if "пауза" in command:
-                print("Пауза. Для продолжения скажите 'продолжить'.")
-                self.logger.info("Вход в режим паузы")
-                while True:
-                    pause_cmd = self.listen_command(show_listening=False).lower()
-                    if "продолжить" in pause_cmd or "продолжай" in pause_cmd:
-                        print("Продолжаю заполнение таблицы.")
-                        self.logger.info("Выход из режима паузы")
-                        if self.table:
-                            self.table.display()
-                        break
-
-            elif "выход" in command:
-                self.logger.info("Получена команда выхода")
+            command = self.listen_command(
+                show_listening=self.state != STATE_PAUSE,
+                early_dispatch=self.early_dispatch and self.state == STATE_MAIN,
+                mode=self.recognizer_mode,
+            )
+            if command is None:
+                self.logger.info("Источник звука закончился")
                 break
+            if not self.process_utterance(command):
+                break
+        self.finish_exports()
+        self.workspace.close()
+        if self.sync:
+            self.sync.close()
+        self.dump_metrics()
+
+    def process_utterance(self, command: str) -> bool:
+        """Обрабатывает распознанную фразу. Возвращает False, если получена команда выхода."""
+        started = self.metrics.start()
+        command = command.lower()
+        if not command:
+            return True
+        self.report_exports()
+        with self.metrics.stage("dispatch"):
+            parsed = self.parser.parse(command)
+            handler = self.command_handlers.get(parsed.name)
+        kind = parsed.label if self.state == STATE_MAIN else self.state
+        self.transcript.append(command)
+        # Всё, что изменит команда, отменяется одним шагом
+        history = self.history
+        if history is not None:
+            history.begin(command)
+        running = self.handle_command(command, parsed, handler)
+        if history is not None:
+            history.commit()
+        if self.journal:
+            self.journal.record_cursor()
+        self.metrics.finish(kind, started)
+        return running
+
+    def show_table(self, full: bool = False):
+        """Выводит текущую таблицу, учитывая время вывода в статистике."""
+        with self.metrics.stage("display"):
+            self.table.display(file=self.output, full=full)
+
+    def show_statistics(self):
+        """Выводит время обработки команд и, если включена, состояние отправки на сервер."""
+        self.metrics.report(file=self.output)
+        if self.sync:
+            print(self.sync.status(), file=self.output)
+
+    def dump_metrics(self):
+        """Записывает статистику времени команд в `metrics_dir`."""
+        if self.metrics_dir:
+            self.metrics.dump(self.metrics_dir)
+
+    def handle_command(
+        self, command: str, parsed: Optional[ParsedCommand] = None, handler: Optional[Callable] = None
+    ) -> bool:
+        """Обрабатывает распознанную фразу с учётом состояния диалога.
+
+        `parsed` и `handler` передаются, если фраза уже разобрана (этап
+        "разбор" в статистике). Возвращает False, если получена команда выхода.
+        """
+        if parsed is None:
+            parsed = self.parser.parse(command)
+        if self.state == STATE_PAUSE:
+            self.resume_from_pause(command)
+            return True
+        if self.state == STATE_EDIT_VALUE:
+            self.apply_edit_value(command)
+            return True
+        if self.state == STATE_EDIT_TARGET:
+            self.state = STATE_MAIN
+            self.start_edit(edit_target(parsed.tokens), ask_target=False)
+            return True
+        if self.state == STATE_ROW_NUMBER:
+            self.state = STATE_MAIN
+            self.change_rows(self.pending_action, row_number(parsed.tokens), ask_number=False)
+            return True
+
+        print(f"Распознано: {command}", file=self.output)
+        if handler is None:
+            handler = self.command_handlers.get(parsed.name)
+        if handler is None:
+            self.set_value(command)
+            return True
+        return handler(parsed) is not False
+
+    def pause(self, parsed: ParsedCommand):
+        """Переходит в режим паузы до слова "продолжить"."""
+        print("Пауза. Для продолжения скажите 'продолжить'.", file=self.output)
+        self.logger.info("Вход в режим паузы")
+        self.state = STATE_PAUSE
 
-            elif "помощь" in command:
-                self.print_help()
-
-            elif "создай таблицу шаблон" in command or "создать таблицу шаблон" in command:
-                template_num = self.extract_number(command, "шаблон")
-                if template_num is not None and 1 <= template_num <= 3:
-                    self.create_from_template(f"шаблон {template_num}")
-                else:
-                    print("Неверный номер шаблона. Доступные шаблоны: 1, 2, 3")
-
-            elif "создай таблицу" in command or "создать таблицу" in command:
-                name, headers = self.extract_table_info(command)
-                if name and headers:
-                    self.create_table(name, headers)
-                else:
-                    print("Не удалось распознать название таблицы или столбцы.")
-                    print("Пример команды: создай таблицу турнир столбцы фамилия имя команда балл")
-                    print("Или используйте шаблон: создай таблицу шаблон 1")
-
-            elif "следующая строка" in command:
-                self.next_row()
-
-            elif "пропусти" in command or "пропуск" in command:
-                self.skip_cell()
-
-            elif "отмена" in command:
-                self.undo_last_action()
-
-            elif "вставь строка" in command or "вставить строка" in command:
-                row_num = self.extract_number(command, "строка")
-                if row_num is None:
-                    print("Не удалось распознать номер строки")
-                    continue
-
-                if self.table and 1 <= row_num <= len(self.table.data) + 1:
-                    if self.table.insert_row(row_num - 1):
-                        self.history.append(("insert_row", row_num - 1))
-                        print(f"Вставлена новая строка перед строкой {row_num}")
-                        self.table.display()
-                else:
-                    print(f"Неверный номер строки (должен быть от 1 до {len(self.table.data) + 1})")
-
-            elif "сохрани" in command:
-                if self.table:
-                    filename = f"{self.table.name}.csv"
-                    self.table.save_to_csv()
-                    print(f"Таблица сохранена в файл {filename}")
-                    self.table = None
-                    print("\nМожете создать новую таблицу")
-                else:
-                    print("Нет таблицы для сохранения")
-
-            elif "редактировать" in command:
-                row_num = self.extract_number(command, "строка")
-                if row_num is None:
-                    print("Не удалось распознать номер строки")
-                    continue
-
-                words = command.split()
-                try:
-                    col_idx = words.index("столбец") + 1
-                    if col_idx < len(words) and self.table:
-                        col_name = words[col_idx]
-                        try:
-                            col = self.table.headers.index(col_name)
-                            if self.table.set_position(row_num - 1, col):
-                                print(f"\nРедактирование ячейки: строка {row_num}, {col_name}")
-                                print("Произнесите новое значение")
-                                self.table.display()
-                                # Ожидаем новое значение
-                                new_value = self.listen_command()
-                                if new_value:
-                                    prev_value = self.table.data[row_num - 1][col]
-                                    self.table.set_current_value(
-                                        self.words_to_number(new_value),
-                                        history_callback=lambda action: self.history.append(action),
-                                    )
-                                    self.history.append(("set", row_num - 1, col, prev_value))
-                                    self.table.display()
-                            else:
-                                print(f"Невозможно редактировать: неверная позиция")
-                        except ValueError:
-                            print(f"Столбец '{col_name}' не найден")
-                    else:
-                        print("Неверный формат команды редактирования")
-                except ValueError:
-                    print("Неверный формат команды редактирования")
-
-            elif "вернуться" in command or "назад" in command or "вернись" in command:
-                if self.table and self.table.previous_position:
-                    row, col = self.table.previous_position
-                    if self.table.set_position(row, col):
-                        print(f"↩ Возврат к позиции: строка {row+1}, {self.table.headers[col]}")
-                        self.table.display()
-                    else:
-                        print("Ошибка: неверная позиция для возврата")
-                else:
-                    print("Нет сохранённой позиции для возврата")
-
-            elif "удалить строка" in command:
-                row_num = self.extract_number(command, "строка")
-                if row_num is None:
-                    print("Не удалось распознать номер строки")
-                    continue
-
-                if self.table and 1 <= row_num <= len(self.table.data):
-                    row_data = self.table.data[row_num - 1].copy()
-                    if self.table.delete_row(row_num - 1):
-                        self.history.append(("delete_row", row_num - 1, row_data))
-                        print(f"Строка {row_num} удалена")
-                        self.table.display()
-                else:
-                    print(f"Неверный номер строки или таблица пуста")
+    def request_exit(self, parsed: ParsedCommand) -> bool:
+        """Завершает цикл обработки команд."""
+        self.logger.info("Получена команда выхода")
+        return False
+
+    def show_all(self, parsed: ParsedCommand):
+        """Выводит таблицу целиком."""
+        if self.table:
+            self.show_table(full=True)
+        else:
+            print("Нет открытой таблицы", file=self.output)
 
+    def query_column(self, words) -> tuple:
+        """Столбец, названный в начале `words`, и оставшиеся слова; сообщает, если столбца нет."""
+        if not self.table:
+            print("Сначала создайте таблицу", file=self.output)
+            return None, ()
+        col, end = match_column(words, 0, self.table.column_index)
+        if col is None:
+            print(f"Столбец '{' '.join(words)}' не найден", file=self.output)
+        return col, words[end:]
+
+    def aggregate_column(self, parsed: ParsedCommand):
+        """Выводит сумму, среднее, максимум или минимум чисел столбца."""
+        words = parsed.args["words"]
+        col, end = match_column(words, 0, self.table.column_index) if self.table else (None, 0)
+        if col is None or end < len(words):
+            # Без названия столбца это обычное значение ячейки (например, "среднее")
+            self.set_value(" ".join(parsed.tokens))
+            return
+        function = parsed.args["function"]
+        header = self.table.headers[col]
+        with self.metrics.stage("table"):
+            result = self.table.queries.aggregate(col, function)
+            count = self.table.queries.count(col)
+        if not count:
+            print(f"В столбце '{header}' нет чисел", file=self.output)
+        else:
+            print(f"{function.capitalize()} '{header}': {format_number(round(result, 9))} (чисел: {count})", file=self.output)
+
+    def sort_rows(self, parsed: ParsedCommand):
+        """Выводит строки таблицы, упорядоченные по столбцу. Сама таблица не меняется."""
+        col, rest = self.query_column(parsed.args["words"])
+        if col is None:
+            return
+        with self.metrics.stage("table"):
+            view = self.table.queries.sort(col, parsed.args["descending"])
+        with self.metrics.stage("display"):
+            self.table.display(file=self.output, view=view)
+
+    def filter_rows(self, parsed: ParsedCommand):
+        """Выводит строки, где значение столбца равно названному (или больше, меньше)."""
+        col, rest = self.query_column(parsed.args["words"])
+        if col is None:
+            return
+        comparison = "равно"
+        if rest and rest[0] in COMPARISONS:
+            comparison, rest = rest[0], rest[1:]
+        if not rest:
+            print("Назовите значение: покажи где [столбец] [значение]", file=self.output)
+            return
+        value = self.words_to_number(nominative_number(rest))
+        if cell_number(value) is None:
+            # Не число — значит, и слова не числительные: сравнивается исходный текст
+            value = " ".join(rest)
+        with self.metrics.stage("table"):
+            view = self.table.queries.filter(col, value, comparison)
+        with self.metrics.stage("display"):
+            self.table.display(file=self.output, view=view)
+
+    def find_value(self, parsed: ParsedCommand):
+        """Переходит к ячейке с названным значением ("найди петров", "перейди к товару молоко").
+
+        Можно назвать столбец: "найди фамилия петров". Повторный поиск того же
+        значения переходит к следующей подходящей строке.
+        """
+        if not self.table:
+            print("Сначала создайте таблицу", file=self.output)
+            return
+        words = parsed.args["words"]
+        columns = None
+        col, end = match_column(words, 0, self.table.column_index)
+        if col is not None and end < len(words):
+            columns, words = [col], words[end:]
+        if not words:
+            print("Назовите значение: найди [значение]", file=self.output)
+            return
+        text = " ".join(words)
+        number = self.words_to_number(text)
+        with self.metrics.stage("table"):
+            matches = self.table.indexes.find((number,), columns) if number != text else []
+            matches = matches or self.table.indexes.find(words, columns)
+            found = self.table.indexes.locate(matches, self.table.current_row)
+        if found is None:
+            print(f"Значение '{text}' не найдено", file=self.output)
+            return
+        row, col, value, total = found
+        self.table.set_position(row, col)
+        print(f"Найдено '{value}': строка {row + 1}, {self.table.headers[col]} (строк с совпадением: {total})", file=self.output)
+        self.show_table()
+
+    def create_template_command(self, parsed: ParsedCommand):
+        """Создаёт таблицу из шаблона с номером из команды."""
+        template_num = parsed.args["template"]
+        if template_num is not None and 1 <= template_num <= 3:
+            self.create_from_template(f"шаблон {template_num}")
+        else:
+            print("Неверный номер шаблона. Доступные шаблоны: 1, 2, 3", file=self.output)
+
+    def create_table_command(self, parsed: ParsedCommand):
+        """Создаёт таблицу с названием и столбцами из команды."""
+        name, headers = parsed.args["name"], parsed.args["headers"]
+        if name and headers:
+            self.create_table(name, headers)
+        else:
+            self.logger.warning("Некорректная команда для создания таблицы: %s", " ".join(parsed.tokens))
+            print("Не удалось распознать название таблицы или столбцы.", file=self.output)
+            print("Пример команды: создай таблицу турнир столбцы фамилия имя команда балл", file=self.output)
+            print("Или используйте шаблон: создай таблицу шаблон 1", file=self.output)
+
+    def set_checkpoint(self, parsed: ParsedCommand):
+        """Ставит контрольную точку в истории текущей таблицы."""
+        if self.history is not None and self.history.checkpoint():
+            print("Контрольная точка поставлена", file=self.output)
+        else:
+            print("Нет изменений для контрольной точки", file=self.output)
+
+    def save(self, parsed: ParsedCommand):
+        """Сохраняет таблицу в CSV и закрывает её; таблица остаётся в рабочем пространстве."""
+        if not self.table:
+            print("Нет таблицы для сохранения", file=self.output)
+            return
+        filename = os.path.join(self.output_dir, f"{self.table.name}.csv")
+        entry = self.workspace.current
+        # Здесь снимается только снимок таблицы, файлы пишутся в фоне
+        with self.metrics.stage("save"):
+            job = self.workspace.flush(entry, save_path=filename)
+        self.export_notices[job] = f"Таблица сохранена в файл {filename}"
+        print(f"Таблица сохраняется в файл {filename}", file=self.output)
+        if self.workspace.directory:
+            print(f"Вернуться к ней: открой таблицу {entry.name.lower()}", file=self.output)
+        else:
+            # Без хранилища рабочего пространства сохранённая таблица не держится в памяти
+            self.history.close()
+            self.workspace.discard(entry)
+        self.switch_table(None)
+        self.previous_tables.clear()
+        self.next_tables.clear()
+        print("\nМожете создать новую таблицу", file=self.output)
+
+    def export_tables(self, parsed: ParsedCommand):
+        """Выгружает текущую или все таблицы рабочего пространства в папку EXPORT_DIR."""
+        if parsed.args["all"]:
+            entries = list(self.workspace.entries.values())
+        else:
+            entries = [self.workspace.current] if self.workspace.current else []
+        if not entries:
+            print("Нет таблиц для выгрузки", file=self.output)
+            return
+        format = parsed.args["format"] or EXPORT_FORMAT
+        compression = parsed.args["compression"] or EXPORT_COMPRESSION
+        directory = os.path.join(self.output_dir, EXPORT_DIR)
+        with self.metrics.stage("save"):
+            job = self.workspace.export(entries, directory, format, compression)
+        self.export_notices[job] = f"Выгружено таблиц: {len(entries)}, папка {directory}"
+        print(f"Выгрузка таблиц ({len(entries)}) в папку {directory} начата", file=self.output)
+
+    def report_exports(self):
+        """Сообщает о завершённых фоновых записях и выгружает из памяти записанные таблицы."""
+        jobs = self.exporter.completed()
+        for job in jobs:
+            notice = self.export_notices.pop(job, None)
+            if job.error is not None:
+                print(f"Ошибка записи ({job.label}): {job.error}", file=self.output)
+            elif notice:
+                print(notice, file=self.output)
+        if jobs:
+            self.workspace.enforce_budget()
+
+    def finish_exports(self):
+        """Дожидается фоновых записей (при завершении работы)."""
+        self.exporter.close()
+        self.report_exports()
+
+    def go_back(self, parsed: ParsedCommand):
+        """Возвращает курсор на позицию до последнего перехода."""
+        if self.table and self.table.previous_position:
+            row, col = self.table.previous_position
+            if self.table.set_position(row, col):
+                print(f"↩ Возврат к позиции: строка {row+1}, {self.table.headers[col]}", file=self.output)
+                self.show_table()
+            else:
+                print("Ошибка: неверная позиция для возврата", file=self.output)
+        else:
+            print("Нет сохранённой позиции для возврата", file=self.output)
+
+    def resume_from_pause(self, command: str):
+        """Выходит из паузы, если произнесено слово продолжения."""
+        if "продолжить" in command or "продолжай" in command:
+            print("Продолжаю заполнение таблицы.", file=self.output)
+            self.logger.info("Выход из режима паузы")
+            self.state = STATE_MAIN
+            if self.table:
+                self.show_table()
+
+    def change_rows(self, action: str, row_num: Optional[int], ask_number: bool = True):
+        """Вставляет или удаляет строку с указанным номером.
+
+        Если номер не распознан, переспрашивает его в режиме команд.
+        """
+        if row_num is None:
+            print("Не удалось распознать номер строки", file=self.output)
+            if ask_number and self.table:
+                print("Назовите номер строки", file=self.output)
+                self.pending_action = action
+                self.state = STATE_ROW_NUMBER
+            return
+
+        if action == "insert_row":
+            if self.table and 1 <= row_num <= len(self.table.data) + 1:
+                with self.metrics.stage("table"):
+                    inserted = self.table.insert_row(row_num - 1)
+                if inserted:
+                    print(f"Вставлена новая строка перед строкой {row_num}", file=self.output)
+                    self.show_table()
+            elif self.table:
+                print(f"Неверный номер строки (должен быть от 1 до {len(self.table.data) + 1})", file=self.output)
             else:
-                self.set_value(command)
+                print("Сначала создайте таблицу", file=self.output)
+        elif action == "delete_row":
+            if self.table and 1 <= row_num <= len(self.table.data):
+                with self.metrics.stage("table"):
+                    deleted = self.table.delete_row(row_num - 1)
+                if deleted:
+                    print(f"Строка {row_num} удалена", file=self.output)
+                    self.show_table()
+            else:
+                print(f"Неверный номер строки или таблица пуста", file=self.output)
+
+    def start_edit(self, target: Dict, ask_target: bool = True):
+        """Переходит к ячейке из команды "редактировать строка N столбец X".
+
+        `target` — строка и столбец, разобранные command_parser.edit_target.
+
+        Если строка или столбец не распознаны, переспрашивает их с грамматикой,
+        построенной по заголовкам текущей таблицы.
+        """
+        if not self.table:
+            print("Сначала создайте таблицу", file=self.output)
+            return
+
+        row_num, col_name = target["row"], target["column"]
+
+        if row_num is None or col_name is None:
+            if row_num is None:
+                print("Не удалось распознать номер строки", file=self.output)
+            else:
+                print("Неверный формат команды редактирования", file=self.output)
+            if ask_target:
+                print("Назовите строку и столбец, например: строка два столбец имя", file=self.output)
+                self.state = STATE_EDIT_TARGET
+            return
+
+        col = self.table.column_index.get(col_name)
+        if col is None:
+            print(f"Столбец '{col_name}' не найден", file=self.output)
+            return
+
+        if self.table.set_position(row_num - 1, col):
+            print(f"\nРедактирование ячейки: строка {row_num}, {col_name}", file=self.output)
+            print("Произнесите новое значение", file=self.output)
+            self.show_table()
+            self.edit_cell = (row_num - 1, col)
+            self.state = STATE_EDIT_VALUE
+        else:
+            print(f"Невозможно редактировать: неверная позиция", file=self.output)
+
+    def apply_edit_value(self, new_value: str):
+        """Записывает значение в ячейку, выбранную командой редактирования."""
+        self.state = STATE_MAIN
+        row, col = self.edit_cell
+        self.edit_cell = None
+        value = self.cell_value(new_value)
+        if value is None:
+            # Ячейка остаётся выбранной: можно произнести формулу ещё раз
+            self.state = STATE_EDIT_VALUE
+            self.edit_cell = (row, col)
+            return
+        with self.metrics.stage("table"):
+            self.table.set_current_value(value)
+        self.report_formula(row, col)
+        self.show_table()
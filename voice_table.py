@@ -1,5 +1,11 @@
+import time
+
+_import_started = time.perf_counter()
 from voice_creator import VoiceTableCreator
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     creator = VoiceTableCreator()
+    creator.startup_times["import"] = IMPORT_SECONDS
     creator.run()
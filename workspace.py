@@ -0,0 +1,475 @@
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from export import ExportJob, Exporter, TableSnapshot, export_path, export_task
+from history import History
+from journal import TableJournal
+from table import Table, TableChange
+from constants import WORKSPACE_DIR, WORKSPACE_MEMORY_BUDGET
+
+STORE_SUFFIX = ".csv"
+META_SUFFIX = ".json"
+SIZE_SAMPLE_ROWS = 100
+
+
+def table_key(name: str) -> str:
+    """Ключ таблицы в рабочем пространстве: имя без учёта регистра, "ё" и лишних пробелов."""
+    return " ".join(name.lower().replace("ё", "е").split())
+
+
+def estimate_memory(table: Table) -> int:
+    """Приблизительный объём таблицы в памяти.
+
+    Хранение по столбцам считается точно, список списков — по выборке строк,
+    чтобы оценка не требовала прохода по всей большой таблице.
+    """
+    data = table.data
+    if hasattr(data, "columns") or len(data) <= SIZE_SAMPLE_ROWS:
+        return data.memory_usage()
+    sample = data[:: len(data) // SIZE_SAMPLE_ROWS]
+    row_bytes = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample)
+    return sys.getsizeof(data) + row_bytes * len(data) // len(sample)
+
+
+def write_atomic(path: str, write: Callable):
+    """Пишет файл через временный, чтобы при сбое на диске оставалась прежняя версия."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_table(store_path: str, meta_path: str) -> Table:
+    """Читает таблицу из хранилища потоком строк, вместе с позицией курсора."""
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(store_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        table = Table(meta["name"], meta["headers"], storage=meta.get("storage"), rows=reader)
+    row, col = meta.get("cursor", (0, 0))
+    table.current_row = min(row, len(table.data) - 1)
+    table.current_col = min(col, len(table.headers) - 1)
+    return table
+
+
+class StoredTable:
+    """Выгруженная из памяти таблица как источник для выгрузки в файл.
+
+    Строки читаются из хранилища только при записи, то есть в потоке выгрузки.
+    """
+
+    def __init__(self, store_path: str, meta_path: str):
+        self.store_path = store_path
+        self.meta_path = meta_path
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.name = meta["name"]
+        self.headers = meta["headers"]
+
+    def rows(self, display: bool = True) -> Iterator[List[str]]:
+        table = read_table(self.store_path, self.meta_path)
+        if display:
+            return table.display_rows(table.saved_row_count())
+        return table.data.rows()
+
+
+class WorkspaceEntry:
+    """Таблица рабочего пространства: загруженная в память или только на диске."""
+
+    __slots__ = ("name", "table", "history", "journal", "cursor", "last_used", "size", "dirty", "listener", "pending")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.table: Optional[Table] = None
+        self.history: Optional[History] = None
+        self.journal: Optional[TableJournal] = None
+        self.cursor = (0, 0)
+        self.last_used = 0
+        self.size = 0
+        # Есть изменения, которых нет в хранилище рабочего пространства
+        self.dirty = False
+        self.listener = None
+        # Фоновая запись таблицы (ExportJob), которая ещё не учтена
+        self.pending: Optional[ExportJob] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.table is not None
+
+
+class Workspace:
+    """Несколько именованных таблиц, из которых в памяти только недавно открытые.
+
+    У каждой таблицы своя история действий и своя позиция курсора. Таблицы
+    хранятся в `directory`: исходные значения (с формулами) в CSV и описание
+    (заголовки, вид хранения, курсор) в JSON рядом. Открываемая таблица
+    читается из CSV потоком, строка за строкой. Когда оценка занятой
+    таблицами памяти превышает `memory_budget`, давно не открывавшиеся
+    таблицы записываются на диск и выгружаются, начиная с самой старой.
+    История действий выгруженной таблицы остаётся в памяти (не больше
+    `HISTORY_MAX_BYTES` байт значений) и снова привязывается к таблице при
+    загрузке, поэтому отмена работает и после выгрузки. Изменения таблиц, ещё не
+    записанных в хранилище, пишутся в журнал в `journal_dir`: у текущей
+    таблицы журнал открыт, у остальных приостановлен и ждёт на диске.
+
+    Запись на диск идёт через `exporter` в фоновом потоке: в основном потоке
+    снимается только снимок таблицы (TableSnapshot). Журнал удаляется после
+    того, как запись закончилась; выгружается из памяти тоже только
+    записанная таблица. Без `exporter` файлы пишутся сразу.
+
+    Если задан `sync` (TableSync из sync.py), новые таблицы, их изменения
+    и сохранения командой "сохрани" отправляются на сервер.
+
+    Без `directory` таблицы не выгружаются и живут только в памяти.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = WORKSPACE_DIR,
+        memory_budget: int = WORKSPACE_MEMORY_BUDGET,
+        journal_dir: Optional[str] = None,
+        export_dir: str = ".",
+        exporter: Optional[Exporter] = None,
+        sync=None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.journal_dir = journal_dir
+        self.export_dir = export_dir
+        self.exporter = exporter
+        self.sync = sync
+        self.entries: Dict[str, WorkspaceEntry] = {}
+        self.current: Optional[WorkspaceEntry] = None
+        self.clock = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.discover()
+
+    def discover(self):
+        """Находит таблицы, записанные в хранилище при прошлых запусках (без загрузки)."""
+        for path in sorted(glob.glob(os.path.join(self.directory, "*" + META_SUFFIX))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                self.logger.warning("Не удалось прочитать описание таблицы %s", path)
+                continue
+            entry = WorkspaceEntry(meta["name"])
+            entry.cursor = tuple(meta.get("cursor", (0, 0)))
+            self.entries[table_key(entry.name)] = entry
+        if self.entries:
+            self.logger.info("В рабочем пространстве %s таблиц: %s", len(self.entries), ", ".join(self.names()))
+
+    def names(self) -> List[str]:
+        return [entry.name for entry in self.entries.values()]
+
+    def get(self, name: str) -> Optional[WorkspaceEntry]:
+        return self.entries.get(table_key(name))
+
+    def store_path(self, name: str) -> str:
+        return os.path.join(self.directory, name.replace(os.sep, "_") + STORE_SUFFIX)
+
+    def meta_path(self, name: str) -> str:
+        return os.path.join(self.directory, name.replace(os.sep, "_") + META_SUFFIX)
+
+    def add(self, table: Table, history: History) -> WorkspaceEntry:
+        """Добавляет новую таблицу; таблица с тем же именем заменяется."""
+        key = table_key(table.name)
+        old = self.entries.get(key)
+        if old is not None:
+            self.logger.info("Таблица '%s' заменена новой", old.name)
+            self.discard(old)
+            if old.history is not None:
+                old.history.close()
+        entry = WorkspaceEntry(table.name)
+        self.attach(entry, table, history)
+        entry.dirty = True
+        self.entries[key] = entry
+        if self.sync is not None:
+            self.sync.table_added(table)
+        return entry
+
+    def attach(self, entry: WorkspaceEntry, table: Table, history: History):
+        entry.table = table
+        entry.history = history
+        entry.cursor = (table.current_row, table.current_col)
+        entry.listener = lambda change: self.on_change(entry, change)
+        table.add_listener(entry.listener)
+        entry.size = estimate_memory(table) + history.bytes
+
+    def on_change(self, entry: WorkspaceEntry, change: TableChange):
+        if change.event == "computed":
+            return
+        stored = not entry.dirty
+        entry.dirty = True
+        if self.sync is not None:
+            self.sync.table_changed(entry.name, change)
+        # Журнал записанной таблицы заводится при первом изменении
+        if entry.journal is None and entry is self.current and self.journal_dir:
+            self.start_journal(entry, change if stored else None)
+
+    def start_journal(self, entry: WorkspaceEntry, first: Optional[TableChange] = None):
+        """Заводит журнал таблицы.
+
+        `first` — первое изменение таблицы, записанной в хранилище: до него
+        таблица совпадает с файлом хранилища, поэтому этот файл становится
+        снимком журнала, а само изменение — первой записью. Иначе таблица
+        пишется в снимок целиком.
+        """
+        # Прежний журнал с тем же именем удаляется фоновой записью, поэтому её нужно дождаться
+        job = entry.pending
+        if job is not None:
+            job.done.wait()
+            self.settled(entry)
+            if job.error is not None:
+                first = None
+        entry.journal = TableJournal(entry.table, self.journal_dir, exporter=self.exporter)
+        store_path = self.store_path(entry.name) if self.directory else None
+        if first is not None and store_path and os.path.exists(store_path):
+            entry.journal.start(base=store_path)
+            entry.journal.on_change(first)
+        else:
+            entry.journal.start()
+
+    def discard(self, entry: WorkspaceEntry, drop: bool = False):
+        """Убирает таблицу из рабочего пространства вместе с её журналом (файлы хранилища остаются).
+
+        При `drop` таблица убирается и с сервера (отмена создания таблицы).
+        """
+        if entry.journal:
+            entry.journal.close(remove=True)
+            entry.journal = None
+        if entry.table is not None:
+            entry.table.remove_listener(entry.listener)
+        if self.entries.get(table_key(entry.name)) is entry:
+            del self.entries[table_key(entry.name)]
+        if self.current is entry:
+            self.current = None
+        if drop and self.sync is not None:
+            self.sync.table_dropped(entry.name)
+
+    def restore(self, entry: WorkspaceEntry):
+        """Возвращает убранную таблицу (повтор отменённого создания)."""
+        key = table_key(entry.name)
+        old = self.entries.get(key)
+        if old is not None and old is not entry:
+            self.discard(old)
+        entry.table.add_listener(entry.listener)
+        self.entries[key] = entry
+        if self.sync is not None:
+            self.sync.table_added(entry.table)
+
+    def open(self, name: str) -> Optional[WorkspaceEntry]:
+        """Находит таблицу по имени и при необходимости загружает её.
+
+        Таблица ищется в рабочем пространстве, затем среди сохранённых
+        командой "сохрани" файлов в `export_dir`.
+        """
+        entry = self.get(name)
+        if entry is None:
+            return self.open_export(name)
+        if not entry.loaded:
+            try:
+                self.load(entry)
+            except (OSError, ValueError, KeyError):
+                self.logger.exception("Не удалось загрузить таблицу '%s'", entry.name)
+                return None
+        return entry
+
+    def load(self, entry: WorkspaceEntry):
+        """Читает таблицу из хранилища потоком строк."""
+        table = read_table(self.store_path(entry.name), self.meta_path(entry.name))
+        # Выгружается только записанная таблица, поэтому шаги истории подходят к прочитанной
+        history = entry.history
+        if history is None:
+            history = History(table)
+        else:
+            history.attach(table)
+        self.attach(entry, table, history)
+        self.logger.info("Таблица '%s' загружена: %s строк", entry.name, len(table.data))
+
+    def open_export(self, name: str) -> Optional[WorkspaceEntry]:
+        """Загружает сохранённый CSV (значения без формул) как новую таблицу рабочего пространства."""
+        key = table_key(name)
+        try:
+            filenames = os.listdir(self.export_dir)
+        except OSError:
+            return None
+        for filename in filenames:
+            stem, suffix = os.path.splitext(filename)
+            if suffix == ".csv" and table_key(stem) == key:
+                break
+        else:
+            return None
+        with open(os.path.join(self.export_dir, filename), newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            headers = next(reader, None)
+            if not headers:
+                return None
+            table = Table(stem, headers, rows=reader)
+        # Курсор встаёт на новую строку после сохранённых, как при продолжении ввода
+        table.current_row = len(table.data)
+        table.new_row()
+        self.logger.info("Таблица '%s' загружена из файла %s", stem, filename)
+        return self.add(table, History(table))
+
+    def activate(self, entry: Optional[WorkspaceEntry]):
+        """Делает таблицу текущей: журнал прежней приостанавливается, а не удаляется."""
+        previous = self.current
+        if previous is not None and previous is not entry and previous.loaded:
+            previous.cursor = (previous.table.current_row, previous.table.current_col)
+            if previous.journal:
+                previous.journal.close()
+            previous.size = estimate_memory(previous.table) + previous.history.bytes
+        self.current = entry
+        if entry is None:
+            return
+        self.clock += 1
+        entry.last_used = self.clock
+        if entry is not previous and entry.dirty and self.journal_dir:
+            if entry.journal is None:
+                self.start_journal(entry)
+            else:
+                entry.journal.resume()
+        self.enforce_budget()
+
+    def run(self, label: str, tasks: List[Callable]) -> ExportJob:
+        """Выполняет задания записи в фоне или, без `exporter`, сразу."""
+        if self.exporter is not None:
+            return self.exporter.submit(label, tasks)
+        job = ExportJob(label, tasks)
+        job.run()
+        return job
+
+    def flush(self, entry: WorkspaceEntry, save_path: Optional[str] = None) -> Optional[ExportJob]:
+        """Записывает таблицу в хранилище, а при `save_path` — ещё и в CSV со значениями формул.
+
+        Журнал таблицы закрывается сразу, а удаляется последним заданием
+        записи: если запись не завершится, таблица восстановится из журнала.
+        """
+        if not self.directory and save_path is None:
+            return None
+        table = entry.table
+        entry.cursor = (table.current_row, table.current_col)
+        snapshot = TableSnapshot(table)
+        tasks = []
+        if save_path is not None:
+            tasks.append(export_task(snapshot, save_path))
+            if self.sync is not None:
+                self.sync.table_completed(entry.name, snapshot)
+        if self.directory:
+            meta = {"name": table.name, "headers": table.headers, "storage": table.storage, "cursor": entry.cursor}
+            meta_path = self.meta_path(entry.name)
+            tasks.append(export_task(snapshot, self.store_path(entry.name), display=False))
+            tasks.append(lambda: write_atomic(meta_path, lambda f: json.dump(meta, f, ensure_ascii=False)))
+        journal, entry.journal = entry.journal, None
+        if journal is not None:
+            journal.close()
+            tasks.append(lambda: journal.close(remove=True))
+        entry.dirty = False
+        entry.pending = self.run(f"запись таблицы '{entry.name}'", tasks)
+        return entry.pending
+
+    def settled(self, entry: WorkspaceEntry) -> bool:
+        """Учитывает завершённую фоновую запись таблицы. False, если запись ещё идёт.
+
+        Если запись не удалась, таблица снова считается несохранённой.
+        """
+        job = entry.pending
+        if job is None:
+            return True
+        if not job.done.is_set():
+            return False
+        entry.pending = None
+        if job.error is not None:
+            entry.dirty = True
+        return True
+
+    def source(self, entry: WorkspaceEntry):
+        """Источник строк таблицы для выгрузки: снимок таблицы в памяти или файл хранилища."""
+        if entry.loaded:
+            return TableSnapshot(entry.table)
+        return StoredTable(self.store_path(entry.name), self.meta_path(entry.name))
+
+    def export(
+        self, entries: Iterable[WorkspaceEntry], directory: str, format: str, compression: Optional[str] = None
+    ) -> ExportJob:
+        """Выгружает таблицы в файлы в папке `directory` одним фоновым заданием."""
+        os.makedirs(directory, exist_ok=True)
+        tasks = []
+        for entry in entries:
+            path = export_path(directory, entry.name, format, compression)
+            tasks.append(export_task(self.source(entry), path, format, compression))
+        return self.run(f"выгрузка {len(tasks)} таблиц", tasks)
+
+    def evict(self, entry: WorkspaceEntry) -> bool:
+        """Выгружает из памяти таблицу, уже записанную в хранилище."""
+        if entry.dirty or not self.settled(entry):
+            return False
+        entry.cursor = (entry.table.current_row, entry.table.current_col)
+        entry.history.detach()
+        entry.table.remove_listener(entry.listener)
+        entry.table = entry.listener = None
+        entry.size = 0
+        self.evictions += 1
+        self.logger.info("Таблица '%s' выгружена из памяти", entry.name)
+        return True
+
+    def memory_usage(self) -> int:
+        """Оценка памяти загруженных таблиц; текущая таблица оценивается заново."""
+        current = self.current
+        if current is not None and current.loaded:
+            current.size = estimate_memory(current.table) + current.history.bytes
+        return sum(entry.size for entry in self.entries.values() if entry.loaded)
+
+    def enforce_budget(self):
+        """Выгружает давно не открывавшиеся таблицы, пока память не уложится в бюджет.
+
+        Несохранённая таблица сначала записывается в фоне и выгружается при
+        следующей проверке, когда запись закончится.
+        """
+        if not self.directory:
+            return
+        total = self.memory_usage()
+        if total <= self.memory_budget:
+            return
+        loaded = [entry for entry in self.entries.values() if entry.loaded and entry is not self.current]
+        for entry in sorted(loaded, key=lambda entry: entry.last_used):
+            size = entry.size
+            if entry.dirty and entry.pending is None:
+                self.flush(entry)
+            if self.evict(entry):
+                total -= size
+            if total <= self.memory_budget:
+                break
+
+    def restore_journals(self) -> List[WorkspaceEntry]:
+        """Восстанавливает таблицы из журналов после сбоя, начиная с самой свежей."""
+        restored = []
+        if not self.journal_dir:
+            return restored
+        for path in TableJournal.find(self.journal_dir):
+            table = TableJournal.restore(path)
+            if table is None:
+                continue
+            entry = self.add(table, History(table))
+            # Журнал начинается заново со снимка: последняя запись могла оборваться
+            entry.journal = TableJournal(table, self.journal_dir, exporter=self.exporter)
+            entry.journal.start()
+            entry.journal.close()
+            restored.append(entry)
+        return restored
+
+    def close(self):
+        """Приостанавливает журнал текущей таблицы; несохранённые таблицы восстановятся при запуске."""
+        if self.current is not None and self.current.journal:
+            self.current.journal.close()